@@ -0,0 +1,3 @@
+"""
+Bench Package - End-to-End Benchmark mit Ollama-Stub
+"""
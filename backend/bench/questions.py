@@ -0,0 +1,63 @@
+"""
+Fragen-Mixe für den Benchmark
+
+Jede Frage hat ein Gewicht und das SQL, das der Ollama-Stub dafür "generiert".
+Die Beispiele stammen aus dem README; ein Teil davon trifft den Intent Fast-Path,
+der Rest geht durch das LLM.
+"""
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+# (Frage, Gewicht, SQL des Stubs)
+README_MIX: List[Tuple[str, float, str]] = [
+    ("Show all transactions.", 1.0, "SELECT * FROM transactions ORDER BY date DESC"),
+    ("Show the last 5 transactions.", 2.0, "SELECT * FROM transactions ORDER BY date DESC LIMIT 5"),
+    ("Show all transactions from January 2024.", 1.5,
+     "SELECT * FROM transactions WHERE date >= '2024-01-01' AND date < '2024-02-01' ORDER BY date"),
+    ("What is the total sum of all expenses?", 2.0, "SELECT SUM(amount) FROM transactions WHERE amount < 0"),
+    ("How much did I spend on 'Lebensmittel'?", 2.0,
+     "SELECT SUM(amount) FROM transactions WHERE category = 'Lebensmittel' AND amount < 0"),
+    ("What is my total income?", 1.0, "SELECT SUM(amount) FROM transactions WHERE amount > 0"),
+    ("Show all expenses greater than 100 Euro.", 1.0,
+     "SELECT * FROM transactions WHERE amount < -100 ORDER BY amount"),
+    ("List all transactions for the category 'Miete'.", 1.0,
+     "SELECT * FROM transactions WHERE category = 'Miete' ORDER BY date DESC"),
+    ("What was the most expensive transaction?", 1.0, "SELECT * FROM transactions ORDER BY amount ASC LIMIT 1"),
+    # Nicht vom Fast-Path abgedeckt -> immer LLM
+    ("Wie viel habe ich pro Monat für Restaurants ausgegeben?", 1.5,
+     "SELECT date_trunc('month', date) AS month, SUM(amount) AS total FROM transactions "
+     "WHERE category = 'Restaurant' GROUP BY 1 ORDER BY 1"),
+    ("Durchschnittliche Ausgabe pro Kategorie", 1.0,
+     "SELECT category, AVG(amount) AS avg_amount FROM transactions WHERE amount < 0 GROUP BY category ORDER BY 2"),
+    ("Anzahl Buchungen pro Wochentag", 0.5,
+     "SELECT EXTRACT(DOW FROM date) AS weekday, COUNT(*) FROM transactions GROUP BY 1 ORDER BY 1"),
+]
+
+MIXES: Dict[str, List[Tuple[str, float, str]]] = {
+    "readme": README_MIX,
+    # nur Fragen, die das LLM brauchen (Intents greifen nicht)
+    "llm": README_MIX[-3:],
+    "aggregates": [q for q in README_MIX if "SUM(" in q[2] or "AVG(" in q[2] or "COUNT(" in q[2]],
+}
+
+DEFAULT_SQL = "SELECT * FROM transactions ORDER BY date DESC LIMIT 10"
+
+
+def _key(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+CANNED_SQL: Dict[str, str] = {_key(q): sql for mix in MIXES.values() for q, _, sql in mix}
+
+
+def canned_sql(question: Optional[str]) -> str:
+    """SQL the stub answers with for ``question`` (fallback: latest 10 rows)"""
+    return CANNED_SQL.get(_key(question or ""), DEFAULT_SQL)
+
+
+def sample(mix: str, n: int, seed: int = 0) -> List[str]:
+    """``n`` questions drawn from ``mix`` according to the weights"""
+    entries = MIXES[mix]
+    rng = random.Random(seed)
+    return rng.choices([q for q, _, _ in entries], weights=[w for _, w, _ in entries], k=n)
@@ -0,0 +1,309 @@
+"""
+End-to-End Benchmark für /query und /query/stream
+
+Startet den Ollama-Stub (``bench.stub_ollama``) auf einem freien Port, bereitet
+eine Postgres-Datenbank vor (lokal per ``--dsn`` oder eingebettet per
+``--embedded`` mit dem optionalen Paket ``pgserver``), lädt sie auf die
+gewünschte Größe und treibt die FastAPI-App in-process mit N parallelen
+Clients. Ausgabe ist JSON: Durchsatz sowie p50/p95/p99 gesamt und pro Stage
+(aus den RequestTimern der App).
+
+    python -m bench.run --dsn postgresql://localhost/bench --scale 1000000 \\
+        --requests 500 --concurrency 16 --mix readme --output bench.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 + mean/max in ms"""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": round(rank(50) * 1000, 3),
+        "p95": round(rank(95) * 1000, 3),
+        "p99": round(rank(99) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def embedded_dsn(path: str) -> str:
+    try:
+        import pgserver
+    except ImportError:
+        raise SystemExit("--embedded needs the optional package pgserver (pip install pgserver)")
+    return pgserver.get_server(path, cleanup_mode="stop").get_uri()
+
+
+def _run_script(conn, path: Path, log):
+    """Execute a .sql file statement by statement; skip what this server can't do (e.g. Supabase roles)"""
+    with conn.cursor() as cur:
+        for statement in path.read_text(encoding="utf-8").split(";"):
+            if not statement.strip() or all(
+                line.strip().startswith("--") or not line.strip() for line in statement.splitlines()
+            ):
+                continue
+            cur.execute("SAVEPOINT bench_setup")
+            try:
+                cur.execute(statement)
+                cur.execute("RELEASE SAVEPOINT bench_setup")
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT bench_setup")
+                log(f"  skipped: {str(e).splitlines()[0]}")
+    conn.commit()
+
+
+def prepare_database(dsn: str, scale: int, rollups: bool, workers: int, seed: int, log) -> int:
+    """Create the schema if needed and top ``transactions`` up to ``scale`` rows"""
+    import psycopg2
+
+    from etl.copy_loader import BulkLoader
+    from etl.generator import TransactionGenerator
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('public.transactions') IS NOT NULL")
+            exists = cur.fetchone()[0]
+        if not exists:
+            log("Creating schema from database/schema.sql")
+            _run_script(conn, REPO_ROOT / "database" / "schema.sql", log)
+        if rollups:
+            _run_script(conn, REPO_ROOT / "database" / "rollups.sql", log)
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM public.transactions")
+            rows = cur.fetchone()[0]
+        if rows < scale:
+            log(f"Loading {scale - rows:,} rows (have {rows:,}, scale {scale:,})")
+            today = datetime.date.today()
+            generator = TransactionGenerator(today.replace(year=today.year - 3), today)
+            BulkLoader(dsn, "transactions", generator, workers).load(scale - rows, seed=seed, out=sys.stderr)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE public.transactions")
+            rows = scale
+        return rows
+    finally:
+        conn.close()
+
+
+def start_stub(port: int, load_ms: float, prompt_rate: float, token_rate: float, parallel: int):
+    import uvicorn
+
+    from bench.stub_ollama import StubModel, create_app
+
+    model = StubModel(load_ms, prompt_rate, token_rate, parallel)
+    server = uvicorn.Server(uvicorn.Config(create_app(model), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise SystemExit("Ollama stub did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+async def drive(main, questions: List[str], concurrency: int, stream: bool, page_size: Optional[int]):
+    """Send all questions with ``concurrency`` workers; returns per-request client-side samples"""
+    import httpx
+
+    path = "/query/stream" if stream else "/query"
+    pending: "asyncio.Queue[str]" = asyncio.Queue()
+    for question in questions:
+        pending.put_nowait(question)
+    samples = []
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=300
+    ) as client:
+
+        async def worker():
+            while True:
+                try:
+                    question = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                body = {"natural_language_query": question}
+                if page_size:
+                    body["page_size"] = page_size
+                started = time.perf_counter()
+                response = await client.post(path, json=body)
+                elapsed = time.perf_counter() - started
+                if stream:
+                    failed = "event: error" in response.text
+                else:
+                    failed = response.status_code != 200 or response.json().get("error") is not None
+                samples.append({
+                    "question": question,
+                    "seconds": elapsed,
+                    "status": response.status_code,
+                    "failed": failed,
+                })
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return samples, wall
+
+
+async def run_benchmark(args, dsn: str, stub_url: str, log) -> dict:
+    os.environ.update({
+        "DATABASE_URL": dsn,
+        "OLLAMA_URL": stub_url,
+        "OLLAMA_MODEL": "stub",
+        "OLLAMA_WARMUP": "false",
+        "INTENTS_ENABLED": "true" if args.intents else "false",
+        "ROLLUPS_ENABLED": "true" if args.rollups else "false",
+        "ROLLUP_REFRESH_INTERVAL": "0",
+        "DB_POOL_MAX_SIZE": str(max(args.concurrency, 10)),
+        "LOG_PATH": "",
+        "LOG_LEVEL": "WARNING",
+        "WORKLOAD_LOG_PATH": "",
+        "TRANSLATION_CACHE_PATH": "",
+    })
+    if not args.cache:
+        os.environ["TRANSLATION_CACHE_SIZE"] = "0"
+        os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+
+    import main
+    from bench.questions import sample
+
+    server_side = []
+    main.request_listeners.append(
+        lambda endpoint, source, status, timer: server_side.append((source, status, dict(timer.stages)))
+    )
+
+    async with main.lifespan(main.app):
+        if args.rollups and main.rollups.available:
+            log(f"Rollups: {await main.rollups.refresh_async(full=True)}")
+        await main.ollama.warm_up(main.PROMPT_PREFIX, options=main.OLLAMA_OPTIONS)
+
+        if args.warmup:
+            await drive(main, sample(args.mix, args.warmup, args.seed + 1), args.concurrency, args.stream, args.page_size)
+            server_side.clear()
+
+        questions = sample(args.mix, args.requests, args.seed)
+        log(f"Running {len(questions)} requests, concurrency {args.concurrency}, mix {args.mix}")
+        samples, wall = await drive(main, questions, args.concurrency, args.stream, args.page_size)
+        llm_stats = main.ollama.stats()
+        pool_stats = main.db_pool.stats()
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    for _, _, timings in server_side:
+        for stage, seconds in timings.items():
+            stages[stage].append(seconds)
+
+    return {
+        "config": {
+            "endpoint": "/query/stream" if args.stream else "/query",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "scale": args.scale,
+            "intents": args.intents,
+            "cache": args.cache,
+            "rollups": args.rollups,
+            "token_rate": args.token_rate,
+            "prompt_rate": args.prompt_rate,
+            "llm_parallel": args.llm_parallel,
+        },
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 3) if wall else None,
+        "errors": sum(1 for s in samples if s["failed"]),
+        "latency_ms": percentiles([s["seconds"] for s in samples]),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "sources": dict(Counter(source for source, _, _ in server_side)),
+        "statuses": dict(Counter(status for _, status, _ in server_side)),
+        "llm": {k: v for k, v in llm_stats.items() if not isinstance(v, dict)},
+        "db_pool": pool_stats,
+    }
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark the /query pipeline against an Ollama stub")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="Local Postgres (not production!)")
+    target.add_argument("--embedded", metavar="DIR", help="Embedded Postgres data dir (pip install pgserver)")
+    parser.add_argument("--scale", type=int, default=100_000, help="Rows in transactions")
+    parser.add_argument("--load-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests before the run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", choices=("readme", "llm", "aggregates"), default="readme")
+    parser.add_argument("--stream", action="store_true", help="Benchmark /query/stream instead of /query")
+    parser.add_argument("--page-size", type=int)
+    parser.add_argument("--no-intents", dest="intents", action="store_false")
+    parser.add_argument("--cache", action="store_true", help="Keep translation/result caches enabled")
+    parser.add_argument("--rollups", action="store_true", help="Apply database/rollups.sql and route aggregates")
+    parser.add_argument("--token-rate", type=float, default=40.0)
+    parser.add_argument("--prompt-rate", type=float, default=400.0)
+    parser.add_argument("--load-ms", type=float, default=1500.0)
+    parser.add_argument("--llm-parallel", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    dsn = embedded_dsn(args.embedded) if args.embedded else args.dsn
+    if not dsn:
+        parser.error("pass --dsn (or BENCH_DATABASE_URL) or --embedded DIR")
+
+    rows = prepare_database(dsn, args.scale, args.rollups, args.load_workers, args.seed, log)
+    log(f"transactions: {rows:,} rows")
+
+    port = free_port()
+    server, thread = start_stub(port, args.load_ms, args.prompt_rate, args.token_rate, args.llm_parallel)
+    try:
+        report = asyncio.run(run_benchmark(args, dsn, f"http://127.0.0.1:{port}/api/generate", log))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        log(f"Report written to {args.output}")
+    else:
+        print(text)
+    log(
+        f"{report['throughput_rps']} req/s, p50 {report['latency_ms']['p50']} ms, "
+        f"p95 {report['latency_ms']['p95']} ms, p99 {report['latency_ms']['p99']} ms, "
+        f"{report['errors']} errors"
+    )
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Micro-Benchmark: Serialisierung + Komprimierung von Query-Ergebnissen
+
+Vergleicht für synthetische ``RealDictCursor``-Zeilen (UUID, Decimal, date, Text):
+
+- ``pydantic``: der alte Pfad - ``QueryResponse`` + ``jsonable_encoder`` + ``JSONResponse``
+- ``json``: ``db.encoding`` mit der stdlib (ein Durchlauf, ``default=``)
+- ``orjson``: ``db.encoding`` mit orjson (falls installiert)
+
+und für den Body danach gzip (Level 1/5/9) und zstd (Level 1/3/9, falls
+``zstandard`` installiert ist): Größe, Ratio und Zeit. Ausgabe ist JSON.
+
+    python -m bench.serialization --rows 1000,10000,50000 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from psycopg2.extras import RealDictRow
+
+CATEGORIES = ("Miete", "Lebensmittel", "Transport", "Restaurant", "Gehalt", "Technik")
+
+
+def make_rows(n: int, seed: int = 42) -> List[dict]:
+    """Rows shaped like ``SELECT * FROM transactions`` through RealDictCursor"""
+    rng = random.Random(seed)
+    start = datetime.date(2022, 1, 1)
+    rows = []
+    for i in range(n):
+        row = RealDictRow()
+        row.update({
+            "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+            "amount": Decimal(rng.randint(-50000, 300000)) / 100,
+            "category": rng.choice(CATEGORIES),
+            "description": f"Buchung {i} Einkauf",
+            "date": start + datetime.timedelta(days=rng.randint(0, 1000)),
+            "created_at": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=i),
+        })
+        rows.append(row)
+    return rows
+
+
+def timed(fn: Callable[[], bytes], repeat: int) -> Dict:
+    seconds, result = [], b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+    return {"ms": round(statistics.median(seconds) * 1000, 3), "bytes": len(result), "_body": result}
+
+
+def encoders(rows: List[dict]) -> Dict[str, Callable[[], bytes]]:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import BaseModel
+
+    from db import encoding
+
+    class QueryResponse(BaseModel):
+        sql_query: str
+        data: list
+        error: str | None = None
+
+    def pydantic_path() -> bytes:
+        model = QueryResponse(sql_query="SELECT * FROM transactions", data=rows)
+        return JSONResponse(content=jsonable_encoder(model)).body
+
+    def stdlib_path() -> bytes:
+        return encoding._stdlib_dumps(rows)
+
+    paths = {"pydantic": pydantic_path, "json": stdlib_path}
+    if encoding.orjson is not None:
+        paths["orjson"] = lambda: encoding.dumps(rows)
+    return paths
+
+
+def compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    from middleware.compression import compress_body, zstandard
+
+    result = {f"gzip-{level}": (lambda body, level=level: compress_body(body, "gzip", gzip_level=level)) for level in (1, 5, 9)}
+    if zstandard is not None:
+        for level in (1, 3, 9):
+            result[f"zstd-{level}"] = lambda body, level=level: compress_body(body, "zstd", zstd_level=level)
+    return result
+
+
+def run(sizes: List[int], repeat: int) -> Dict:
+    report = {}
+    for n in sizes:
+        rows = make_rows(n)
+        encoded = {name: timed(fn, repeat) for name, fn in encoders(rows).items()}
+        baseline = encoded["pydantic"]["ms"]
+        body = encoded.get("orjson", encoded["json"])["_body"]
+        compressed = {}
+        for name, fn in compressors().items():
+            t = timed(lambda: fn(body), repeat)
+            compressed[name] = {"ms": t["ms"], "bytes": t["bytes"], "ratio": round(t["bytes"] / len(body), 4)}
+        report[str(n)] = {
+            "encode": {
+                name: {"ms": t["ms"], "bytes": t["bytes"], "speedup": round(baseline / t["ms"], 2) if t["ms"] else None}
+                for name, t in encoded.items()
+            },
+            "compress": compressed,
+        }
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark result serialization and compression")
+    parser.add_argument("--rows", type=lambda v: [int(x) for x in v.split(",")], default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (median)")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run(args.rows, args.repeat), indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Ollama-Stub für Benchmarks
+
+Emuliert ``POST /api/generate`` (normal und ``stream``) mit konfigurierbarer
+Latenz: Modell-Ladezeit (nur beim ersten Aufruf bzw. nach ``keep_alive`` 0),
+Prompt-Eval pro Token (ein gemeinsamer Präfix mit dem vorherigen Prompt ist
+"im KV-Cache" und kostet nichts) und Token-Rate beim Generieren. Die Antwort
+ist das SQL aus ``bench.questions`` für die Frage im Prompt.
+
+Standalone::
+
+    python -m bench.stub_ollama --port 11500 --token-rate 40 --prompt-rate 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from bench.questions import canned_sql
+
+QUESTION = re.compile(r"User Question:\s*(.*?)\s*SQL Query:\s*$", re.DOTALL)
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubModel:
+    """Latency model shared by all requests (one loaded model, limited parallelism)"""
+
+    def __init__(
+        self,
+        load_ms: float = 1500.0,
+        prompt_rate: float = 400.0,
+        token_rate: float = 40.0,
+        parallel: int = 1,
+    ):
+        """
+        Args:
+            load_ms: Cold model load time
+            prompt_rate: Prompt tokens evaluated per second
+            token_rate: Output tokens generated per second
+            parallel: Concurrent generations (OLLAMA_NUM_PARALLEL)
+        """
+        self.load_ms = load_ms
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.loaded = False
+        self.last_prompt = ""
+        self.slots = asyncio.Semaphore(parallel)
+        self.requests = 0
+
+    async def prefill(self, prompt: str, keep_alive) -> dict:
+        """Load + prompt eval; returns the timing fields (ns) Ollama reports"""
+        load = 0.0
+        if not self.loaded:
+            load = self.load_ms / 1000
+            await asyncio.sleep(load)
+            self.loaded = keep_alive not in (0, "0", "0s")
+        cached = len(os.path.commonprefix([self.last_prompt, prompt]))
+        new_tokens = approx_tokens(prompt[cached:]) if cached < len(prompt) else 0
+        prompt_eval = new_tokens / self.prompt_rate
+        await asyncio.sleep(prompt_eval)
+        self.last_prompt = prompt
+        return {
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": new_tokens,
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+        }
+
+
+def create_app(model: StubModel) -> FastAPI:
+    app = FastAPI(title="Ollama stub")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        options = body.get("options") or {}
+        match = QUESTION.search(prompt)
+        answer = canned_sql(match.group(1)) if match else ""
+        if options.get("num_predict") == 1:
+            answer = answer[:4]  # Warm-up
+        tokens = re.findall(r"\S+\s*", answer) or [""]
+        model.requests += 1
+
+        if not body.get("stream", True):
+            async with model.slots:
+                started = time.perf_counter()
+                timings = await model.prefill(prompt, body.get("keep_alive"))
+                eval_seconds = len(tokens) / model.token_rate
+                await asyncio.sleep(eval_seconds)
+                return JSONResponse({
+                    "model": body.get("model"),
+                    "response": answer,
+                    "done": True,
+                    **timings,
+                    "eval_count": len(tokens),
+                    "eval_duration": int(eval_seconds * 1e9),
+                    "total_duration": int((time.perf_counter() - started) * 1e9),
+                })
+
+        async def chunks():
+            async with model.slots:
+                started = time.perf_counter()
+                timings = await model.prefill(prompt, body.get("keep_alive"))
+                for token in tokens:
+                    await asyncio.sleep(1 / model.token_rate)
+                    yield json.dumps({"model": body.get("model"), "response": token, "done": False}) + "\n"
+                yield json.dumps({
+                    "model": body.get("model"),
+                    "response": "",
+                    "done": True,
+                    **timings,
+                    "eval_count": len(tokens),
+                    "eval_duration": int(len(tokens) / model.token_rate * 1e9),
+                    "total_duration": int((time.perf_counter() - started) * 1e9),
+                }) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "stub"}]}
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Ollama /api/generate stub with synthetic latency")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--load-ms", type=float, default=1500.0)
+    parser.add_argument("--prompt-rate", type=float, default=400.0, help="Prompt tokens/s")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="Generated tokens/s")
+    parser.add_argument("--parallel", type=int, default=1)
+    args = parser.parse_args(argv)
+    model = StubModel(args.load_ms, args.prompt_rate, args.token_rate, args.parallel)
+    uvicorn.run(create_app(model), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
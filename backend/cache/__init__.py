@@ -0,0 +1,3 @@
+"""
+Cache Package - Übersetzungs- und Ergebnis-Caches
+"""
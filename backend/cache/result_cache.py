@@ -0,0 +1,189 @@
+"""
+Result Cache für ausgeführtes SQL
+
+Cacht die fertig serialisierten JSON-Zeilen pro normalisiertem SQL-Text
+(LRU mit Byte-Budget). Invalidiert wird über ein billiges Watermark pro
+Tabelle aus ``pg_stat_user_tables`` (Insert/Update/Delete-Zähler und Live-Tuples),
+das höchstens alle N Sekunden abgefragt wird - die Tabellen ändern sich nur,
+wenn das ETL neue Daten lädt. Bei partitionierten Tabellen werden die Zähler
+aller Partitionen summiert.
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+# Funktionen, deren Ergebnis sich ohne Datenänderung ändert -> nie cachen
+VOLATILE_SQL = re.compile(
+    r"\b(now|current_date|current_timestamp|localtimestamp|localtime|clock_timestamp|"
+    r"statement_timestamp|random|gen_random_uuid|timeofday)\b",
+    re.IGNORECASE,
+)
+
+WATERMARK_SQL = """
+SELECT t.relname, sum(s.n_tup_ins), sum(s.n_tup_upd), sum(s.n_tup_del), sum(s.n_live_tup), count(*)
+FROM pg_class t
+JOIN pg_namespace ns ON ns.oid = t.relnamespace
+JOIN pg_stat_user_tables s
+  ON s.relid = t.oid OR s.relid IN (SELECT relid FROM pg_partition_tree(t.oid))
+WHERE ns.nspname = 'public' AND t.relname = ANY(%s)
+GROUP BY t.relname
+"""
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon"""
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+class ResultCache:
+    """Byte-budgeted LRU of serialized query results with watermark invalidation"""
+
+    def __init__(
+        self,
+        pool,
+        tables: Iterable[str] = ("transactions", "budgets"),
+        max_bytes: int = 64 * 1024 * 1024,
+        watermark_interval: float = 5.0,
+    ):
+        """
+        Args:
+            pool: DatabasePool used for the watermark query
+            tables: Tables whose changes invalidate cached results
+            max_bytes: Memory budget for cached payloads
+            watermark_interval: Minimum seconds between watermark checks
+        """
+        self.pool = pool
+        self.tables = frozenset(t.lower() for t in tables)
+        self.max_bytes = max_bytes
+        self.watermark_interval = watermark_interval
+
+        self._entries: "OrderedDict[str, Tuple[bytes, Dict[str, tuple]]]" = OrderedDict()
+        self._bytes = 0
+        self._watermarks: Dict[str, tuple] = {}
+        self._checked_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+        # Stats
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._uncacheable = 0
+        self._watermark_checks = 0
+
+    def referenced_tables(self, sql: str) -> Optional[FrozenSet[str]]:
+        """
+        Tables an SQL statement reads, or None if its result must not be cached
+        (volatile functions, unparsable SQL, or tables that are not watched)
+        """
+        if VOLATILE_SQL.search(sql):
+            return None
+        try:
+            statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+        except sqlglot.errors.ParseError:
+            return None
+        if len(statements) != 1:
+            return None
+        tree = statements[0]
+        ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        tables = set()
+        # Jede Tabellen-Referenz (auch "FROM a, b", Subqueries, Joins) - Systemsichten,
+        # Tabellenfunktionen und fremde Schemas sind nicht beobachtet -> nicht cachen
+        for table in tree.find_all(exp.Table):
+            if not isinstance(table.this, exp.Identifier):
+                return None
+            name = table.name if table.this.quoted else table.name.lower()
+            if not table.db and name in ctes:
+                continue
+            if table.catalog or table.db.lower() not in ("", "public") or name not in self.tables:
+                return None
+            tables.add(name)
+        return frozenset(tables) or None
+
+    async def check_watermarks(self):
+        """Refresh table watermarks if the last check is older than the interval"""
+        if time.monotonic() - self._checked_at < self.watermark_interval:
+            return
+        async with self._refresh_lock:
+            if time.monotonic() - self._checked_at < self.watermark_interval:
+                return
+            async with self.pool.connection() as conn:
+                rows = await self.pool.run(self._fetch_watermarks, conn)
+            self._watermarks = {row[0]: tuple(row[1:]) for row in rows}
+            self._checked_at = time.monotonic()
+            self._watermark_checks += 1
+
+    def _fetch_watermarks(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(WATERMARK_SQL, (list(self.tables),))
+            return cur.fetchall()
+
+    def snapshot(self, tables: FrozenSet[str]) -> Dict[str, tuple]:
+        """Current watermarks for ``tables`` - take this *before* executing"""
+        return {t: self._watermarks.get(t) for t in tables}
+
+    def get(self, sql: str) -> Optional[bytes]:
+        key = normalize_sql(sql)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        payload, snapshot = entry
+        if any(self._watermarks.get(t) != mark for t, mark in snapshot.items()):
+            self._drop(key)
+            self._invalidations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return payload
+
+    def set(self, sql: str, payload: bytes, snapshot: Dict[str, tuple]):
+        if len(payload) > self.max_bytes:
+            self._uncacheable += 1
+            return
+        key = normalize_sql(sql)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (payload, snapshot)
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._evictions += 1
+
+    def mark_uncacheable(self):
+        self._uncacheable += 1
+
+    def _drop(self, key: str):
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def purge(self) -> int:
+        removed = len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "tables": sorted(self.tables),
+            "watermarks": self._watermarks,
+            "watermark_interval": self.watermark_interval,
+            "watermark_checks": self._watermark_checks,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "uncacheable": self._uncacheable,
+        }
@@ -0,0 +1,296 @@
+"""
+NL -> SQL Translation Cache
+
+Zweistufig: ein In-Memory LRU mit TTL vor einer lokalen SQLite-Datei, damit
+der Cache einen Neustart übersteht. Der Event Loop fasst nur den Speicher an:
+SQLite-Lesezugriffe (Miss im Speicher) laufen per ``asyncio.to_thread``,
+Schreibzugriffe (neue Einträge, Hit-Zähler) sammelt ein Writer-Thread und
+committet sie gebündelt. Der Key enthält die normalisierte Frage,
+das Modell, die Generierungs-Optionen und einen Hash des System-Prompts -
+ändert sich SYSTEM_PROMPT, das Schema oder OLLAMA_MODEL, werden alte Einträge automatisch
+nicht mehr getroffen.
+"""
+import asyncio
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+
+def normalize_question(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", text).strip().casefold()
+    return text.rstrip(" ?!.")
+
+
+class TranslationCache:
+    """In-memory LRU + SQLite store for generated SQL"""
+
+    def __init__(
+        self,
+        schema_prompt: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400.0,
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            schema_prompt: The system prompt; its hash is part of every key
+            max_entries: Capacity of the in-memory tier
+            ttl_seconds: Entries older than this are treated as misses
+            path: SQLite file for the persistent tier (None disables it)
+        """
+        self.schema_hash = hashlib.sha256(schema_prompt.encode("utf-8")).hexdigest()[:16]
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()     # Speicher (kurz, auch vom Event Loop)
+        self._db_lock = threading.Lock()  # SQLite (nur Threads)
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+        # Stats
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._sets = 0
+
+    def open(self):
+        """Open (and create) the SQLite store, dropping expired rows"""
+        if not self.path:
+            return
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                model TEXT NOT NULL,
+                schema_hash TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._db.execute(
+            "DELETE FROM translations WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        self._db.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="translation-cache-writer", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        if self._writer is not None:
+            self._writes.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _write_loop(self):
+        """Writer thread: execute queued statements, one commit per burst"""
+        while True:
+            ops = [self._writes.get()]
+            while True:
+                try:
+                    ops.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [op for op in ops if op is not _STOP]
+            try:
+                if writes:
+                    with self._db_lock:
+                        for statement, params in writes:
+                            self._db.execute(statement, params)
+                        self._db.commit()
+            except sqlite3.Error:
+                pass  # Cache: ein verlorener Schreibzugriff kostet nur einen späteren Miss
+            finally:
+                for _ in ops:
+                    self._writes.task_done()
+            if len(writes) != len(ops):
+                return
+
+    def _write(self, statement: str, params: tuple):
+        if self._writer is not None:
+            self._writes.put((statement, params))
+
+    def flush(self):
+        """Block until all queued writes are committed"""
+        if self._writer is not None:
+            self._writes.join()
+
+    def set_schema(self, schema_prompt: str):
+        """New schema/prompt version: entries generated for the old one are no longer hit"""
+        self.schema_hash = hashlib.sha256(schema_prompt.encode("utf-8")).hexdigest()[:16]
+
+    def make_key(self, question: str, model: str, options: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            [normalize_question(question), model, options, self.schema_hash],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl_seconds
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """Cached SQL from the in-memory tier (never touches the disk)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                del self._memory[key]
+                self._expirations += 1
+                return None
+            self._memory.move_to_end(key)
+            entry["hits"] += 1
+            self._memory_hits += 1
+        self._write("UPDATE translations SET hits = hits + 1 WHERE key = ?", (key,))
+        return entry["sql"]
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """Blocking: look ``key`` up in SQLite and promote a hit to memory"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT question, model, sql, created_at, hits FROM translations WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = {
+            "question": row[0],
+            "model": row[1],
+            "sql": row[2],
+            "created_at": row[3],
+            "hits": row[4] + 1,
+        }
+        if self._expired(entry):
+            self._write("DELETE FROM translations WHERE key = ?", (key,))
+            self._expirations += 1
+            return None
+        self._write("UPDATE translations SET hits = hits + 1 WHERE key = ?", (key,))
+        with self._lock:
+            self._put_memory(key, entry)
+        self._disk_hits += 1
+        return entry["sql"]
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached SQL for ``key`` or None (SQLite only on a memory miss, off the loop)"""
+        sql = self.get_memory(key)
+        if sql is None and self._db is not None:
+            sql = await asyncio.to_thread(self._get_disk, key)
+        if sql is None:
+            self._misses += 1
+        return sql
+
+    def set(self, key: str, question: str, model: str, sql: str):
+        """Store a translation in memory; the SQLite write is queued for the writer thread"""
+        entry = {
+            "question": normalize_question(question),
+            "model": model,
+            "sql": sql,
+            "created_at": time.time(),
+            "hits": 0,
+        }
+        with self._lock:
+            self._sets += 1
+            self._put_memory(key, entry)
+        self._write(
+            """
+            INSERT OR REPLACE INTO translations
+                (key, question, model, schema_hash, sql, created_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+            """,
+            (key, entry["question"], model, self.schema_hash, sql, entry["created_at"]),
+        )
+
+    def _put_memory(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Blocking: list entries (persistent tier if enabled, else memory), most used first"""
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                rows = self._db.execute(
+                    """
+                    SELECT key, question, model, schema_hash, sql, created_at, hits
+                    FROM translations ORDER BY hits DESC, created_at DESC LIMIT ?
+                    """,
+                    (limit,),
+                ).fetchall()
+            return [
+                {
+                    "key": r[0],
+                    "question": r[1],
+                    "model": r[2],
+                    "current_schema": r[3] == self.schema_hash,
+                    "sql": r[4],
+                    "created_at": r[5],
+                    "hits": r[6],
+                }
+                for r in rows
+            ]
+        with self._lock:
+            items = sorted(self._memory.items(), key=lambda kv: kv[1]["hits"], reverse=True)
+            return [{"key": k, "current_schema": True, **v} for k, v in items[:limit]]
+
+    def purge(self, key: Optional[str] = None) -> int:
+        """Blocking: delete one entry (or all entries when ``key`` is None)"""
+        with self._lock:
+            if key is None:
+                removed = len(self._memory)
+                self._memory.clear()
+            else:
+                removed = 1 if self._memory.pop(key, None) is not None else 0
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                if key is None:
+                    cur = self._db.execute("DELETE FROM translations")
+                else:
+                    cur = self._db.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._db.commit()
+            removed = max(removed, cur.rowcount)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._memory_hits + self._disk_hits + self._misses
+        return {
+            "schema_hash": self.schema_hash,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "pending_writes": self._writes.qsize(),
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_ratio": round((self._memory_hits + self._disk_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "sets": self._sets,
+        }
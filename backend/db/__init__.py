@@ -0,0 +1,3 @@
+"""
+Database Package - Connection Pooling und Query-Ausführung
+"""
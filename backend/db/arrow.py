@@ -0,0 +1,215 @@
+"""
+Arrow-Batches direkt aus Cursor-Tupeln
+
+Für Exporte (Arrow IPC Stream, Parquet) werden die Tupel eines normalen
+(Server-Side) Cursors spaltenweise in ``pyarrow.RecordBatch``es umgebaut - ohne
+Dict pro Zeile und ohne JSON. Die Arrow-Typen kommen aus den Postgres-OIDs in
+``cursor.description``: numeric(p, s) -> decimal128(p, s), numeric ohne typmod
+(SUM, AVG, berechnete Werte) -> exakter Dezimal-Text als string, date -> date32,
+timestamptz -> timestamp[us, UTC], uuid -> arrow.uuid. Das Schema wird mit dem ersten Batch festgelegt, damit alle
+Batches eines Streams bzw. alle Row Groups einer Parquet-Datei gleich sind.
+
+Parquet braucht den Footer am Ende der Datei; ``ParquetSpool`` schreibt daher
+eine Row Group pro Batch in eine temporäre Datei (bis ``spool_bytes`` im RAM),
+die danach gestreamt wird.
+
+``pyarrow`` ist optional (pip install pyarrow).
+"""
+import json
+import tempfile
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = None
+    pq = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Postgres Type-OIDs -> Arrow-Typ (numeric/uuid/json werden gesondert behandelt)
+NUMERIC_OID = 1700
+UUID_OID = 2950
+JSON_OIDS = (114, 3802)
+_SIMPLE_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    26: "uint32",
+    700: "float32",
+    701: "float64",
+    25: "string",
+    1043: "string",
+    1042: "string",
+    19: "string",
+    17: "binary",
+    1082: "date32",
+}
+MAX_DECIMAL_PRECISION = 38
+
+
+def _arrow_type(oid: int) -> Optional["pa.DataType"]:
+    if oid in _SIMPLE_TYPES:
+        return getattr(pa, _SIMPLE_TYPES[oid])()
+    if oid == 1114:
+        return pa.timestamp("us")
+    if oid == 1184:
+        return pa.timestamp("us", tz="UTC")
+    if oid == 1083:
+        return pa.time64("us")
+    if oid == 1186:
+        return pa.duration("us")
+    if oid in JSON_OIDS:
+        return pa.string()
+    if oid == UUID_OID:
+        return pa.uuid() if hasattr(pa, "uuid") else pa.string()
+    return None  # z.B. Arrays - aus dem ersten Batch ableiten
+
+
+class ArrowBatcher:
+    """Cursor tuples -> RecordBatches with one schema for the whole result"""
+
+    def __init__(self, description, metadata: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            description: ``cursor.description`` (available after the first fetch)
+            metadata: Schema metadata (e.g. the executed SQL)
+        """
+        if pa is None:
+            raise RuntimeError("Arrow export needs the optional package pyarrow (pip install pyarrow)")
+        self.columns = [
+            (d.name, d.type_code, getattr(d, "precision", None), getattr(d, "scale", None)) for d in description
+        ]
+        self.metadata = metadata or {}
+        self.schema: Optional["pa.Schema"] = None
+        self.rows = 0
+
+    def _column(self, index: int, values: List[Any], target) -> "pa.Array":
+        name, oid, _, _ = self.columns[index]
+        if oid == UUID_OID and target != pa.string():
+            values = [v.bytes if v is not None else None for v in values]
+        elif oid == UUID_OID or oid in JSON_OIDS or (oid == NUMERIC_OID and target == pa.string()):
+            values = [None if v is None else v if isinstance(v, str) else (
+                json.dumps(v, ensure_ascii=False) if oid in JSON_OIDS else str(v)
+            ) for v in values]
+        elif oid == NUMERIC_OID and any(isinstance(v, Decimal) and not v.is_finite() for v in values):
+            # decimal128 kennt kein NaN/Infinity - lieber abbrechen als still NULL exportieren
+            raise ValueError(f"Column {name!r}: NaN/Infinity cannot be exported as {target}")
+        return pa.array(values, type=target)
+
+    def _build_schema(self, columns: List[List[Any]]) -> "pa.Schema":
+        fields = []
+        for (name, oid, precision, scale), values in zip(self.columns, columns):
+            target = _arrow_type(oid)
+            if oid == NUMERIC_OID:
+                # Ohne typmod meldet psycopg2 65535: Stellenzahl beliebig, jede feste Scale könnte
+                # spätere Werte runden -> exakt als Text
+                if precision is not None and 0 < precision <= MAX_DECIMAL_PRECISION and 0 <= scale <= precision:
+                    target = pa.decimal128(precision, scale)
+                else:
+                    target = pa.string()
+            elif target is None:
+                inferred = pa.array(values).type
+                target = pa.string() if pa.types.is_null(inferred) else inferred
+            fields.append(pa.field(name, target))
+        return pa.schema(fields, metadata=self.metadata)
+
+    def batch(self, rows: List[tuple]) -> "pa.RecordBatch":
+        """One RecordBatch from ``fetchmany`` tuples"""
+        columns = [list(c) for c in zip(*rows)] if rows else [[] for _ in self.columns]
+        if self.schema is None:
+            self.schema = self._build_schema(columns)
+        arrays = [
+            self._column(i, values, self.schema.field(i).type) for i, values in enumerate(columns)
+        ]
+        self.rows += len(rows)
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class _Chunks:
+    """Write target that hands out what was written since the last ``take``"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class ArrowStreamEncoder:
+    """Arrow IPC stream, emitted piecewise (schema with the first batch, EOS at the end)"""
+
+    def __init__(self, compression: Optional[str] = None):
+        self.compression = compression or None
+        self._chunks = _Chunks()
+        self._writer = None
+
+    def write(self, batch: "pa.RecordBatch") -> bytes:
+        """Bytes of ``batch`` (preceded by the schema message on the first call)"""
+        if self._writer is None:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_stream(pa.PythonFile(self._chunks, mode="w"), batch.schema, options=options)
+        self._writer.write_batch(batch)
+        return self._chunks.take()
+
+    def close(self) -> bytes:
+        """End-of-stream marker"""
+        if self._writer is None:
+            return b""
+        self._writer.close()
+        return self._chunks.take()
+
+
+class ParquetSpool:
+    """Parquet file built batch by batch (one row group each) in a spooled temp file"""
+
+    def __init__(self, compression: Optional[str] = "zstd", spool_bytes: int = 64 * 1024 * 1024):
+        if pq is None:
+            raise RuntimeError("Parquet export needs the optional package pyarrow (pip install pyarrow)")
+        self.compression = compression or "none"
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self.size = 0
+        self._writer = None
+
+    def write(self, batch: "pa.RecordBatch") -> bytes:
+        """Append ``batch`` as a row group (nothing to send until ``finish``)"""
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.file, batch.schema, compression=self.compression)
+        self._writer.write_batch(batch)
+        return b""
+
+    def finish(self) -> int:
+        """Write the footer and rewind; returns the file size in bytes"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.size = self.file.tell()
+        self.file.seek(0)
+        return self.size
+
+    def read(self, size: int = 1024 * 1024) -> bytes:
+        return self.file.read(size)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.file.close()
@@ -0,0 +1,62 @@
+"""
+JSON Encoding für Datenbank-Werte
+
+Gleiche Konvertierungen wie FastAPIs jsonable_encoder (Decimal -> float,
+date/datetime -> ISO-String, UUID -> str), aber nur ein Durchlauf über die Zeilen.
+
+Mit ``orjson`` (optional, requirements.txt) laufen dict/str/int/float/UUID und
+date/datetime nativ in Rust; nur Decimal/timedelta gehen noch über
+``json_default``. Ohne orjson - oder für Werte, die orjson ablehnt (z.B. ints
+über 64 Bit) - wird die stdlib benutzt.
+"""
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+
+
+def json_default(value: Any) -> Any:
+    """Same conversions FastAPI's jsonable_encoder applies to DB values"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(
+        value, default=json_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON with the DB conversions above"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=json_default)
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_dumps(value)
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """Serialize result rows once into the JSON bytes sent to the client"""
+    return dumps(rows if isinstance(rows, list) else list(rows))
+
+
+def encode_ndjson_lines(rows: Iterable[Dict[str, Any]]) -> List[str]:
+    """One compact JSON document per row (NDJSON without the newlines)"""
+    return [dumps(row).decode("utf-8") for row in rows]
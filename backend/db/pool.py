@@ -0,0 +1,220 @@
+"""
+Async Connection Pool für PostgreSQL
+
+Wrappt den thread-safe psycopg2-Pool so, dass er aus async FastAPI-Handlern
+benutzt werden kann, ohne den Event Loop zu blockieren: Checkout ist durch
+eine Semaphore begrenzt (mit Timeout), alle blockierenden Aufrufe laufen in
+einem eigenen Thread-Pool.
+
+Wird der wartende Request abgebrochen (Client weg), schickt ``run(...,
+cancel=conn)`` einen Cancel-Request an das Backend und wartet, bis der Worker
+fertig ist - die Verbindung geht erst danach (per Rollback) zurück in den Pool.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from observability.logger import get_logger
+
+log = get_logger("db")
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be acquired within the timeout"""
+
+
+class DatabasePool:
+    """Bounded connection pool with health checks and saturation stats"""
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: float = 5.0,
+        check_on_checkout: bool = True,
+    ):
+        """
+        Args:
+            dsn: PostgreSQL connection string (DATABASE_URL)
+            min_size: Connections opened eagerly at startup
+            max_size: Upper bound of concurrently checked-out connections
+            acquire_timeout: Seconds a request may wait for a free connection
+            check_on_checkout: Run ``SELECT 1`` before handing out a connection
+        """
+        self.dsn = dsn
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.acquire_timeout = acquire_timeout
+        self.check_on_checkout = check_on_checkout
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        # Stats
+        self._in_use = 0
+        self._waiting = 0
+        self._acquired_total = 0
+        self._timeouts_total = 0
+        self._discarded_total = 0
+        self._cancelled_total = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    async def open(self):
+        """Create the pool and pre-open ``min_size`` connections"""
+        if not self.dsn:
+            log.warning("DATABASE_URL is missing in .env - pool disabled")
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_size, thread_name_prefix="db")
+        self._slots = asyncio.Semaphore(self.max_size)
+        # minconn=0: Verbindungen werden erst beim Prefill (bzw. on demand) geöffnet,
+        # damit ein nicht erreichbares Postgres den Startup nicht crasht.
+        self._pool = ThreadedConnectionPool(0, self.max_size, self.dsn)
+
+        try:
+            await self.run(self._prefill)
+            log.info(f"DB pool ready (min={self.min_size}, max={self.max_size})")
+        except psycopg2.Error as e:
+            log.warning(f"DB pool prefill failed, connecting on demand: {e}")
+
+    async def close(self):
+        """Close all connections and stop the worker threads"""
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _prefill(self):
+        conns = [self._pool.getconn() for _ in range(self.min_size)]
+        for conn in conns:
+            self._pool.putconn(conn)
+
+    async def run(self, fn: Callable, *args, cancel=None) -> Any:
+        """
+        Run a blocking callable on the pool's worker threads
+
+        Args:
+            cancel: Connection ``fn`` works on; if the caller is cancelled, its running
+                statement is cancelled in Postgres and ``run`` waits for ``fn`` to return
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, *args)
+        if cancel is None:
+            return await future
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._cancelled_total += 1
+            # Zwischen zwei Statements geht ein Cancel ins Leere - so lange wiederholen, bis fn fertig ist
+            while not future.done():
+                try:
+                    await loop.run_in_executor(None, cancel.cancel)
+                except psycopg2.Error:
+                    pass  # Verbindung schon zu - fn scheitert ohnehin gleich
+                await asyncio.wait({future}, timeout=1.0)
+            if not future.cancelled():
+                future.exception()  # abgeholt; der Aufrufer bekommt CancelledError
+            raise
+
+    def _checkout(self):
+        """Blocking checkout incl. health check (runs in a worker thread)"""
+        conn = self._pool.getconn()
+        if not self._is_healthy(conn):
+            # Kaputte Verbindung verwerfen und einmal neu versuchen
+            self._discarded_total += 1
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if not self.check_on_checkout:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkin(self, conn):
+        self._pool.putconn(conn, close=bool(conn.closed))
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Check out a connection for the duration of the ``async with`` block
+
+        Raises:
+            PoolTimeoutError: if no connection frees up within ``acquire_timeout``
+        """
+        if self._pool is None:
+            raise Exception("DATABASE_URL is missing in .env")
+
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts_total += 1
+            raise PoolTimeoutError(
+                f"No database connection available within {self.acquire_timeout}s "
+                f"(max_size={self.max_size})"
+            )
+        finally:
+            self._waiting -= 1
+
+        try:
+            conn = await self.run(self._checkout)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - started
+        self._acquired_total += 1
+        self._wait_seconds_total += waited
+        self._wait_seconds_max = max(self._wait_seconds_max, waited)
+        self._in_use += 1
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            try:
+                await self.run(self._checkin, conn)
+            finally:
+                self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool saturation for sizing"""
+        open_conns = 0
+        if self._pool is not None:
+            open_conns = len(self._pool._pool) + len(self._pool._used)
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "open": open_conns,
+            "in_use": self._in_use,
+            "idle": max(0, open_conns - self._in_use),
+            "waiting": self._waiting,
+            "utilization": round(self._in_use / self.max_size, 3),
+            "acquired_total": self._acquired_total,
+            "acquire_timeouts_total": self._timeouts_total,
+            "discarded_total": self._discarded_total,
+            "cancelled_total": self._cancelled_total,
+            "acquire_wait_avg_ms": round(
+                1000 * self._wait_seconds_total / self._acquired_total, 3
+            ) if self._acquired_total else 0.0,
+            "acquire_wait_max_ms": round(1000 * self._wait_seconds_max, 3),
+        }
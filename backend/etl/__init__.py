@@ -0,0 +1,3 @@
+"""
+ETL Package - Testdaten-Generator und COPY Bulk Loader
+"""
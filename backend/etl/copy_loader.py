@@ -0,0 +1,221 @@
+"""
+COPY Bulk Loader
+
+Spaltenweise Batches werden ins COPY-Textformat (Tab-getrennt) kodiert
+und per ``COPY ... FROM STDIN`` geladen. Jeder Worker-Prozess hat eine
+eigene Verbindung und einen eigenen RNG-Stream, erzeugt und lädt seinen Anteil
+in Chunks fester Größe (Speicher bleibt begrenzt) und committet pro Chunk.
+
+CLI::
+
+    python -m etl.copy_loader --rows 10000000 --workers 4
+    python -m etl.copy_loader --table sales --rows 1000000 --products 20 --customers 50
+    python -m etl.copy_loader --rows 5000000 --dry-run     # nur generieren + kodieren
+"""
+import argparse
+import datetime
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from etl.generator import SalesGenerator, TransactionGenerator, format_cents
+
+
+def _escape(values: np.ndarray) -> np.ndarray:
+    """COPY text format: backslash, tab and newlines must be escaped"""
+    values = np.char.replace(values, "\\", "\\\\")
+    values = np.char.replace(values, "\t", "\\t")
+    values = np.char.replace(values, "\n", "\\n")
+    return np.char.replace(values, "\r", "\\r")
+
+
+def encode_copy_batch(batch: Dict[str, np.ndarray], columns: Sequence[str], money_columns: Sequence[str] = ()) -> bytes:
+    """One batch -> COPY text payload (no NULLs in generated data)"""
+    encoded = []
+    for name in columns:
+        values = batch[name]
+        if name in money_columns:
+            values = format_cents(values)
+        elif values.dtype.kind in "US":
+            # Wenige verschiedene Texte -> nur die eindeutigen Werte escapen
+            uniques, inverse = np.unique(values, return_inverse=True)
+            values = _escape(uniques.astype(str))[inverse]
+        else:
+            values = values.astype(str)  # ints, datetime64[D] -> 'YYYY-MM-DD'
+        encoded.append(values.tolist())
+    return ("\n".join(map("\t".join, zip(*encoded))) + "\n").encode("utf-8")
+
+
+def _load_share(
+    dsn: Optional[str],
+    table: str,
+    generator,
+    rows: int,
+    chunk_rows: int,
+    seed: np.random.SeedSequence,
+    progress,
+    worker_id: int,
+) -> Dict[str, float]:
+    """Worker process: generate + COPY ``rows`` rows in chunks"""
+    rng = np.random.default_rng(seed)
+    timings = {"generate_s": 0.0, "encode_s": 0.0, "copy_s": 0.0, "rows": 0}
+    conn = None
+    if dsn:
+        import psycopg2
+
+        conn = psycopg2.connect(dsn)
+        with conn.cursor() as cur:
+            # Bulk-Load: Commit wartet nicht auf den WAL-Flush
+            cur.execute("SET synchronous_commit = off")
+        conn.commit()
+    copy_sql = f"COPY public.{table} ({', '.join(generator.columns)}) FROM STDIN"
+
+    try:
+        remaining = rows
+        while remaining > 0:
+            n = min(chunk_rows, remaining)
+            started = time.perf_counter()
+            batch = generator.batch(n, rng)
+            generated = time.perf_counter()
+            payload = encode_copy_batch(batch, generator.columns, generator.money_columns)
+            encoded = time.perf_counter()
+            if conn is not None:
+                with conn.cursor() as cur:
+                    cur.copy_expert(copy_sql, io.BytesIO(payload))
+                conn.commit()
+            copied = time.perf_counter()
+
+            timings["generate_s"] += generated - started
+            timings["encode_s"] += encoded - generated
+            timings["copy_s"] += copied - encoded
+            timings["rows"] += n
+            remaining -= n
+            progress.put((worker_id, n))
+    finally:
+        if conn is not None:
+            conn.close()
+    return timings
+
+
+class BulkLoader:
+    """Parallel generate + COPY into one table"""
+
+    def __init__(self, dsn: Optional[str], table: str, generator, workers: int = 4, chunk_rows: int = 100_000):
+        """
+        Args:
+            dsn: Postgres DSN (None = dry run: generate and encode only)
+            table: Target table in ``public``
+            generator: TransactionGenerator / SalesGenerator
+            workers: Worker processes (each with its own connection)
+            chunk_rows: Rows per COPY (bounds memory per worker)
+        """
+        self.dsn = dsn
+        self.table = table
+        self.generator = generator
+        self.workers = max(1, workers)
+        self.chunk_rows = chunk_rows
+
+    def load(self, rows: int, seed: int = 0, report_every: float = 2.0, out=sys.stdout) -> Dict[str, Any]:
+        """
+        Load ``rows`` rows, printing progress + throughput every ``report_every`` seconds
+
+        Returns:
+            Summary with rows, seconds, rows_per_sec and per-phase worker seconds
+        """
+        shares = [rows // self.workers + (1 if i < rows % self.workers else 0) for i in range(self.workers)]
+        seeds = np.random.SeedSequence(seed).spawn(self.workers)
+        started = time.perf_counter()
+        done = 0
+        last_report = started
+
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(self.workers) as pool:
+            progress = manager.Queue()
+            futures = [
+                pool.submit(
+                    _load_share, self.dsn, self.table, self.generator, share, self.chunk_rows,
+                    seeds[i], progress, i,
+                )
+                for i, share in enumerate(shares) if share
+            ]
+            while done < rows and not any(f.done() and f.exception() for f in futures):
+                try:
+                    _, n = progress.get(timeout=0.5)
+                    done += n
+                except queue.Empty:
+                    pass
+                now = time.perf_counter()
+                if done and (now - last_report >= report_every or done >= rows):
+                    elapsed = now - started
+                    print(
+                        f"  {done:>12,} / {rows:,} rows ({done / rows:6.1%})  "
+                        f"{done / elapsed:>12,.0f} rows/s",
+                        file=out,
+                        flush=True,
+                    )
+                    last_report = now
+            results = [f.result() for f in futures]  # re-raises worker errors
+
+        elapsed = time.perf_counter() - started
+        loaded = sum(int(r["rows"]) for r in results)
+        return {
+            "table": self.table,
+            "rows": loaded,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(loaded / elapsed) if elapsed else None,
+            "workers": self.workers,
+            "chunk_rows": self.chunk_rows,
+            "dry_run": self.dsn is None,
+            # Summe über alle Worker (CPU-Sekunden je Phase)
+            "generate_s": round(sum(r["generate_s"] for r in results), 3),
+            "encode_s": round(sum(r["encode_s"] for r in results), 3),
+            "copy_s": round(sum(r["copy_s"] for r in results), 3),
+        }
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="Generate test data and bulk load it with COPY")
+    parser.add_argument("--table", choices=("transactions", "sales"), default="transactions")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk", type=int, default=100_000, help="Rows per COPY chunk")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=today.replace(year=today.year - 3))
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=today)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--products", type=int, default=20, help="sales: existing product ids 1..N")
+    parser.add_argument("--customers", type=int, default=50, help="sales: existing customer ids 1..N")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--dry-run", action="store_true", help="Generate + encode only, no database")
+    args = parser.parse_args(argv)
+
+    if not args.dry_run and not args.dsn:
+        parser.error("DATABASE_URL is missing in .env (or pass --dsn / --dry-run)")
+
+    if args.table == "transactions":
+        generator = TransactionGenerator(args.start, args.end)
+    else:
+        generator = SalesGenerator(args.start, args.end, args.products, args.customers, seed=args.seed)
+
+    loader = BulkLoader(None if args.dry_run else args.dsn, args.table, generator, args.workers, args.chunk)
+    print(f"Loading {args.rows:,} rows into {args.table} ({loader.workers} workers, {args.chunk:,} rows/chunk)")
+    summary = loader.load(args.rows, seed=args.seed)
+    print(
+        f"Done: {summary['rows']:,} rows in {summary['seconds']:.1f}s = {summary['rows_per_sec']:,} rows/s "
+        f"(worker time: generate {summary['generate_s']:.1f}s, encode {summary['encode_s']:.1f}s, "
+        f"copy {summary['copy_s']:.1f}s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
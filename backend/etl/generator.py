@@ -0,0 +1,159 @@
+"""
+Vektorisierter Testdaten-Generator
+
+Erzeugt spaltenweise Batches (NumPy-Arrays) statt einzelner Dicts, damit
+zig Millionen Zeilen in Sekunden entstehen. Verteilungen:
+
+- Kategorien mit festen Anteilen, Beträge pro Kategorie log-normal (Cent-genau)
+- Miete am Monatsanfang, Gehalt zum Monatsende, Restaurant am Wochenende
+  häufiger, Dezember mit mehr Ausgaben
+"""
+import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+# name: (Anteil, Median in Euro, Streuung (sigma), Vorzeichen, Beschreibungen)
+TRANSACTION_PROFILE = {
+    "Lebensmittel": (0.38, 45.0, 0.6, -1, ["Einkauf Supermarkt", "Wocheneinkauf", "Bäckerei", "Wochenmarkt"]),
+    "Transport": (0.16, 18.0, 0.8, -1, ["Monatskarte Bahn", "Tankstelle", "Taxi", "Parkhaus"]),
+    "Restaurant": (0.16, 32.0, 0.5, -1, ["Italiener Abendessen", "Mittagessen", "Café", "Lieferdienst"]),
+    "Technik": (0.06, 180.0, 1.1, -1, ["Elektronikmarkt", "Online-Bestellung", "Zubehör", "Neues Laptop"]),
+    "Miete": (0.12, 1100.0, 0.2, -1, ["Miete", "Nebenkosten"]),
+    "Gehalt": (0.12, 3300.0, 0.25, 1, ["Gehalt", "Bonus"]),
+}
+MONTH_NAMES = np.array([
+    "Januar", "Februar", "März", "April", "Mai", "Juni",
+    "Juli", "August", "September", "Oktober", "November", "Dezember",
+])
+
+
+def _day_weights(days: np.ndarray, weekend: float = 1.0, december: float = 1.0) -> np.ndarray:
+    """Sampling weights over a range of datetime64[D] days"""
+    weekday = (days.astype("int64") - 4) % 7  # 1970-01-01 war ein Donnerstag -> 0 = Montag
+    month = days.astype("datetime64[M]").astype("int64") % 12 + 1
+    weights = np.ones(len(days))
+    weights[weekday >= 5] *= weekend
+    weights[month == 12] *= december
+    return weights / weights.sum()
+
+
+def format_cents(cents: np.ndarray) -> np.ndarray:
+    """Integer cents -> exact decimal strings ('-1200.50'), no float rounding"""
+    sign = np.where(cents < 0, "-", "")
+    absolute = np.abs(cents)
+    units = (absolute // 100).astype(str)
+    fraction = np.char.zfill((absolute % 100).astype(str), 2)
+    return np.char.add(np.char.add(np.char.add(sign, units), "."), fraction)
+
+
+class TransactionGenerator:
+    """Columnar batches for ``public.transactions``"""
+
+    columns = ("date", "category", "amount", "description")
+    money_columns = ("amount",)  # int64 Cent
+
+    def __init__(self, start: datetime.date, end: datetime.date, profile: Optional[dict] = None):
+        """
+        Args:
+            start: First booking date (inclusive)
+            end: Last booking date (inclusive)
+            profile: Category profile, defaults to TRANSACTION_PROFILE
+        """
+        self.profile = profile or TRANSACTION_PROFILE
+        self.days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        self.categories = np.array(list(self.profile))
+        shares = np.array([p[0] for p in self.profile.values()])
+        self.shares = shares / shares.sum()
+        self.medians = np.log([p[1] for p in self.profile.values()])
+        self.sigmas = np.array([p[2] for p in self.profile.values()])
+        self.signs = np.array([p[3] for p in self.profile.values()])
+        self.descriptions = [np.array(p[4]) for p in self.profile.values()]
+
+        # Feste Termine nur innerhalb [start, end] und des jeweiligen Monats:
+        # Miete am 1.-3., Gehalt an den letzten 5 Tagen (Februar 24./25.-28./29.)
+        months = self.days.astype("datetime64[M]")
+        day_in_month = self.days - months.astype("datetime64[D]")
+        days_to_end = (months + 1).astype("datetime64[D]") - 1 - self.days
+        self.fixed_days = {
+            "Miete": self.days[day_in_month < np.timedelta64(3, "D")],
+            "Gehalt": self.days[days_to_end < np.timedelta64(5, "D")],
+        }
+        self.day_weights = {
+            "Restaurant": _day_weights(self.days, weekend=2.5, december=1.4),
+            None: _day_weights(self.days, weekend=1.2, december=1.3),
+        }
+
+    def batch(self, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """
+        Returns:
+            {"date": datetime64[D], "category": str, "amount": int64 cents, "description": str}
+        """
+        category_idx = rng.choice(len(self.categories), size=n, p=self.shares)
+        amount = np.exp(rng.normal(self.medians[category_idx], self.sigmas[category_idx]))
+        cents = np.round(amount * 100).astype("int64") * self.signs[category_idx]
+
+        dates = np.empty(n, dtype="datetime64[D]")
+        descriptions = np.empty(n, dtype=object)
+        for i, name in enumerate(self.categories):
+            mask = category_idx == i
+            count = int(mask.sum())
+            if not count:
+                continue
+            if name in self.fixed_days:
+                # Zeitraum ohne passenden Termin (z.B. 10.-20.) -> beliebiger Tag
+                candidates = self.fixed_days[name] if len(self.fixed_days[name]) else self.days
+                picked = candidates[rng.integers(0, len(candidates), size=count)]
+            else:
+                weights = self.day_weights.get(name, self.day_weights[None])
+                picked = self.days[rng.choice(len(self.days), size=count, p=weights)]
+            dates[mask] = picked
+
+            texts = self.descriptions[i][rng.integers(0, len(self.descriptions[i]), size=count)]
+            if name in self.fixed_days:
+                month_no = picked.astype("datetime64[M]").astype("int64") % 12
+                texts = np.char.add(np.char.add(texts, " "), MONTH_NAMES[month_no])
+            descriptions[mask] = texts
+
+        return {
+            "date": dates,
+            "category": self.categories[category_idx],
+            "amount": cents,
+            "description": descriptions.astype(str),
+        }
+
+
+class SalesGenerator:
+    """Columnar batches for the ``sales`` demo table (products/customers must exist)"""
+
+    columns = ("product_id", "customer_id", "quantity", "total_amount", "sale_date")
+    money_columns = ("total_amount",)
+
+    def __init__(self, start: datetime.date, end: datetime.date, products: int = 20, customers: int = 50, seed: int = 0):
+        """
+        Args:
+            start: First sale date (inclusive)
+            end: Last sale date (inclusive)
+            products: Product ids 1..products
+            customers: Customer ids 1..customers
+            seed: Seed for the (fixed) product price list
+        """
+        self.days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        self.day_weights = _day_weights(self.days, weekend=1.6, december=1.8)
+        prices = np.random.default_rng(seed)
+        self.prices = np.round(np.exp(prices.normal(np.log(60), 1.0, size=products)) * 100).astype("int64")
+        # Zipf-artig: wenige Bestseller, langer Schwanz
+        popularity = 1.0 / np.arange(1, products + 1) ** 1.1
+        self.popularity = popularity / popularity.sum()
+        self.customers = customers
+
+    def batch(self, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        product_idx = rng.choice(len(self.prices), size=n, p=self.popularity)
+        quantity = np.minimum(rng.geometric(0.55, size=n), 10)
+        return {
+            "product_id": product_idx + 1,
+            "customer_id": rng.integers(1, self.customers + 1, size=n),
+            "quantity": quantity,
+            "total_amount": self.prices[product_idx] * quantity,
+            "sale_date": self.days[rng.choice(len(self.days), size=n, p=self.day_weights)],
+        }
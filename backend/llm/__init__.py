@@ -0,0 +1,3 @@
+"""
+LLM Package - Ollama Client und Text-to-SQL Hilfen
+"""
@@ -0,0 +1,361 @@
+"""
+Pool mehrerer Ollama-Instanzen
+
+Verteilt Generierungen auf mehrere Ollama-Prozesse (z.B. einer pro CPU-Box):
+
+- Least-Outstanding-Requests: jede Anfrage geht an die gesunde Instanz mit den
+  wenigsten laufenden Requests (Gleichstand: niedrigere geglättete Latenz).
+- Health Probes: ``GET /api/tags`` in festen Abständen; eine Instanz ohne das
+  Modell, mit Verbindungsfehler oder 5xx fällt aus der Rotation, bis die
+  nächste Probe wieder erfolgreich ist (dann wird sie erneut vorgewärmt).
+- Hedging (optional): Ist nach ``hedge_after_ms`` noch keine Antwort da, geht
+  ein Duplikat an eine zweite Instanz. Die erste gültige Antwort gewinnt, der
+  Verlierer wird abgebrochen (Ollama stoppt die Generierung beim Disconnect).
+  Ein Fehler der ersten Instanz führt sofort zu einem Versuch auf einer anderen.
+
+Coalescing, Keep-Alive und Timings kommen unverändert aus ``OllamaClient``.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from llm.ollama_client import OllamaClient, OllamaError
+from observability.logger import get_logger
+
+log = get_logger("llm")
+
+
+class Backend:
+    """One Ollama instance and its routing state"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.tags_url = url.rsplit("/api/", 1)[0] + "/api/tags"
+        self.healthy = True
+        self.outstanding = 0
+        self.latency_ms: Optional[float] = None  # EWMA
+        self.warmup: Optional[Dict[str, Any]] = None
+
+        # Stats
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.hedge_wins = 0
+        self.last_error: Optional[str] = None
+        self.last_probe: Optional[float] = None
+
+    def observe(self, seconds: float, alpha: float = 0.2):
+        ms = seconds * 1000
+        self.latency_ms = ms if self.latency_ms is None else (1 - alpha) * self.latency_ms + alpha * ms
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency_ms, 3) if self.latency_ms is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "hedge_wins": self.hedge_wins,
+            "last_error": self.last_error,
+            "last_probe": self.last_probe,
+            "warmup": self.warmup,
+        }
+
+
+class OllamaPool(OllamaClient):
+    """OllamaClient that spreads generations over several instances"""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        model: str,
+        timeout: float = 120.0,
+        max_connections: int = 10,
+        max_keepalive: int = 5,
+        keep_alive: Optional[str] = None,
+        hedge_after_ms: float = 0.0,
+        probe_interval: float = 15.0,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ):
+        """
+        Args:
+            urls: ``/api/generate`` endpoints of all instances (OLLAMA_URLS)
+            model: Default model name (OLLAMA_MODEL)
+            timeout: Request timeout in seconds
+            max_connections: Open connections per instance
+            max_keepalive: Idle connections kept per instance
+            keep_alive: How long Ollama keeps the model loaded
+            hedge_after_ms: Send a duplicate to a second instance after this long (0 = off)
+            probe_interval: Seconds between health probes (0 = no probes, never mark down)
+            accept: Whether a response is usable (e.g. contains valid SQL); an unusable
+                answer is retried once on another instance and only wins if that fails too
+        """
+        backends = [Backend(url) for url in urls]
+        super().__init__(
+            backends[0].url,
+            model,
+            timeout=timeout,
+            max_connections=max_connections * len(backends),
+            max_keepalive=max_keepalive * len(backends),
+            keep_alive=keep_alive,
+        )
+        self.backends: List[Backend] = backends
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms > 0 else None
+        self.probe_interval = probe_interval
+        self.accept = accept
+        self._probe_task: Optional[asyncio.Task] = None
+        self._warm_request: Optional[tuple] = None
+
+        # Stats
+        self._hedged_total = 0
+        self._hedge_wins_total = 0
+        self._failovers_total = 0
+
+    async def open(self):
+        await super().open()
+        if self.probe_interval > 0 and self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        await super().close()
+
+    # --- Routing ------------------------------------------------------------
+
+    def _pick(self, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        """Least outstanding requests among healthy instances (any instance if none is healthy)"""
+        candidates = [b for b in self.backends if b not in exclude]
+        healthy = [b for b in candidates if b.healthy]
+        if not (healthy or candidates):
+            return None
+        return min(
+            healthy or candidates,
+            key=lambda b: (b.outstanding, b.latency_ms if b.latency_ms is not None else 0.0),
+        )
+
+    def _mark_failure(self, backend: Backend, error: Exception):
+        backend.failures += 1
+        backend.last_error = str(error) or type(error).__name__
+        backend.observe(self.timeout)  # Fehler zählen wie ein Timeout -> rutscht im Ranking nach hinten
+        # Ohne Probes käme die Instanz nie zurück - dann nur zählen
+        down = isinstance(error, httpx.TransportError) or (
+            isinstance(error, OllamaError) and " 5" in str(error)[:16]
+        )
+        if down and self.probe_interval > 0 and backend.healthy:
+            backend.healthy = False
+            log.warning(f"Ollama backend {backend.url} marked down: {backend.last_error}")
+
+    def _launch(
+        self, backend: Backend, prompt: str, model: str, options: Dict[str, Any]
+    ) -> asyncio.Task:
+        """Start a request on ``backend``; counted as outstanding from now until the task is done"""
+        backend.outstanding += 1
+        backend.requests += 1
+
+        def finished(task: asyncio.Task):
+            backend.outstanding -= 1
+            if task.cancelled():
+                backend.cancelled += 1
+
+        task = asyncio.create_task(self._post_to(backend, prompt, model, options))
+        task.add_done_callback(finished)
+        return task
+
+    async def _post_to(
+        self, backend: Backend, prompt: str, model: str, options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            response = await self._client.post(
+                backend.url, json=self._payload(prompt, model, options, stream=False)
+            )
+            if response.status_code != 200:
+                raise OllamaError(f"Ollama Error {response.status_code}: {response.text}")
+            result = response.json()
+        except (httpx.HTTPError, OllamaError, ValueError) as e:
+            self._mark_failure(backend, e)
+            raise
+        backend.observe(time.perf_counter() - started)
+        return result
+
+    async def _post(
+        self, prompt: str, model: str, options: Dict[str, Any], record: bool = True
+    ) -> Dict[str, Any]:
+        if record:
+            self._generations_total += 1
+        result = await self._hedged(prompt, model, options)
+        if record:
+            self._record_timings(result)
+        return result
+
+    async def _hedged(self, prompt: str, model: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Primary attempt + at most one hedge/failover attempt; first usable answer wins"""
+        primary = self._pick()
+        tried = [primary]
+        # Task -> (Instanz, Grund des Starts: primary, hedge oder failover)
+        attempts: Dict[asyncio.Task, Tuple[Backend, str]] = {
+            self._launch(primary, prompt, model, options): (primary, "primary")
+        }
+        unusable: Optional[Dict[str, Any]] = None
+        error: Optional[Exception] = None
+
+        def second_attempt(reason: str) -> bool:
+            backend = self._pick(exclude=tried) if len(tried) < 2 else None
+            if backend is None:
+                return False
+            tried.append(backend)
+            if reason == "hedge":
+                self._hedged_total += 1
+            else:
+                self._failovers_total += 1
+            attempts[self._launch(backend, prompt, model, options)] = (backend, reason)
+            return True
+
+        try:
+            while attempts:
+                wait_for = self.hedge_after if len(tried) < 2 else None
+                done, _ = await asyncio.wait(
+                    attempts, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if not second_attempt("hedge"):
+                        tried.append(primary)  # keine zweite Instanz frei - nicht erneut versuchen
+                    continue
+                for task in done:
+                    backend, reason = attempts.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = error or e
+                        if not attempts:
+                            second_attempt("failover")
+                        continue
+                    if self.accept is None or self.accept(result):
+                        if reason == "hedge":
+                            backend.hedge_wins += 1
+                            self._hedge_wins_total += 1
+                        return result
+                    unusable = unusable or result
+                    if not attempts:
+                        second_attempt("failover")  # unbrauchbare Antwort: noch eine Instanz fragen
+        finally:
+            for task in attempts:
+                task.cancel()  # Verlierer abbrechen
+
+        if unusable is not None:
+            return unusable
+        raise error
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream from the least-loaded instance (no hedging - tokens are already on the wire)"""
+        if self._client is None:
+            await self.open()
+
+        self._requests_total += 1
+        self._generations_total += 1
+        backend = self._pick()
+        backend.outstanding += 1
+        backend.requests += 1
+        started = time.perf_counter()
+        try:
+            async for chunk in self._stream_from(backend.url, prompt, model or self.model, options or {}):
+                yield chunk
+        except (httpx.HTTPError, OllamaError) as e:
+            self._mark_failure(backend, e)
+            raise
+        finally:
+            backend.outstanding -= 1
+        backend.observe(time.perf_counter() - started)
+
+    # --- Warm-up + Health ---------------------------------------------------
+
+    async def warm_up(self, prefix: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Warm every healthy instance (each has its own KV cache)
+
+        Returns:
+            Timings of the slowest instance plus the number of warmed ``backends``
+        """
+        if self._client is None:
+            await self.open()
+        self._warm_request = (prefix, options)
+        results = await asyncio.gather(
+            *(self._warm_backend(b) for b in self.backends if b.healthy), return_exceptions=True
+        )
+        warmed = [r for r in results if isinstance(r, dict)]
+        if not warmed:
+            errors = [r for r in results if isinstance(r, Exception)]
+            raise errors[0] if errors else OllamaError("No healthy Ollama backend")
+        slowest = max(warmed, key=lambda t: t["wall_ms"])
+        self._warmup = {**slowest, "backends": len(warmed), "at": time.time()}
+        return self._warmup
+
+    async def _warm_backend(self, backend: Backend) -> Dict[str, Any]:
+        prefix, options = self._warm_request
+        started = time.perf_counter()
+        result = await self._launch(backend, prefix, self.model, {**(options or {}), "num_predict": 1})
+        backend.warmup = {
+            **self.timings(result),
+            "prefix_tokens": result.get("prompt_eval_count", 0),
+            "wall_ms": round(1000 * (time.perf_counter() - started), 3),
+        }
+        return backend.warmup
+
+    async def _rewarm(self, backend: Backend):
+        try:
+            await self._warm_backend(backend)
+        except Exception as e:
+            log.warning(f"Warm-up of recovered backend {backend.url} failed: {e}")
+
+    async def _probe(self, backend: Backend):
+        error = None
+        try:
+            response = await self._client.get(backend.tags_url, timeout=min(5.0, self.timeout))
+            if response.status_code != 200:
+                error = f"probe HTTP {response.status_code}"
+            else:
+                models = {m.get("name") for m in response.json().get("models", [])}
+                if self.model not in models and f"{self.model}:latest" not in models:
+                    error = f"model {self.model} not available"
+        except (httpx.HTTPError, ValueError) as e:
+            error = f"probe failed: {str(e) or type(e).__name__}"
+        backend.last_probe = time.time()
+
+        if error is None and not backend.healthy:
+            backend.healthy = True
+            log.info(f"Ollama backend {backend.url} is back")
+            if self._warm_request is not None:
+                asyncio.create_task(self._rewarm(backend))
+        elif error is not None:
+            backend.last_error = error
+            if backend.healthy:
+                backend.healthy = False
+                log.warning(f"Ollama backend {backend.url} marked down: {error}")
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await asyncio.gather(*(self._probe(b) for b in self.backends))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "hedge_after_ms": round(self.hedge_after * 1000, 3) if self.hedge_after else 0,
+            "hedged_total": self._hedged_total,
+            "hedge_wins_total": self._hedge_wins_total,
+            "failovers_total": self._failovers_total,
+            "healthy_backends": sum(1 for b in self.backends if b.healthy),
+            "outstanding": sum(b.outstanding for b in self.backends),
+            "backends": [b.stats() for b in self.backends],
+        }
@@ -0,0 +1,298 @@
+"""
+Deterministischer Fast-Path für häufige Fragen
+
+Regel-/Grammatik-basierter Intent-Matcher (Deutsch + Englisch) für die Muster
+aus dem README: "die letzten N Transaktionen", "Summe aller Ausgaben",
+"wie viel für <Kategorie>", "Transaktionen aus <Monat> <Jahr>", "teuerste
+Transaktion" usw. Eine Regel gilt nur als sicherer Treffer, wenn sie die
+*gesamte* normalisierte Frage abdeckt - alles andere geht weiter an das LLM.
+"""
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+MONTHS = {
+    "january": 1, "januar": 1, "jänner": 1, "jan": 1,
+    "february": 2, "februar": 2, "feb": 2,
+    "march": 3, "märz": 3, "maerz": 3, "mär": 3, "mar": 3,
+    "april": 4, "apr": 4,
+    "may": 5, "mai": 5,
+    "june": 6, "juni": 6, "jun": 6,
+    "july": 7, "juli": 7, "jul": 7,
+    "august": 8, "aug": 8,
+    "september": 9, "sept": 9, "sep": 9,
+    "october": 10, "oktober": 10, "oct": 10, "okt": 10,
+    "november": 11, "nov": 11,
+    "december": 12, "dezember": 12, "dec": 12, "dez": 12,
+}
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "twenty": 20,
+    "eins": 1, "einer": 1, "zwei": 2, "drei": 3, "vier": 4, "fünf": 5, "sechs": 6,
+    "sieben": 7, "acht": 8, "neun": 9, "zehn": 10, "zwanzig": 20,
+}
+
+# Grammatik-Bausteine
+SHOW = (
+    r"(?:(?:please |bitte |can you |could you |kannst du )?"
+    r"(?:show|list|display|give|get|return|find|zeige?|zeig|liste|gib|finde?)"
+    r"(?: me| mir| us| uns)?(?: bitte| please)? )?"
+)
+ALL = r"(?:(?:all|alle|sämtliche)(?: (?:of )?(?:the|my|die|meine))? |(?:the|my|die|meine) )?"
+TX = r"(?:transactions?|transaktionen|transaktion|buchungen|buchung|entries|einträge|umsätze)"
+EXPENSES = r"(?:expenses|expense|spendings?|ausgaben)"
+INCOME = r"(?:income|earnings|einnahmen|einkommen)"
+NUM = r"(?P<n>\d+|" + "|".join(NUMBER_WORDS) + r")"
+MONTH = r"(?P<month>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+YEAR = r"(?P<year>(?:19|20)\d{2})"
+AMOUNT = r"(?P<amount>\d+(?:[.,]\d{1,2})?)(?: ?(?:€|eur|euro|euros))?"
+QUOTED = r"[\"'„“‚‘`](?P<qcat>[^\"'„“‚‘`]+)[\"'“”‘’`]"
+CATEGORY = r"(?:" + QUOTED + r"|(?P<cat>[\wäöüß&-]+))"
+IN_CATEGORY = r"(?:(?:in |for |für |der |aus der |in der )?(?:the )?(?:category|kategorie) |(?:on|for|für|in) )"
+
+
+def quote_literal(value: str) -> str:
+    """SQL string literal (standard_conforming_strings: only quotes need doubling)"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def normalize(question: str) -> str:
+    text = re.sub(r"\s+", " ", question).strip().casefold()
+    return text.rstrip(" ?!.")
+
+
+class IntentMatch:
+    """A confident match: intent name, extracted parameters and rendered SQL"""
+
+    def __init__(self, intent: str, sql_template: str, params: Dict[str, Any]):
+        self.intent = intent
+        self.sql_template = sql_template
+        self.params = params
+
+    def render(self) -> str:
+        """Substitute parameters as safely quoted literals"""
+        literals = {}
+        for key, value in self.params.items():
+            if isinstance(value, bool):
+                raise TypeError(f"Unsupported intent parameter {key}={value!r}")
+            if isinstance(value, (int, Decimal)):
+                literals[key] = str(value)
+            elif isinstance(value, datetime.date):
+                literals[key] = quote_literal(value.isoformat()) + "::date"
+            else:
+                literals[key] = quote_literal(str(value))
+        return self.sql_template % literals
+
+    @property
+    def sql(self) -> str:
+        return self.render()
+
+
+class IntentMatcher:
+    """Full-match grammar rules that bypass the LLM for common questions"""
+
+    def __init__(self, categories: Iterable[str] = (), max_limit: int = 1000):
+        """
+        Args:
+            categories: Known category values; unquoted category words must match one
+            max_limit: Upper bound for "last N" style requests
+        """
+        self.categories = {c.casefold(): c for c in categories if c}
+        self.max_limit = max_limit
+        self._rules: List[Tuple[str, re.Pattern, Callable[[Dict[str, str]], Optional[IntentMatch]]]] = []
+        self._register_rules()
+
+        # Stats
+        self._hits: Dict[str, int] = {}
+        self._misses = 0
+
+    def _rule(self, name: str, patterns: Iterable[str], handler):
+        for pattern in patterns:
+            self._rules.append((name, re.compile(r"^" + pattern + r"$"), handler))
+
+    def _register_rules(self):
+        self._rule("last_n_transactions", [
+            SHOW + r"(?:the )?(?:last|latest|most recent|recent) " + NUM + r" " + TX,
+            SHOW + r"(?:die )?(?:letzten|neuesten|jüngsten) " + NUM + r" " + TX,
+        ], self._last_n)
+
+        self._rule("all_transactions", [
+            SHOW + ALL + TX,
+            r"(?:what are|welche sind) " + ALL + TX,
+        ], lambda g: IntentMatch(
+            "all_transactions",
+            "SELECT * FROM public.transactions ORDER BY date DESC",
+            {},
+        ))
+
+        self._rule("transactions_in_month", [
+            SHOW + ALL + TX + r" (?:from|in|for|during|of|aus|im|vom|von|für) " + MONTH + r" " + YEAR,
+            SHOW + ALL + TX + r" (?:from|in|for|aus|im|vom|von|für) (?P<mm>0?[1-9]|1[0-2])[/.-]" + YEAR,
+        ], self._month)
+
+        self._rule("total_expenses", [
+            r"(?:what is |what's |was ist |wie hoch ist |wie hoch sind |wie viel sind |show |zeige )?"
+            r"(?:the |my |die |meine )?(?:total|sum|gesamte?n?|summe)(?: sum)?(?: (?:of|aller|der))?"
+            r"(?: all| my| meiner)? " + EXPENSES,
+            r"(?:how much did i spend|how much have i spent|wie viel habe ich (?:insgesamt )?ausgegeben)"
+            r"(?: in total| total| insgesamt)?",
+            r"(?:total|gesamt) ?" + EXPENSES,
+            r"" + EXPENSES + r" (?:total|gesamt|insgesamt)",
+        ], lambda g: IntentMatch(
+            "total_expenses",
+            "SELECT SUM(amount) AS total_expenses FROM public.transactions WHERE amount < 0",
+            {},
+        ))
+
+        self._rule("total_income", [
+            r"(?:what is |what's |was ist |wie hoch ist |wie hoch sind |show |zeige )?"
+            r"(?:the |my |die |meine |mein )?(?:total|sum|gesamte?n?|summe)(?: sum)?(?: (?:of|aller|der|meiner))?"
+            r"(?: all| my)? " + INCOME,
+            r"(?:total|gesamt) ?" + INCOME,
+            r"how much did i earn(?: in total)?|wie viel habe ich (?:insgesamt )?verdient",
+        ], lambda g: IntentMatch(
+            "total_income",
+            "SELECT SUM(amount) AS total_income FROM public.transactions WHERE amount > 0",
+            {},
+        ))
+
+        self._rule("spend_on_category", [
+            r"how much did i spend " + IN_CATEGORY + CATEGORY,
+            r"how much have i spent " + IN_CATEGORY + CATEGORY,
+            r"(?:what is |what's )?(?:the )?(?:total|sum) (?:spent |of expenses |spending )?" + IN_CATEGORY + CATEGORY,
+            r"wie viel habe ich (?:insgesamt )?" + IN_CATEGORY + CATEGORY + r" ausgegeben",
+            r"(?:summe der )?ausgaben (?:für|in der kategorie|der kategorie) " + CATEGORY,
+        ], self._spend_on_category)
+
+        self._rule("transactions_in_category", [
+            SHOW + ALL + TX + r" " + IN_CATEGORY + CATEGORY,
+            SHOW + ALL + TX + r" (?:with|mit) (?:the )?(?:category|kategorie) " + CATEGORY,
+        ], self._category_list)
+
+        self._rule("expenses_greater_than", [
+            SHOW + ALL + EXPENSES + r" (?:greater than|more than|over|above|larger than|bigger than|"
+            r"über|größer als|mehr als|höher als|ab) " + AMOUNT,
+        ], self._expenses_over)
+
+        self._rule("most_expensive_transaction", [
+            r"(?:what was |what is |what's |which was |show |zeige |was war |welche war |welches war )?"
+            r"(?:the |my |die |meine |mein )?(?:most expensive|biggest|largest|highest|teuerste|größte|höchste) "
+            r"(?:" + TX + r"|expense|purchase|ausgabe|einkauf|kauf)",
+        ], lambda g: IntentMatch(
+            "most_expensive_transaction",
+            "SELECT * FROM public.transactions WHERE amount < 0 ORDER BY amount ASC LIMIT 1",
+            {},
+        ))
+
+        self._rule("expenses_by_category", [
+            SHOW + r"(?:the |my |die |meine )?(?:expenses|spending|ausgaben) (?:by|per|pro|nach|je) (?:category|kategorie)",
+            r"(?:how much did i spend|wie viel habe ich) (?:per|pro|in jeder|for each) (?:category|kategorie)(?: ausgegeben)?",
+        ], lambda g: IntentMatch(
+            "expenses_by_category",
+            "SELECT category, SUM(amount) AS total FROM public.transactions WHERE amount < 0 "
+            "GROUP BY category ORDER BY total ASC",
+            {},
+        ))
+
+    # --- Parameter-Extraktion -------------------------------------------------
+
+    def _number(self, raw: str) -> Optional[int]:
+        value = int(raw) if raw.isdigit() else NUMBER_WORDS.get(raw)
+        if value is None or value < 1 or value > self.max_limit:
+            return None
+        return value
+
+    def _category(self, groups: Dict[str, str], original: str) -> Optional[str]:
+        quoted = groups.get("qcat")
+        if quoted:
+            # Originale Schreibweise aus der (nicht case-gefoldeten) Frage übernehmen
+            m = re.search(re.escape(quoted), original, re.IGNORECASE)
+            value = m.group(0) if m else quoted
+            return self.categories.get(value.casefold(), value.strip())
+        # Ungequotete Wörter nur, wenn die Kategorie bekannt ist
+        return self.categories.get((groups.get("cat") or "").casefold())
+
+    def _last_n(self, g):
+        n = self._number(g["n"])
+        if n is None:
+            return None
+        return IntentMatch(
+            "last_n_transactions",
+            "SELECT * FROM public.transactions ORDER BY date DESC LIMIT %(n)s",
+            {"n": n},
+        )
+
+    def _month(self, g):
+        month = MONTHS[g["month"]] if g.get("month") else int(g["mm"])
+        year = int(g["year"])
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+        # Halboffener Bereich statt EXTRACT(): bleibt index-/partition-freundlich
+        return IntentMatch(
+            "transactions_in_month",
+            "SELECT * FROM public.transactions WHERE date >= %(start)s AND date < %(end)s ORDER BY date",
+            {"start": start, "end": end},
+        )
+
+    def _spend_on_category(self, g):
+        category = self._category(g, g["original"])
+        if category is None:
+            return None
+        return IntentMatch(
+            "spend_on_category",
+            # "Ausgaben für X": Gutschriften/Erstattungen der Kategorie nicht gegenrechnen
+            "SELECT SUM(amount) AS total FROM public.transactions WHERE category = %(category)s AND amount < 0",
+            {"category": category},
+        )
+
+    def _category_list(self, g):
+        category = self._category(g, g["original"])
+        if category is None:
+            return None
+        return IntentMatch(
+            "transactions_in_category",
+            "SELECT * FROM public.transactions WHERE category = %(category)s ORDER BY date DESC",
+            {"category": category},
+        )
+
+    def _expenses_over(self, g):
+        try:
+            amount = Decimal(g["amount"].replace(",", "."))
+        except InvalidOperation:
+            return None
+        # Ausgaben sind negativ gespeichert: "über 100" heißt amount < -100
+        return IntentMatch(
+            "expenses_greater_than",
+            "SELECT * FROM public.transactions WHERE amount < %(threshold)s ORDER BY amount ASC",
+            {"threshold": -amount},
+        )
+
+    # --- Public API -----------------------------------------------------------
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        """Return a confident IntentMatch or None (-> fall back to the LLM)"""
+        text = normalize(question)
+        for name, pattern, handler in self._rules:
+            m = pattern.match(text)
+            if m is None:
+                continue
+            groups = {k: v for k, v in m.groupdict().items() if v is not None}
+            groups["original"] = question
+            result = handler(groups)
+            if result is not None:
+                self._hits[name] = self._hits.get(name, 0) + 1
+                return result
+        self._misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        matched = sum(self._hits.values())
+        total = matched + self._misses
+        return {
+            "hits": dict(self._hits),
+            "matched": matched,
+            "fallbacks": self._misses,
+            "match_ratio": round(matched / total, 3) if total else 0.0,
+            "categories": sorted(self.categories.values()),
+        }
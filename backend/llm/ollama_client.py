@@ -0,0 +1,286 @@
+"""
+Shared Ollama Client
+
+Ein langlebiger httpx-Client mit begrenztem Connection Pool statt eines neuen
+Clients pro Request. Identische, gleichzeitig laufende Anfragen (gleicher
+normalisierter Prompt + Modell + Optionen) teilen sich eine einzige Generierung.
+
+Warm-up + Keep-Alive: Ollama hält das Modell mit ``keep_alive`` geladen und
+verwendet den KV-Cache für den längsten gemeinsamen Token-Präfix des vorherigen
+Requests wieder. Solange jeder Prompt mit dem byte-identischen System-Prompt
+beginnt und die Optionen gleich bleiben, wird pro Request nur noch die Frage
+selbst ausgewertet. ``warm_up`` lädt das Modell und füllt diesen Präfix vorab.
+
+Geht der letzte Wartende einer Generierung weg (Client-Abbruch), wird der
+HTTP-Request abgebrochen - Ollama stoppt die Generierung beim Disconnect.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+
+class OllamaError(Exception):
+    """Raised when Ollama answers with a non-200 status"""
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so trivially different prompts coalesce"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class OllamaClient:
+    """Keep-alive Ollama client with in-flight request coalescing"""
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        timeout: float = 120.0,
+        max_connections: int = 10,
+        max_keepalive: int = 5,
+        keep_alive: Optional[str] = None,
+    ):
+        """
+        Args:
+            url: Full ``/api/generate`` endpoint (OLLAMA_URL)
+            model: Default model name (OLLAMA_MODEL)
+            timeout: Request timeout in seconds
+            max_connections: Upper bound of open connections to Ollama
+            max_keepalive: Idle connections kept open for reuse
+            keep_alive: How long Ollama keeps the model loaded ("30m", "-1" = forever)
+        """
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self.keep_alive = keep_alive
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._warmup: Optional[Dict[str, Any]] = None
+
+        # Stats
+        self._requests_total = 0
+        self._generations_total = 0
+        self._coalesced_total = 0
+        self._cancelled_total = 0
+        self._timed_total = 0
+        self._prompt_eval_count_total = 0
+        self._prompt_eval_ms_total = 0.0
+        self._eval_count_total = 0
+        self._eval_ms_total = 0.0
+        self._load_ms_total = 0.0
+        self._last_timings: Optional[Dict[str, Any]] = None
+
+    async def open(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def request_key(prompt: str, model: str, options: Dict[str, Any]) -> str:
+        payload = json.dumps([prompt, model, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run a non-streaming generation, sharing it with identical in-flight calls
+
+        Args:
+            prompt: Full prompt (system prompt + question)
+            options: Ollama generation options, e.g. ``{"temperature": 0.1}``
+            model: Override the default model
+
+        Returns:
+            The decoded Ollama JSON response (``response``, ``eval_count``, ...)
+        """
+        if self._client is None:
+            await self.open()
+
+        model = model or self.model
+        options = options or {}
+        # Normalisiert wird nur der Key - gesendet wird der Prompt unverändert,
+        # sonst ginge der byte-identische Präfix (KV-Cache) verloren
+        key = self.request_key(normalize_prompt(prompt), model, options)
+        self._requests_total += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._post(prompt, model, options))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self._coalesced_total += 1
+
+        # shield: ein abgebrochener Wartender darf die geteilte Generierung nicht canceln,
+        # solange noch andere darauf warten
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                self._cancelled_total += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _forget(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Exception als "abgeholt" markieren, falls alle Wartenden schon weg sind
+            task.exception()
+
+    def _payload(self, prompt: str, model: str, options: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        payload = {"model": model, "prompt": prompt, "stream": stream, "options": options}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = int(self.keep_alive) if self.keep_alive.lstrip("-").isdigit() else self.keep_alive
+        return payload
+
+    async def _post(
+        self, prompt: str, model: str, options: Dict[str, Any], record: bool = True
+    ) -> Dict[str, Any]:
+        if record:
+            self._generations_total += 1
+        response = await self._client.post(
+            self.url, json=self._payload(prompt, model, options, stream=False)
+        )
+        if response.status_code != 200:
+            raise OllamaError(f"Ollama Error {response.status_code}: {response.text}")
+        result = response.json()
+        if record:
+            self._record_timings(result)
+        return result
+
+    @staticmethod
+    def timings(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Ollama's eval counters (durations are nanoseconds) in milliseconds, None where absent"""
+        def ms(key: str) -> Optional[float]:
+            return round(result[key] / 1e6, 3) if key in result else None
+
+        # Fehlende Felder (Fehler, Zwischen-Chunks, gecachter Prompt) sind unbekannt, nicht 0
+        return {
+            "load_ms": ms("load_duration"),
+            "prompt_eval_count": result.get("prompt_eval_count"),
+            "prompt_eval_ms": ms("prompt_eval_duration"),
+            "eval_count": result.get("eval_count"),
+            "eval_ms": ms("eval_duration"),
+            "total_ms": ms("total_duration"),
+        }
+
+    def _record_timings(self, result: Dict[str, Any]):
+        if "total_duration" not in result:
+            return
+        t = self.timings(result)
+        self._timed_total += 1
+        self._prompt_eval_count_total += t["prompt_eval_count"] or 0
+        self._prompt_eval_ms_total += t["prompt_eval_ms"] or 0
+        self._eval_count_total += t["eval_count"] or 0
+        self._eval_ms_total += t["eval_ms"] or 0
+        self._load_ms_total += t["load_ms"] or 0
+        self._last_timings = t
+
+    async def warm_up(self, prefix: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Load the model and evaluate the shared prompt prefix once
+
+        Uses the same options as real requests (changing e.g. ``num_ctx`` would
+        reload the model) and generates a single token.
+
+        Returns:
+            Timings of the warm-up call incl. model load time
+        """
+        if self._client is None:
+            await self.open()
+        started = time.perf_counter()
+        result = await self._post(
+            prefix, self.model, {**(options or {}), "num_predict": 1}, record=False
+        )
+        self._warmup = {
+            **self.timings(result),
+            "prefix_tokens": result.get("prompt_eval_count", 0),
+            "wall_ms": round(1000 * (time.perf_counter() - started), 3),
+            "at": time.time(),
+        }
+        return self._warmup
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a generation chunk by chunk (not coalesced)
+
+        Yields:
+            Ollama's NDJSON chunks; the last one has ``done: true`` and the eval counts
+        """
+        if self._client is None:
+            await self.open()
+
+        self._requests_total += 1
+        self._generations_total += 1
+        async for chunk in self._stream_from(self.url, prompt, model or self.model, options or {}):
+            yield chunk
+
+    async def _stream_from(
+        self, url: str, prompt: str, model: str, options: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async with self._client.stream(
+            "POST", url, json=self._payload(prompt, model, options, stream=True)
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise OllamaError(
+                    f"Ollama Error {response.status_code}: {body.decode('utf-8', 'replace')}"
+                )
+            async for line in response.aiter_lines():
+                if line.strip():
+                    chunk = json.loads(line)
+                    if chunk.get("done"):
+                        self._record_timings(chunk)
+                    yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        n = self._timed_total
+
+        def avg(total: float) -> float:
+            return round(total / n, 3) if n else 0.0
+
+        prefix_tokens = (self._warmup or {}).get("prefix_tokens", 0)
+        return {
+            "requests_total": self._requests_total,
+            "generations_total": self._generations_total,
+            "coalesced_total": self._coalesced_total,
+            "cancelled_total": self._cancelled_total,
+            "in_flight": len(self._in_flight),
+            "keep_alive": self.keep_alive,
+            "warmup": self._warmup,
+            "last_request": self._last_timings,
+            "avg_prompt_eval_count": avg(self._prompt_eval_count_total),
+            "avg_prompt_eval_ms": avg(self._prompt_eval_ms_total),
+            "avg_eval_count": avg(self._eval_count_total),
+            "avg_eval_ms": avg(self._eval_ms_total),
+            "avg_load_ms": avg(self._load_ms_total),
+            # Wird nur die Frage ausgewertet, liegt das deutlich unter dem Präfix
+            "prefix_reused": bool(prefix_tokens and n and avg(self._prompt_eval_count_total) < prefix_tokens),
+        }
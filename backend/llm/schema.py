@@ -0,0 +1,297 @@
+"""
+Schema-Katalog für den Prompt
+
+Liest Tabellen, Spalten, Typen, Kommentare und Primärschlüssel einmal aus
+``information_schema``/``pg_catalog`` und Beispielwerte für Text-Spalten mit
+wenigen Ausprägungen aus ``pg_stats`` (kein Scan der Tabellen). Ein billiger
+Fingerprint über ``information_schema.columns`` wird periodisch verglichen -
+nach DDL-Änderungen wird der Katalog neu geladen. Partitionen erscheinen nicht
+einzeln, nur ihre Elterntabelle.
+
+Pro Frage wählt ``select`` nur die relevanten Tabellen (Name, Synonyme,
+Spaltennamen, Beispielwerte); ``render`` erzeugt daraus den Schema-Block des
+Prompts. Kürzere Prompts = proportional weniger Prefill auf der CPU.
+"""
+import hashlib
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import psycopg2
+
+from observability.logger import get_logger
+
+log = get_logger("schema")
+
+# Partitionen tauchen in information_schema als eigene Tabellen auf
+IS_PARTITION_SQL = """EXISTS (
+    SELECT 1 FROM pg_class pc JOIN pg_namespace pn ON pn.oid = pc.relnamespace
+    WHERE pn.nspname = c.table_schema AND pc.relname = c.table_name AND pc.relispartition
+)"""
+FINGERPRINT_SQL = """
+SELECT count(*), md5(coalesce(string_agg(
+    table_name || '.' || column_name || ':' || data_type, ',' ORDER BY table_name, ordinal_position
+), ''))
+FROM information_schema.columns c
+WHERE c.table_schema = %s AND NOT """ + IS_PARTITION_SQL
+COLUMNS_SQL = """
+SELECT c.table_name, t.table_type, c.column_name, c.data_type,
+       col_description(format('%%I.%%I', c.table_schema, c.table_name)::regclass, c.ordinal_position::int)
+FROM information_schema.columns c
+JOIN information_schema.tables t USING (table_schema, table_name)
+WHERE c.table_schema = %s AND NOT """ + IS_PARTITION_SQL + """
+ORDER BY c.table_name, c.ordinal_position
+"""
+PRIMARY_KEYS_SQL = """
+SELECT k.table_name, k.column_name
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage k USING (constraint_schema, constraint_name, table_name)
+WHERE tc.table_schema = %s AND tc.constraint_type = 'PRIMARY KEY'
+"""
+SAMPLES_SQL = """
+SELECT tablename, attname, most_common_vals::text::text[]
+FROM pg_stats
+WHERE schemaname = %s AND n_distinct > 0 AND n_distinct <= %s AND most_common_vals IS NOT NULL
+"""
+
+TEXT_TYPES = ("text", "character varying", "character")
+
+
+def words(text: str) -> List[str]:
+    """Lower-case word tokens (letters incl. umlauts, digits, underscores split)"""
+    return re.findall(r"[^\W_]+", text.casefold())
+
+
+def _matches(tokens: Sequence[str], term: str) -> bool:
+    """``term`` (one or more words) occurs in ``tokens``; single words match as prefix (German inflection)"""
+    parts = words(term)
+    if not parts:
+        return False
+    if len(parts) == 1:
+        term = parts[0]
+        return any(t == term or (len(term) >= 4 and t.startswith(term)) for t in tokens)
+    n = len(parts)
+    return any(tokens[i:i + n] == parts for i in range(len(tokens) - n + 1))
+
+
+class SchemaCatalog:
+    """Cached schema metadata + per-question table selection for the prompt"""
+
+    def __init__(
+        self,
+        pool,
+        schema: str = "public",
+        exclude: Iterable[str] = (),
+        default_tables: Sequence[str] = ("transactions",),
+        synonyms: Optional[Dict[str, Sequence[str]]] = None,
+        hints: Optional[Dict[str, str]] = None,
+        max_tables: int = 3,
+        sample_values: int = 8,
+        sample_max_distinct: int = 50,
+    ):
+        """
+        Args:
+            pool: DatabasePool
+            schema: Postgres schema to describe
+            exclude: ``table`` or ``table.column`` entries never shown to the LLM
+            default_tables: Tables used when nothing in the question points elsewhere
+            synonyms: Extra words per ``table`` or ``table.column`` (e.g. German terms)
+            hints: Notes per ``table.column``; a column comment in the database wins
+            max_tables: Upper bound of tables per prompt
+            sample_values: Example values shown for low-cardinality text columns
+            sample_max_distinct: Only columns with at most this many distinct values get examples
+        """
+        self.pool = pool
+        self.schema = schema
+        self.exclude = {e.strip().lower() for e in exclude if e.strip()}
+        self.default_tables = list(default_tables)
+        self.synonyms = {k.lower(): list(v) for k, v in (synonyms or {}).items()}
+        self.hints = {k.lower(): v for k, v in (hints or {}).items()}
+        self.max_tables = max_tables
+        self.sample_values = sample_values
+        self.sample_max_distinct = sample_max_distinct
+
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.fingerprint: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+
+        # Stats
+        self._checks = 0
+        self._reloads = 0
+        self._failures = 0
+        self._selections = 0
+        self._selected_tables_total = 0
+        self._rendered_chars_total = 0
+        self._defaulted = 0
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.tables)
+
+    # --- Laden ---------------------------------------------------------------
+
+    def refresh(self, conn, force: bool = False) -> bool:
+        """
+        Blocking: reload the catalog if the column fingerprint changed (or ``force``)
+
+        Returns:
+            True if the catalog was (re)loaded
+        """
+        self._checks += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute(FINGERPRINT_SQL, (self.schema,))
+                count, digest = cur.fetchone()
+                fingerprint = f"{count}:{digest}"
+                if fingerprint == self.fingerprint and not force:
+                    conn.rollback()
+                    return False
+                tables = self._load(cur)
+            conn.rollback()  # nur gelesen
+        except psycopg2.Error:
+            conn.rollback()
+            self._failures += 1
+            raise
+
+        changed = self.fingerprint is not None and fingerprint != self.fingerprint
+        self.tables = tables
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self._reloads += 1
+        if changed:
+            log.info(f"Schema changed - {len(tables)} tables reloaded")
+        return True
+
+    async def refresh_async(self, force: bool = False) -> bool:
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self.refresh, conn, force)
+
+    def _load(self, cur) -> Dict[str, Dict[str, Any]]:
+        tables: Dict[str, Dict[str, Any]] = {}
+        cur.execute(COLUMNS_SQL, (self.schema,))
+        for table, table_type, column, data_type, comment in cur.fetchall():
+            if table.lower() in self.exclude or f"{table}.{column}".lower() in self.exclude:
+                continue
+            entry = tables.setdefault(table, {
+                "name": table,
+                "kind": "View" if table_type == "VIEW" else "Table",
+                "columns": [],
+            })
+            entry["columns"].append({
+                "name": column,
+                "type": data_type,
+                "comment": comment or self.hints.get(f"{table}.{column}".lower()),
+                "primary_key": False,
+                "samples": [],
+            })
+
+        cur.execute(PRIMARY_KEYS_SQL, (self.schema,))
+        keys = set(cur.fetchall())
+        cur.execute(SAMPLES_SQL, (self.schema, self.sample_max_distinct))
+        samples = {(t, c): values for t, c, values in cur.fetchall()}
+
+        for table, entry in tables.items():
+            for column in entry["columns"]:
+                column["primary_key"] = (table, column["name"]) in keys
+                if column["type"] in TEXT_TYPES:
+                    column["samples"] = sorted(samples.get((table, column["name"])) or [])
+        return tables
+
+    # --- Auswahl + Rendering -------------------------------------------------
+
+    def _terms(self, table: str, column: Optional[str] = None) -> List[str]:
+        name = table if column is None else f"{table}.{column}"
+        own = (column or table).replace("_", " ")
+        terms = [own] + self.synonyms.get(name.lower(), [])
+        if column is not None:
+            terms += self.synonyms.get(column.lower(), [])  # z.B. "amount" für alle Tabellen
+        return terms
+
+    def select(self, question: str) -> List[str]:
+        """Names of the tables relevant for ``question`` (best first)"""
+        tokens = words(question)
+        scored = []
+        for order, (table, entry) in enumerate(self.tables.items()):
+            named = any(_matches(tokens, t) for t in self._terms(table))
+            score = 0
+            for column in entry["columns"]:
+                if any(_matches(tokens, t) for t in self._terms(table, column["name"])):
+                    score += 1
+                if any(_matches(tokens, v) for v in column["samples"]):
+                    score += 1
+            scored.append((named, score, -order, table))
+
+        named = [s for s in scored if s[0]]
+        if named:
+            chosen = named
+        else:
+            best = max((s[1] for s in scored), default=0)
+            chosen = [s for s in scored if best and s[1] == best]
+            # Gleichstand: Default-Tabellen bevorzugen
+            defaults = [s for s in chosen if s[3] in self.default_tables]
+            chosen = defaults or chosen[:1]
+        if not chosen:
+            self._defaulted += 1
+            return [t for t in self.default_tables if t in self.tables] or list(self.tables)[:1]
+        chosen.sort(reverse=True)
+        return [s[3] for s in chosen[: self.max_tables]]
+
+    def render(self, tables: Sequence[str], question: str = "") -> str:
+        """Schema block for the prompt; example values mentioned in ``question`` are always shown"""
+        tokens = words(question)
+        blocks = []
+        for table in tables:
+            entry = self.tables[table]
+            lines = [f"{entry['kind']}: {self.schema}.{table}", "Columns:"]
+            for column in entry["columns"]:
+                line = f"- {column['name']} ({column['type']})"
+                if column["primary_key"]:
+                    line += " - primary key"
+                if column["comment"]:
+                    line += f" - {column['comment']}"
+                if column["samples"]:
+                    mentioned = [v for v in column["samples"] if _matches(tokens, v)]
+                    shown = mentioned + [v for v in column["samples"] if v not in mentioned]
+                    shown = shown[: max(self.sample_values, len(mentioned))]
+                    more = ", ..." if len(shown) < len(column["samples"]) else ""
+                    line += " - e.g. " + ", ".join(f"'{v}'" for v in shown) + more
+                lines.append(line)
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks)
+
+    def describe(self, question: str) -> str:
+        """Pruned schema block for ``question``"""
+        tables = self.select(question)
+        text = self.render(tables, question)
+        self._selections += 1
+        self._selected_tables_total += len(tables)
+        self._rendered_chars_total += len(text)
+        return text
+
+    def full(self) -> str:
+        """Schema block with every table (what an unpruned prompt would carry)"""
+        return self.render(list(self.tables))
+
+    def version(self) -> str:
+        """Short hash of the loaded catalog (part of the translation cache key)"""
+        return hashlib.sha256((self.fingerprint or "").encode("utf-8")).hexdigest()[:12]
+
+    def stats(self) -> Dict[str, Any]:
+        def avg(total: float) -> Optional[float]:
+            return round(total / self._selections, 3) if self._selections else None
+
+        return {
+            "loaded": self.loaded,
+            "tables": len(self.tables),
+            "columns": sum(len(t["columns"]) for t in self.tables.values()),
+            "version": self.version() if self.loaded else None,
+            "loaded_at": self.loaded_at,
+            "checks": self._checks,
+            "reloads": self._reloads,
+            "failures": self._failures,
+            "selections": self._selections,
+            "defaulted": self._defaulted,
+            "avg_tables_per_prompt": avg(self._selected_tables_total),
+            "avg_schema_chars": avg(self._rendered_chars_total),
+            "full_schema_chars": len(self.full()) if self.loaded else None,
+        }
@@ -1,16 +1,402 @@
 import os
 import re
-import httpx
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import time
+import uuid
+import secrets
+from typing import Literal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import psycopg2
+import psycopg2.errors
+from psycopg2 import sql as pgsql
 from psycopg2.extras import RealDictCursor
 
+from db.pool import DatabasePool, PoolTimeoutError
+from llm.ollama_client import OllamaClient
+from llm.backend_pool import OllamaPool
+from llm.schema import SchemaCatalog
+from llm.intents import IntentMatcher
+from cache.translation_cache import TranslationCache
+from cache.result_cache import ResultCache
+from db.encoding import encode_rows, encode_ndjson_lines
+from db.arrow import ArrowBatcher, ArrowStreamEncoder, ParquetSpool, ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, pa
+from middleware.compression import CompressionMiddleware, CompressionStats
+from query.pagination import Paginator, InvalidPageToken, strip_statement
+from query.downsample import SeriesReducer
+from query.approximate import SampleApproximator
+from query.guard import QueryGuard, SQLRejected
+from query.admission import AdmissionController, Overloaded, Ticket
+from query.workload import WorkloadLog
+from query.index_advisor import IndexAdvisor
+from rollups.refresh import RollupManager
+from rollups.router import RollupRouter
+from partitions.manager import PartitionManager
+from replica.columnar import ColumnarReplica, ReplicaTimeout
+from observability.metrics import MetricsRegistry, RequestTimer, maybe_stage
+from observability.logger import setup_logging, get_logger
+
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="LLM Data Analytics Backend")
+# Configuration
+# WICHTIG: Du brauchst den "Direct Connection String" von Supabase Settings -> Database -> Connection String -> URI
+DATABASE_URL = os.getenv("DATABASE_URL") 
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma2:2b") # Default fallback
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120.0"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_OPTIONS = {"temperature": 0.1}
+# Modell geladen halten und den System-Prompt-Präfix beim Start vorwärmen
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+OLLAMA_WARMUP_INTERVAL = float(os.getenv("OLLAMA_WARMUP_INTERVAL", "0"))  # 0 = nur beim Start
+# Mehrere Ollama-Instanzen (kommagetrennt); ohne Angabe nur OLLAMA_URL
+OLLAMA_URLS = [u.strip() for u in os.getenv("OLLAMA_URLS", "").split(",") if u.strip()] or [OLLAMA_URL]
+OLLAMA_HEDGE_AFTER_MS = float(os.getenv("OLLAMA_HEDGE_AFTER_MS", "0"))  # 0 = kein Hedging
+OLLAMA_PROBE_INTERVAL = float(os.getenv("OLLAMA_PROBE_INTERVAL", "15"))
+
+# Fast-Path: häufige Fragen ohne LLM beantworten
+INTENTS_ENABLED = os.getenv("INTENTS_ENABLED", "true").lower() == "true"
+INTENT_CATEGORIES = os.getenv(
+    "INTENT_CATEGORIES", "Miete,Lebensmittel,Transport,Restaurant,Gehalt,Technik"
+).split(",")
+
+# NL -> SQL Translation Cache (leerer Pfad = nur In-Memory)
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "translation_cache.sqlite3")
+
+# Result Cache (invalidiert über Tabellen-Watermarks)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_WATERMARK_INTERVAL = float(os.getenv("RESULT_CACHE_WATERMARK_INTERVAL", "5.0"))
+RESULT_CACHE_TABLES = os.getenv("RESULT_CACHE_TABLES", "transactions,budgets").split(",")
+
+# Streaming: Zeilen pro FETCH aus dem Server-Side Cursor
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", "100000"))
+
+# Pagination: LIMIT wird in der DB angewendet, Folgeseiten über Continuation Tokens
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "500"))
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "5000"))
+# Ohne festes Secret sind Tokens nur bis zum nächsten Neustart gültig
+PAGE_TOKEN_SECRET = os.getenv("PAGE_TOKEN_SECRET") or secrets.token_hex(32)
+
+# Chart-Modus für POST /query (chart_points): Serie auf höchstens so viele Punkte reduzieren
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_MAX_ROWS = int(os.getenv("CHART_MAX_ROWS", "200000"))  # darüber wird in Postgres aggregiert
+
+# Näherungsweise Aggregate (approximate=true): Schätzung aus einer Block-Stichprobe, danach optional exakt
+APPROX_TABLES = os.getenv("APPROX_TABLES", "transactions").split(",")
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "1000000"))  # kleinere Tabellen immer exakt
+APPROX_SAMPLE_ROWS = int(os.getenv("APPROX_SAMPLE_ROWS", "100000"))  # Zeilen der ersten Schätzung
+APPROX_CONFIDENCE = float(os.getenv("APPROX_CONFIDENCE", "0.95"))
+APPROX_REFINE_FACTOR = float(os.getenv("APPROX_REFINE_FACTOR", "10"))  # /query/stream: Stichprobe pro Schritt x10
+APPROX_MAX_SAMPLE_PERCENT = float(os.getenv("APPROX_MAX_SAMPLE_PERCENT", "20"))
+
+# SQL Guardrail: read-only, statement_timeout und EXPLAIN-Budget (0 = kein Downgrade)
+GUARD_MAX_COST = float(os.getenv("GUARD_MAX_COST", "1000000"))
+GUARD_MAX_ROWS = int(os.getenv("GUARD_MAX_ROWS", "100000"))
+GUARD_STATEMENT_TIMEOUT_MS = int(os.getenv("GUARD_STATEMENT_TIMEOUT_MS", "15000"))
+GUARD_DOWNGRADE_LIMIT = int(os.getenv("GUARD_DOWNGRADE_LIMIT", "1000"))
+
+# Workload Log für den Index Advisor (python -m query.index_advisor); leerer Pfad = nur In-Memory
+WORKLOAD_LOG_PATH = os.getenv("WORKLOAD_LOG_PATH", "workload.sqlite3")
+
+# Rollups (database/rollups.sql): Aggregate werden transparent auf die Rollup-Tabellen umgeleitet
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "300"))  # 0 = nur manuell
+ROLLUP_EXACT = os.getenv("ROLLUP_EXACT", "true").lower() == "true"  # noch nicht aufgerollte Inserts mitlesen
+
+# Range-Partitionierung von transactions nach date (Umstellung: python -m partitions.manager convert)
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600"))  # 0 = nur manuell
+PARTITION_PREMAKE = int(os.getenv("PARTITION_PREMAKE", "3"))  # Perioden im Voraus
+PARTITION_RETENTION = int(os.getenv("PARTITION_RETENTION", "0"))  # Perioden behalten, 0 = alle
+PARTITION_RETIRE_MODE = os.getenv("PARTITION_RETIRE_MODE", "archive")  # archive oder drop
+
+# Columnar Read-Replica (DuckDB, optional; Change Capture aus database/replica.sql): Lese-Queries laufen lokal statt auf dem Primary
+REPLICA_ENABLED = os.getenv("REPLICA_ENABLED", "false").lower() == "true"
+REPLICA_PATH = os.getenv("REPLICA_PATH", "replica.duckdb")  # leer = nur In-Memory
+REPLICA_TABLES = os.getenv("REPLICA_TABLES", "transactions,budgets").split(",")
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "60"))  # 0 = nur manuell
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", "300"))
+REPLICA_THREADS = int(os.getenv("REPLICA_THREADS", "4"))
+
+# Schema-Introspection: Tabellen/Spalten aus information_schema, pro Frage auf das Relevante gekürzt
+SCHEMA_INTROSPECTION = os.getenv("SCHEMA_INTROSPECTION", "true").lower() == "true"
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "60"))  # 0 = nur beim Start
+SCHEMA_EXCLUDE = os.getenv(
+    "SCHEMA_EXCLUDE", "rollup_state,rollup_pending,replica_changes,transactions_daily,transactions_monthly,transactions.created_at"
+).split(",")
+SCHEMA_MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", "3"))
+SCHEMA_SAMPLE_VALUES = int(os.getenv("SCHEMA_SAMPLE_VALUES", "8"))
+
+# Batch-Endpoint (POST /query/batch): max. Fragen pro Request und parallele LLM-Aufrufe
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# Columnar Export (POST /query/arrow, /query/parquet; braucht pyarrow) - eigenes Budget für Bulk-Abfragen
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "10000000"))
+EXPORT_MAX_COST = float(os.getenv("EXPORT_MAX_COST", "50000000"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "65536"))
+EXPORT_ARROW_COMPRESSION = os.getenv("EXPORT_ARROW_COMPRESSION", "")  # leer, lz4 oder zstd
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(64 * 1024 * 1024)))  # darüber auf Platte
+
+# Response-Komprimierung (per Accept-Encoding; zstd braucht das optionale Paket zstandard)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "1"))
+
+# Logging (JSON Lines, rotierend; leerer Pfad = nur Konsole)
+LOG_PATH = os.getenv("LOG_PATH", "backend.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Connection Pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5.0"))
+DB_POOL_CHECK = os.getenv("DB_POOL_CHECK", "true").lower() == "true"
+
+# Admission Control vor LLM und DB: Limits pro Stufe, begrenzte Queue, Deadlines pro Priorität (Sekunden, 0 = keine)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_LLM_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", str(4 * len(OLLAMA_URLS))))
+ADMISSION_DB_CONCURRENCY = int(os.getenv("ADMISSION_DB_CONCURRENCY", str(DB_POOL_MAX_SIZE)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))  # pro Stufe
+ADMISSION_MAX_QUEUED_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUED_PER_CLIENT", "8"))
+ADMISSION_DEADLINE_INTERACTIVE = float(os.getenv("ADMISSION_DEADLINE_INTERACTIVE", "60"))
+ADMISSION_DEADLINE_BATCH = float(os.getenv("ADMISSION_DEADLINE_BATCH", "600"))
+
+log_listener = setup_logging(LOG_PATH or None, LOG_LEVEL)
+log = get_logger()
+
+db_pool = DatabasePool(
+    DATABASE_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    check_on_checkout=DB_POOL_CHECK,
+)
+
+result_cache = ResultCache(
+    db_pool,
+    tables=RESULT_CACHE_TABLES,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    watermark_interval=RESULT_CACHE_WATERMARK_INTERVAL,
+)
+
+admission = AdmissionController(
+    {"llm": ADMISSION_LLM_CONCURRENCY, "db": ADMISSION_DB_CONCURRENCY},
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_queued_per_client=ADMISSION_MAX_QUEUED_PER_CLIENT,
+    deadlines={"interactive": ADMISSION_DEADLINE_INTERACTIVE, "batch": ADMISSION_DEADLINE_BATCH},
+    enabled=ADMISSION_ENABLED,
+)
+
+paginator = Paginator(
+    PAGE_TOKEN_SECRET,
+    default_page_size=QUERY_PAGE_SIZE,
+    max_page_size=QUERY_MAX_PAGE_SIZE,
+)
+series_reducer = SeriesReducer(max_points=CHART_MAX_POINTS, max_rows=CHART_MAX_ROWS)
+approximator = SampleApproximator(
+    APPROX_TABLES,
+    min_rows=APPROX_MIN_ROWS,
+    sample_rows=APPROX_SAMPLE_ROWS,
+    confidence=APPROX_CONFIDENCE,
+    refine_factor=APPROX_REFINE_FACTOR,
+    max_sample_percent=APPROX_MAX_SAMPLE_PERCENT,
+)
+
+guard = QueryGuard(
+    max_cost=GUARD_MAX_COST,
+    max_rows=GUARD_MAX_ROWS,
+    statement_timeout_ms=GUARD_STATEMENT_TIMEOUT_MS,
+    downgrade_limit=GUARD_DOWNGRADE_LIMIT or None,
+)
+
+workload = WorkloadLog(WORKLOAD_LOG_PATH or None)
+index_advisor = IndexAdvisor(RESULT_CACHE_TABLES)
+
+rollups = RollupManager(db_pool)
+rollup_router = RollupRouter(exact=ROLLUP_EXACT)
+
+partitions = PartitionManager(
+    db_pool,
+    premake=PARTITION_PREMAKE,
+    retention=PARTITION_RETENTION,
+    retire_mode=PARTITION_RETIRE_MODE,
+)
+
+replica = ColumnarReplica(
+    db_pool,
+    path=REPLICA_PATH or None,
+    tables=REPLICA_TABLES,
+    max_staleness=REPLICA_MAX_STALENESS,
+    threads=REPLICA_THREADS,
+    statement_timeout_ms=GUARD_STATEMENT_TIMEOUT_MS,
+)
+
+# Fachbegriffe (v.a. deutsch), die auf Tabellen/Spalten zeigen; Spalten-Keys gelten für alle Tabellen
+SCHEMA_SYNONYMS = {
+    "transactions": ["buchung", "transaktion", "ausgabe", "einnahme", "expense", "income", "spend", "spent", "gehalt"],
+    "budgets": ["budget", "limit", "ziel"],
+    "budget_vs_actual": ["budget", "überschritten", "exceeded", "over budget", "vs"],
+    "amount": ["betrag", "summe", "sum", "total", "teuer", "expensive", "euro"],
+    "category": ["kategorie"],
+    "date": ["datum", "monat", "jahr", "month", "year", "wann", "when", "letzte", "last"],
+    "description": ["beschreibung", "details", "händler", "shop"],
+}
+# Hinweise pro Spalte, solange in der DB kein COMMENT ON COLUMN gesetzt ist
+SCHEMA_HINTS = {
+    "transactions.amount": "Negative values usually mean expenses, but check context.",
+    "budgets.month": "first day of the month",
+}
+
+schema_catalog = SchemaCatalog(
+    db_pool,
+    exclude=SCHEMA_EXCLUDE,
+    synonyms=SCHEMA_SYNONYMS,
+    hints=SCHEMA_HINTS,
+    max_tables=SCHEMA_MAX_TABLES,
+    sample_values=SCHEMA_SAMPLE_VALUES,
+)
+
+intent_matcher = IntentMatcher(INTENT_CATEGORIES, max_limit=QUERY_MAX_PAGE_SIZE)
+
+if len(OLLAMA_URLS) > 1:
+    ollama = OllamaPool(
+        OLLAMA_URLS,
+        OLLAMA_MODEL,
+        timeout=OLLAMA_TIMEOUT,
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        keep_alive=OLLAMA_KEEP_ALIVE or None,
+        hedge_after_ms=OLLAMA_HEDGE_AFTER_MS,
+        probe_interval=OLLAMA_PROBE_INTERVAL,
+        # Beim Hedging gewinnt die erste Antwort mit gültigem SQL
+        accept=lambda result: guard.is_valid(clean_sql(result.get("response", ""))),
+    )
+else:
+    ollama = OllamaClient(
+        OLLAMA_URL,
+        OLLAMA_MODEL,
+        timeout=OLLAMA_TIMEOUT,
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        keep_alive=OLLAMA_KEEP_ALIVE or None,
+    )
+
+metrics = MetricsRegistry("analytics")
+STAGE_SECONDS = metrics.histogram(
+    "query_stage_seconds", "Time spent per request stage", ["endpoint", "stage"]
+)
+QUERY_SECONDS = metrics.histogram(
+    "query_duration_seconds", "End-to-end request latency", ["endpoint", "source"]
+)
+QUERY_REQUESTS = metrics.counter(
+    "query_requests_total", "Handled query requests", ["endpoint", "source", "status"]
+)
+LLM_PHASE_SECONDS = metrics.histogram(
+    "llm_phase_seconds", "Ollama-reported load / prompt_eval / eval durations", ["phase"]
+)
+LLM_TOKENS = metrics.histogram(
+    "llm_tokens", "Ollama token counts per request", ["kind"],
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+metrics.register_collector("db_pool", lambda: db_pool.stats())
+metrics.register_collector("result_cache", lambda: result_cache.stats())
+metrics.register_collector("translation_cache", lambda: translation_cache.stats())
+metrics.register_collector("llm", lambda: ollama.stats())
+metrics.register_collector("guard", lambda: guard.stats())
+metrics.register_collector("admission", lambda: admission.stats())
+metrics.register_collector("intents", lambda: intent_matcher.stats())
+metrics.register_collector("workload", lambda: workload.stats())
+metrics.register_collector("rollups", lambda: {**rollups.stats(), **rollup_router.stats()})
+metrics.register_collector("approximate", lambda: approximator.stats())
+metrics.register_collector("replica", lambda: replica.stats())
+metrics.register_collector("partitions", lambda: partitions.stats())
+metrics.register_collector("schema", lambda: schema_catalog.stats())
+
+def observe_llm(result: dict):
+    """Ollama's own timings -> prompt_eval vs. eval (prefill vs. decode) histograms"""
+    if "total_duration" not in result:
+        return None  # keine fertige Antwort (z.B. Fehler/Abbruch) - nichts messen
+    t = ollama.timings(result)
+    for phase in ("load", "prompt_eval", "eval"):
+        if t[f"{phase}_ms"] is not None:
+            LLM_PHASE_SECONDS.observe(t[f"{phase}_ms"] / 1000, phase=phase)
+    if t["prompt_eval_count"] is not None:
+        LLM_TOKENS.observe(t["prompt_eval_count"], kind="prompt")
+    if t["eval_count"] is not None:
+        LLM_TOKENS.observe(t["eval_count"], kind="generated")
+    return t
+
+# Callbacks (endpoint, source, status, timer) nach jedem Request - z.B. für bench/run.py
+request_listeners = []
+
+def record_request(endpoint: str, source: str, status: str, timer: RequestTimer, **fields):
+    """Stage histograms + request counter + one structured log line per request"""
+    for listener in request_listeners:
+        listener(endpoint, source, status, timer)
+    timer.observe(STAGE_SECONDS, endpoint=endpoint)
+    QUERY_SECONDS.observe(timer.elapsed(), endpoint=endpoint, source=source)
+    QUERY_REQUESTS.inc(endpoint=endpoint, source=source, status=status)
+    log.info(f"{endpoint} {status}", extra={"fields": {
+        "endpoint": endpoint,
+        "source": source,
+        "status": status,
+        "total_ms": round(timer.elapsed() * 1000, 3),
+        "stages_ms": timer.as_ms(),
+        **fields,
+    }})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    await db_pool.open()
+    await ollama.open()
+    translation_cache.open()
+    workload.open()
+    schema_task = None
+    if SCHEMA_INTROSPECTION:
+        try:
+            await load_schema()
+            log.info(f"Schema loaded: {len(schema_catalog.tables)} tables")
+        except Exception as e:
+            log.warning(f"Schema introspection failed, using the built-in schema: {e}")
+        if SCHEMA_REFRESH_INTERVAL > 0:
+            schema_task = asyncio.create_task(refresh_schema())
+    warmup_task = asyncio.create_task(keep_model_warm()) if OLLAMA_WARMUP else None
+    rollup_task = None
+    if ROLLUPS_ENABLED:
+        await rollups.open()
+        if rollups.available and ROLLUP_REFRESH_INTERVAL > 0:
+            rollup_task = asyncio.create_task(refresh_rollups())
+    partition_task = None
+    await partitions.open()
+    if partitions.available and PARTITION_MAINTENANCE_INTERVAL > 0:
+        partition_task = asyncio.create_task(maintain_partitions())
+    replica_task = None
+    if REPLICA_ENABLED:
+        await replica.open()
+        if replica.available and REPLICA_SYNC_INTERVAL > 0:
+            replica_task = asyncio.create_task(sync_replica())
+    yield
+    for task in (warmup_task, schema_task, rollup_task, partition_task, replica_task):
+        if task is not None:
+            task.cancel()
+    translation_cache.close()
+    workload.close()
+    await replica.close()
+    await ollama.close()
+    await db_pool.close()
+    log_listener.stop()
+
+app = FastAPI(title="LLM Data Analytics Backend", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -22,46 +408,396 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration
-# WICHTIG: Du brauchst den "Direct Connection String" von Supabase Settings -> Database -> Connection String -> URI
-DATABASE_URL = os.getenv("DATABASE_URL") 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma2:2b") # Default fallback
+compression_stats = CompressionStats()
+if COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=COMPRESSION_GZIP_LEVEL,
+        zstd_level=COMPRESSION_ZSTD_LEVEL,
+        stats=compression_stats,
+    )
+metrics.register_collector("compression", lambda: compression_stats.stats())
 
 # System Prompt: Hier erklären wir dem LLM die Datenbank
 SYSTEM_PROMPT = """
 You are a PostgreSQL expert. Your job is to translate natural language questions into executable SQL queries.
 You must ONLY output the SQL query. Do not add any markdown, explanation, or notes.
 
+Rules:
+1. Return ONLY valid SQL.
+2. Use valid PostgreSQL syntax.
+3. If the user asks for "Ausgaben" (expenses), look for amounts.
+4. Do not delete or modify data, only SELECT.
+
 The database schema is as follows:
+"""
 
-Table: public.transactions
+# Bis das Schema aus der Datenbank geladen ist (oder SCHEMA_INTROSPECTION=false)
+FALLBACK_SCHEMA = """Table: public.transactions
 Columns:
 - id (uuid)
 - amount (decimal) - Negative values usually mean expenses, but check context.
 - category (text) - e.g. 'Miete', 'Lebensmittel', 'Gehalt'
 - description (text)
-- date (date)
+- date (date)"""
 
-Rules:
-1. Return ONLY valid SQL.
-2. Use valid PostgreSQL syntax.
-3. If the user asks for "Ausgaben" (expenses), look for amounts.
-4. Do not delete or modify data, only SELECT.
-"""
+# Der System-Prompt ist für jeden Request identisch -> Ollama kann den KV-Cache wiederverwenden;
+# danach folgt nur der für die Frage relevante Teil des Schemas
+PROMPT_PREFIX = SYSTEM_PROMPT
+
+def build_prompt(question: str) -> str:
+    schema = schema_catalog.describe(question) if schema_catalog.loaded else FALLBACK_SCHEMA
+    return f"{PROMPT_PREFIX}\n{schema}\n\nUser Question: {question}\nSQL Query:"
+
+async def keep_model_warm():
+    """Load OLLAMA_MODEL + evaluate the prompt prefix at startup (and optionally periodically)"""
+    while True:
+        try:
+            t = await ollama.warm_up(PROMPT_PREFIX, options=OLLAMA_OPTIONS)
+            log.info(
+                f"Ollama warm-up: load {t['load_ms']}ms, prefix {t['prefix_tokens']} tokens "
+                f"in {t['prompt_eval_ms']}ms (wall {t['wall_ms']}ms)"
+            )
+        except Exception as e:
+            log.warning(f"Ollama warm-up failed: {e}")
+        if OLLAMA_WARMUP_INTERVAL <= 0:
+            return
+        await asyncio.sleep(OLLAMA_WARMUP_INTERVAL)
+
+async def load_schema(force: bool = False) -> bool:
+    """(Re)load the schema catalog if the DDL changed; new version -> new translation cache keys"""
+    changed = await schema_catalog.refresh_async(force)
+    if changed:
+        translation_cache.set_schema(SYSTEM_PROMPT + schema_catalog.version())
+    return changed
+
+async def refresh_schema():
+    """Check the schema fingerprint every SCHEMA_REFRESH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(SCHEMA_REFRESH_INTERVAL)
+        try:
+            await load_schema()
+        except Exception as e:
+            log.warning(f"Schema refresh failed: {e}")
+
+async def refresh_rollups():
+    """Roll up new transactions every ROLLUP_REFRESH_INTERVAL seconds"""
+    while True:
+        try:
+            result = await rollups.refresh_async()
+            if result["rows"]:
+                log.info(f"Rollups refreshed: {result['rows']} new rows", extra={"fields": result})
+        except Exception as e:
+            log.warning(f"Rollup refresh failed: {e}")
+        await asyncio.sleep(ROLLUP_REFRESH_INTERVAL)
+
+async def maintain_partitions():
+    """Create upcoming partitions and retire expired ones every PARTITION_MAINTENANCE_INTERVAL seconds"""
+    while True:
+        try:
+            result = await partitions.maintain_async()
+            if result["created"] or result["retired"]:
+                log.info("Partitions maintained", extra={"fields": result})
+        except Exception as e:
+            log.warning(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+async def sync_replica():
+    """Pull new rows into the columnar replica every REPLICA_SYNC_INTERVAL seconds"""
+    while True:
+        try:
+            result = await replica.sync_async()
+            if any(result["rows"].values()):
+                log.info(f"Replica synced: {result['rows']}", extra={"fields": result})
+        except Exception as e:
+            log.warning(f"Replica sync failed: {e}")
+        await asyncio.sleep(REPLICA_SYNC_INTERVAL)
+
+def route_sql(sql_query: str) -> str:
+    """Statement that actually runs: rollup rewrite if possible, else unchanged"""
+    if not (ROLLUPS_ENABLED and rollups.available):
+        return sql_query
+    return rollup_router.route(sql_query) or sql_query
+
+translation_cache = TranslationCache(
+    SYSTEM_PROMPT + FALLBACK_SCHEMA,
+    max_entries=TRANSLATION_CACHE_SIZE,
+    ttl_seconds=TRANSLATION_CACHE_TTL,
+    path=TRANSLATION_CACHE_PATH or None,
+)
 
 class QueryRequest(BaseModel):
     natural_language_query: str
+    page_size: int | None = None
+    page_token: str | None = None  # next_token der vorherigen Seite
+    chart_points: int | None = None  # Chart-Modus: Ergebnis auf so viele Punkte reduzieren
+    chart_mode: Literal["auto", "lttb", "minmax", "bucket"] = "auto"
+    chart_agg: Literal["sum", "avg", "min", "max", "count"] = "sum"  # nur für bucket
+    approximate: bool = False  # große Aggregate erst aus einer Stichprobe schätzen
 
 class QueryResponse(BaseModel):
     sql_query: str
     data: list
     error: str | None = None
+    row_count: int = 0
+    has_more: bool = False
+    next_token: str | None = None
+    total_rows_estimate: int | None = None
+    series: dict | None = None  # nur im Chart-Modus
+    approximate: dict | None = None  # nur bei einer Schätzung: Stichprobe + Konfidenz
+
+class BatchQueryRequest(BaseModel):
+    questions: list[str]
+    page_size: int | None = None
+    stream: bool = False  # NDJSON: ein Ergebnis pro Zeile, sobald es fertig ist
+
+def fetch_all(conn, sql_query: str) -> list:
+    """Blocking execute + fetch, runs on a pool worker thread"""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql_query)
+        return cur.fetchall()
+
+def fetch_page_encoded(
+    conn, sql_query: str, page_size: int, state: dict | None, timer: RequestTimer | None = None,
+    begin: bool = True,
+) -> tuple:
+    """
+    Fetch one DB-limited page + serialize it in the worker thread (keeps the loop free)
+
+    ``begin=False`` when the read-only transaction is already open (batch execution).
+
+    Returns:
+        (page JSON fragment, downgrade note or None)
+    """
+    with maybe_stage(timer, "sql_cost_check"):
+        if begin:
+            guard.begin(conn)
+        state = paginator.page_state(conn, sql_query, state)
+        # Kosten der Seite, wie sie läuft (ORDER BY der Sortierschlüssel + Keyset-Filter)
+        page_size, note, plan = guard.check_cost(
+            conn, sql_query, page_size,
+            statement=lambda limit: paginator.page_statement(sql_query, limit, state),
+        )
+    started = time.perf_counter()
+    page = paginator.fetch_page(conn, sql_query, page_size, state, timer=timer)
+    workload.record(sql_query, (time.perf_counter() - started) * 1000, len(page["rows"]), plan)
+    with maybe_stage(timer, "serialize"):
+        return b"".join([
+            b'"data":', encode_rows(page["rows"]),
+            b',"row_count":', str(len(page["rows"])).encode("ascii"),
+            b',"has_more":', b"true" if page["has_more"] else b"false",
+            b',"next_token":', json.dumps(page["next_token"]).encode("ascii"),
+            b',"total_rows_estimate":', json.dumps(page["total_rows_estimate"]).encode("ascii"),
+        ]), note
+
+def fetch_chart_encoded(
+    conn, sql_query: str, points: int, mode: str, agg: str, timer: RequestTimer | None = None
+) -> tuple:
+    """
+    Chart mode: at most ``points`` rows (see query.downsample) + a ``series`` description
+
+    The guard checks every statement against the cost budget; the row budget is
+    CHART_MAX_ROWS because only the reduced series is sent. Results that are no
+    date/numeric series fall back to a first page of ``points`` rows with ``series: null``.
+
+    Returns:
+        (page JSON fragment, downgrade note or None)
+    """
+    guard.begin(conn)
+    check = lambda conn, statement, limit: guard.check_cost(conn, statement, limit, max_rows=CHART_MAX_ROWS)
+    started = time.perf_counter()
+    result = series_reducer.fetch(conn, sql_query, points, mode, agg, check=check, timer=timer)
+    if result is None:
+        payload, note = fetch_page_encoded(conn, sql_query, series_reducer.points(points), None, timer, begin=False)
+        return payload + b',"series":null', note
+    workload.record(result["statement"], (time.perf_counter() - started) * 1000, result["fetched"], result["plan"])
+    with maybe_stage(timer, "serialize"):
+        return b"".join([
+            b'"data":', encode_rows(result["rows"]),
+            b',"row_count":', str(len(result["rows"])).encode("ascii"),
+            b',"has_more":false,"next_token":null',
+            b',"total_rows_estimate":', str(result["series"]["source_rows"]).encode("ascii"),
+            b',"series":', json.dumps(result["series"]).encode("utf-8"),
+        ]), result["note"]
+
+def fetch_approx_encoded(conn, sql_query: str, page_size: int, timer: RequestTimer | None = None) -> tuple:
+    """
+    Approximate mode: eligible aggregates over large tables are estimated from a block
+    sample (see query.approximate); every aggregate gets a ``<name>_margin`` column.
+    Everything else falls back to an exact first page with ``approximate: null``.
+
+    Returns:
+        (page JSON fragment, downgrade note or None)
+    """
+    guard.begin(conn)
+    started = time.perf_counter()
+    result = approximator.estimate(conn, sql_query, page_size, check=guard.check_cost, timer=timer)
+    if result is None:
+        payload, note = fetch_page_encoded(conn, sql_query, page_size, None, timer, begin=False)
+        return payload + b',"approximate":null', note
+    workload.record(result["statement"], (time.perf_counter() - started) * 1000, len(result["rows"]), result["plan"])
+    with maybe_stage(timer, "serialize"):
+        return b"".join([
+            b'"data":', encode_rows(result["rows"]),
+            b',"row_count":', str(len(result["rows"])).encode("ascii"),
+            b',"has_more":false,"next_token":null,"total_rows_estimate":null',
+            b',"approximate":', json.dumps(result["approximate"]).encode("utf-8"),
+        ]), result["note"]
+
+def fetch_estimate_json(conn, sql_query: str, analysis, percent: float | None, timer: RequestTimer | None = None) -> tuple:
+    """
+    One estimate for /query/stream as ``{"data": [...], "approximate": {...}}``
+
+    Returns:
+        (JSON text or None if the table is too small to estimate, sample percent used)
+    """
+    guard.begin(conn)
+    started = time.perf_counter()
+    result = approximator.estimate(
+        conn, sql_query, QUERY_MAX_PAGE_SIZE, percent, check=guard.check_cost, timer=timer, analysis=analysis
+    )
+    if result is None:
+        return None, None
+    workload.record(result["statement"], (time.perf_counter() - started) * 1000, len(result["rows"]), result["plan"])
+    with maybe_stage(timer, "serialize"):
+        body = b"".join([
+            b'{"data":', encode_rows(result["rows"]),
+            b',"approximate":', json.dumps(result["approximate"]).encode("utf-8"), b"}",
+        ])
+    return body.decode("utf-8"), result["approximate"]["sample_percent"]
+
+def fetch_replica_page_encoded(
+    sql_query: str, replica_sql: str, page_size: int, state: dict | None, timer: RequestTimer | None = None
+) -> bytes:
+    """Same page JSON as fetch_page_encoded, read from the columnar replica (OFFSET tokens)"""
+    offset = (state or {}).get("offset", 0)
+    page = replica.fetch_page(
+        replica_sql, page_size, offset, timer,
+        order_keys=lambda columns: paginator.order_keys(sql_query, columns),
+    )
+    next_token = None
+    if page["has_more"]:
+        # Das Token trägt das Postgres-SQL, damit Folgeseiten auch ohne frische Replik funktionieren
+        next_token = paginator.encode_token({
+            "sql": strip_statement(sql_query),
+            "offset": offset + len(page["rows"]),
+            "keys": None,
+            "last": None,
+        })
+    with maybe_stage(timer, "serialize"):
+        return b"".join([
+            b'"data":', encode_rows(page["rows"]),
+            b',"row_count":', str(len(page["rows"])).encode("ascii"),
+            b',"has_more":', b"true" if page["has_more"] else b"false",
+            b',"next_token":', json.dumps(next_token).encode("ascii"),
+            b',"total_rows_estimate":', json.dumps(page["total_rows"]).encode("ascii"),
+        ])
 
-def get_db_connection():
-    if not DATABASE_URL:
-        raise Exception("DATABASE_URL is missing in .env")
-    return psycopg2.connect(DATABASE_URL)
+def fetch_batch_encoded(conn, statements: list, page_size: int, timer: RequestTimer | None, on_result) -> None:
+    """
+    Run several statements back to back in one read-only transaction (one checkout,
+    one BEGIN for the whole batch). Every statement gets its own savepoint so a failing
+    one doesn't abort the rest; ``on_result(sql, page JSON or None, note or error)``
+    is called after each statement.
+    """
+    guard.begin(conn)
+    with conn.cursor() as cur:
+        for sql_query in statements:
+            cur.execute("SAVEPOINT batch_item")
+            try:
+                payload, note = fetch_page_encoded(conn, sql_query, page_size, None, timer, begin=False)
+                cur.execute("RELEASE SAVEPOINT batch_item")
+            except (psycopg2.Error, SQLRejected) as e:
+                cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+                on_result(sql_query, None, db_error_message(e))
+                continue
+            on_result(sql_query, payload, note)
+
+def open_stream_cursor(
+    conn, sql_query: str, timer: RequestTimer | None = None, limit: int = STREAM_MAX_ROWS,
+    budget: dict | None = None, cursor_factory=RealDictCursor,
+) -> tuple:
+    """
+    Server-side (named) cursor: rows stay in Postgres until fetched
+
+    ``budget`` overrides the guard's max_rows/max_cost (exports); ``cursor_factory=None``
+    returns plain tuples.
+
+    Returns:
+        (cursor, effective row limit, downgrade note or None, top plan node)
+    """
+    with maybe_stage(timer, "sql_cost_check"):
+        guard.begin(conn)
+        max_rows, note, plan = guard.check_cost(conn, sql_query, limit, **(budget or {}))
+    cur = conn.cursor(name=f"query_stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory)
+    # +1 Zeile, um eine Kürzung erkennen zu können
+    with maybe_stage(timer, "db_execute"):
+        cur.execute(
+            pgsql.SQL("SELECT * FROM ({}) AS q LIMIT {}").format(
+                pgsql.SQL(strip_statement(sql_query)), pgsql.Literal(max_rows + 1)
+            )
+        )
+    return cur, max_rows, note, plan
+
+def db_error_message(e: Exception) -> str:
+    """Map execution errors to the message returned in the ``error`` field"""
+    if isinstance(e, (SQLRejected, Overloaded)):
+        return str(e)
+    if isinstance(e, PoolTimeoutError):
+        return f"DB Pool Timeout: {str(e)}"
+    if isinstance(e, (psycopg2.errors.QueryCanceled, ReplicaTimeout)):
+        return f"Query Timeout: {str(e)}"
+    if isinstance(e, psycopg2.OperationalError):
+        return f"DB Connection Error: {str(e)}"
+    return f"SQL Error: {str(e)}"
+
+def fetch_ndjson_batch(cur, size: int, timer: RequestTimer | None = None) -> list:
+    with maybe_stage(timer, "db_fetch"):
+        rows = cur.fetchmany(size)
+    with maybe_stage(timer, "serialize"):
+        return encode_ndjson_lines(rows)
+
+def fetch_export_batch(cur, state: dict, size: int, remaining: int, sink, timer: RequestTimer | None = None) -> tuple:
+    """
+    fetchmany tuples -> RecordBatch -> ``sink`` (IPC encoder or Parquet spool), all in the worker
+
+    Returns:
+        (bytes from the sink, rows in the batch, truncated)
+    """
+    with maybe_stage(timer, "db_fetch"):
+        rows = cur.fetchmany(size)
+    truncated = len(rows) > remaining
+    if truncated:
+        rows = rows[:remaining]
+    with maybe_stage(timer, "serialize"):
+        if state.get("batcher") is None:
+            state["batcher"] = ArrowBatcher(cur.description, state["metadata"])
+        elif not rows:
+            return b"", 0, truncated
+        return sink(state["batcher"].batch(rows)), len(rows), truncated
+
+def close_cursor(cur):
+    try:
+        cur.close()
+    except psycopg2.Error:
+        pass  # Transaktion ist schon kaputt, Rollback beim Checkin räumt auf
+
+def sse(event: str, *lines: str) -> str:
+    """One Server-Sent Event; every line becomes its own ``data:`` field"""
+    return f"event: {event}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+EMPTY_PAGE_JSON = b'"data":[],"row_count":0,"has_more":false,"next_token":null,"total_rows_estimate":null'
+
+def query_response(sql_query: str, page_json: bytes, error: str | None) -> Response:
+    """QueryResponse with pre-serialized rows (skips a second encoding pass)"""
+    body = b"".join([
+        b'{"sql_query":', json.dumps(sql_query, ensure_ascii=False).encode("utf-8"),
+        b",", page_json,
+        b',"error":', json.dumps(error, ensure_ascii=False).encode("utf-8"),
+        b"}",
+    ])
+    return Response(content=body, media_type="application/json")
 
 def clean_sql(llm_response: str) -> str:
     """Removes markdown code blocks and extra text from LLM response"""
@@ -71,75 +807,972 @@ def clean_sql(llm_response: str) -> str:
     # Entferne Whitespace vorne/hinten
     return clean.strip()
 
+def admission_ticket(http_request: Request, priority: str) -> Ticket:
+    """
+    Admission ticket for a request: client = ``X-Client-Id`` (else the IP),
+    ``X-Priority: batch`` may lower the endpoint's priority, ``X-Request-Timeout``
+    (seconds) may shorten its deadline
+    """
+    client = http_request.headers.get("x-client-id") or (
+        http_request.client.host if http_request.client else "unknown"
+    )
+    if http_request.headers.get("x-priority", "").lower() == "batch":
+        priority = "batch"
+    try:
+        timeout = float(http_request.headers.get("x-request-timeout", "0"))
+    except ValueError:
+        timeout = 0.0
+    return admission.ticket(client, priority, timeout)
+
+@asynccontextmanager
+async def admitted(stage: str, ticket: Ticket | None, timer: RequestTimer | None = None):
+    """Admission slot for ``stage``; the queue wait becomes the ``queue_<stage>`` timer stage"""
+    started = time.perf_counter()
+    async with admission.slot(stage, ticket):
+        if timer is not None:
+            timer.add(f"queue_{stage}", time.perf_counter() - started)
+        yield
+
+def overload_headers(e: Exception) -> dict | None:
+    return {"Retry-After": str(int(e.retry_after))} if isinstance(e, Overloaded) else None
+
+async def wait_for_disconnect(http_request: Request):
+    # Der Body ist schon gelesen - receive() liefert erst wieder etwas, wenn der Client weg ist
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
+
+async def unless_disconnected(http_request: Request, work) -> Response:
+    """
+    Await the handler coroutine ``work``; if the client disconnects first, cancel it
+    (aborts its Ollama request and cancels its Postgres statement) and answer 499
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
+    await asyncio.wait({task})  # Aufräumen (Cursor, Verbindung) abwarten
+    if not task.cancelled():
+        task.exception()
+    return Response(status_code=499)
+
+async def stream_unless_disconnected(http_request: Request, chunks):
+    """Pass ``chunks`` through; stop (and cancel what it is waiting on) once the client disconnects"""
+    watcher = asyncio.ensure_future(wait_for_disconnect(http_request))
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                return
+            try:
+                chunk = step.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            step.cancel()
+            await asyncio.wait({step})
+        await chunks.aclose()
+
 @app.get("/")
 def read_root():
     return {"status": "online", "model": OLLAMA_MODEL}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/pool")
+def pool_stats():
+    return db_pool.stats()
+
+@app.get("/admin/intents")
+def intent_stats():
+    return intent_matcher.stats()
+
+@app.get("/admin/guard")
+def guard_stats():
+    return guard.stats()
+
+@app.get("/admin/admission")
+def admission_stats():
+    return admission.stats()
+
+@app.get("/admin/llm")
+def llm_stats():
+    return ollama.stats()
+
+@app.get("/admin/schema")
+def schema_stats():
+    return {"stats": schema_catalog.stats(), "schema": schema_catalog.full() if schema_catalog.loaded else FALLBACK_SCHEMA}
+
+@app.post("/admin/schema/refresh")
+async def schema_refresh():
+    try:
+        return {"reloaded": await load_schema(force=True), "stats": schema_catalog.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=db_error_message(e))
+
+@app.get("/admin/rollups")
+def rollup_stats():
+    return {"refresh": rollups.stats(), "routing": rollup_router.stats()}
+
+@app.post("/admin/rollups/refresh")
+async def rollup_refresh(full: bool = False):
+    if not rollups.available:
+        raise HTTPException(status_code=409, detail="Rollup tables missing - apply database/rollups.sql")
+    return await rollups.refresh_async(full)
+
+@app.get("/admin/partitions")
+async def partition_status():
+    try:
+        return {"maintenance": partitions.stats(), "table": await partitions.status_async()}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=db_error_message(e))
+
+@app.post("/admin/partitions/maintain")
+async def partition_maintain():
+    try:
+        return await partitions.maintain_async()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=db_error_message(e))
+
+@app.get("/admin/replica")
+def replica_stats():
+    return replica.stats()
+
+@app.post("/admin/replica/sync")
+async def replica_sync(full: bool = False):
+    if not replica.available:
+        raise HTTPException(status_code=409, detail="Columnar replica disabled (REPLICA_ENABLED, pip install duckdb pytz)")
+    try:
+        return await replica.sync_async(full)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=db_error_message(e))
+
+@app.get("/admin/workload")
+def workload_statements(limit: int = 50):
+    return {"stats": workload.stats(), "statements": workload.statements(limit)}
+
+@app.delete("/admin/workload")
+def workload_purge():
+    return {"removed": workload.purge()}
+
+@app.get("/admin/indexes")
+async def index_recommendations(top: int = 10):
+    """Index advice for the logged workload (HypoPG if installed, else ranked by workload only)"""
+    try:
+        statements = await asyncio.to_thread(workload.statements, 500)
+        async with db_pool.connection() as conn:
+            advice = await db_pool.run(index_advisor.recommend, conn, statements, top)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=db_error_message(e))
+    return {"recommendations": advice}
+
+@app.get("/admin/cache/results")
+def result_cache_info():
+    return result_cache.stats()
+
+@app.delete("/admin/cache/results")
+def result_cache_purge():
+    return {"removed": result_cache.purge()}
+
+@app.get("/admin/cache/translations")
+def translation_cache_info(limit: int = 100):
+    return {"stats": translation_cache.stats(), "entries": translation_cache.entries(limit)}
+
+@app.delete("/admin/cache/translations")
+def translation_cache_purge(key: str | None = None):
+    return {"removed": translation_cache.purge(key)}
+
 @app.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, http_request: Request):
+    return await unless_disconnected(
+        http_request, answer_query(request, admission_ticket(http_request, "interactive"))
+    )
+
+async def answer_query(request: QueryRequest, ticket: Ticket | None = None):
+    timer = RequestTimer()
+    source = "llm"
     try:
-        print(f"Received query: {request.natural_language_query}")
-        
-        # 1. Construct Prompt
-        full_prompt = f"{SYSTEM_PROMPT}\n\nUser Question: {request.natural_language_query}\nSQL Query:"
-        
-        # 2. Call Ollama
-        llm_result = ""
-        try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                print(f"Connecting to Ollama at {OLLAMA_URL}...")
-                response = await client.post(
-                    OLLAMA_URL,
-                    json={
-                        "model": OLLAMA_MODEL,
-                        "prompt": full_prompt,
-                        "stream": False,
-                        "options": {"temperature": 0.1}
-                    }
-                )
-                if response.status_code != 200:
-                    raise Exception(f"Ollama Error {response.status_code}: {response.text}")
-                
-                llm_result = response.json().get("response", "")
-                print(f"LLM Raw Output: {llm_result}")
-                
-        except Exception as e:
-            # Log specific Ollama error
-            with open("ollama_error.log", "w") as f:
-                f.write(str(e))
-            raise HTTPException(status_code=500, detail=f"Ollama Fail: {str(e)}")
-
-        # 3. Clean SQL
-        sql_query = clean_sql(llm_result)
-        print(f"Cleaned SQL: {sql_query}")
+        log.debug(f"Received query: {request.natural_language_query}")
+
+        page_size = paginator.page_size(request.page_size)
+        page_state = None
+        if request.page_token:
+            # Folgeseite: das SQL steckt im (signierten) Token, kein LLM-Aufruf nötig
+            try:
+                page_state = paginator.decode_token(request.page_token)
+            except InvalidPageToken as e:
+                record_request("query", "page", "invalid_token", timer)
+                return query_response("", EMPTY_PAGE_JSON, str(e))
+
+        # 0. Translation Cache
+        with timer.stage("sql_lookup"):
+            cache_key = translation_cache.make_key(
+                request.natural_language_query, OLLAMA_MODEL, OLLAMA_OPTIONS
+            )
+            intent = None
+            if INTENTS_ENABLED and not page_state:
+                intent = intent_matcher.match(request.natural_language_query)
+
+            if page_state:
+                sql_query = page_state["sql"]
+            elif intent:
+                sql_query = intent.sql
+            else:
+                sql_query = await translation_cache.get(cache_key)
+        from_cache = sql_query is not None
+
+        if page_state:
+            source = "page"
+        elif intent:
+            source = "intent"
+            log.debug(f"Intent match ({intent.intent}): {sql_query}")
+        elif from_cache:
+            source = "translation_cache"
+        else:
+            # 1. Construct Prompt
+            with timer.stage("prompt_build"):
+                full_prompt = build_prompt(request.natural_language_query)
+
+            # 2. Call Ollama
+            llm_result = ""
+            try:
+                async with admitted("llm", ticket, timer):
+                    with timer.stage("llm_generate"):
+                        ollama_response = await ollama.generate(full_prompt, options=OLLAMA_OPTIONS)
+                llm_result = ollama_response.get("response", "")
+                log.debug(f"LLM Raw Output: {llm_result}")
+                observe_llm(ollama_response)
+
+            except Overloaded:
+                raise
+            except Exception as e:
+                log.error(f"Ollama request failed: {e}", extra={"fields": {"ollama_url": ",".join(OLLAMA_URLS)}})
+                record_request("query", source, "llm_error", timer)
+                raise HTTPException(status_code=500, detail=f"Ollama Fail: {str(e)}")
+
+            # 3. Clean SQL
+            with timer.stage("sql_cleanup"):
+                sql_query = clean_sql(llm_result)
         
-        # 4. Execute SQL
-        data = []
+        # 4. Execute SQL (Result Cache davor, eine Seite pro Eintrag)
+        page_json = EMPTY_PAGE_JSON
         error_msg = None
-        
+        cache_tables = result_cache.referenced_tables(sql_query)
+        chart = request.chart_points is not None
+        approximate = request.approximate and not chart and not page_state
+        if chart:
+            result_key = f"{sql_query} /* chart {request.chart_points} {request.chart_mode} {request.chart_agg} */"
+        elif approximate:
+            result_key = f"{sql_query} /* approximate {page_size} */"
+        else:
+            result_key = f"{sql_query} /* page {page_size} {request.page_token or ''} */"
+        result_cached = False
+        exec_sql = sql_query
+        replica_sql = None
+        engine = "postgres"
+
         try:
-            conn = get_db_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute(sql_query)
-            data = cur.fetchall()
-            cur.close()
-            conn.close()
-        except psycopg2.OperationalError as e:
-            error_msg = f"DB Connection Error: {str(e)}"
+            with timer.stage("sql_validate"):
+                sql_query = guard.validate(sql_query)
+            with timer.stage("sql_route"):
+                # Chart-Statements (date_trunc, width_bucket) laufen nur auf Postgres
+                replica_sql = replica.route(sql_query, page_state) if REPLICA_ENABLED and not chart else None
+                if replica_sql is None:
+                    exec_sql = route_sql(sql_query)
+
+            payload = None
+            with timer.stage("result_cache_lookup"):
+                if cache_tables:
+                    await result_cache.check_watermarks()
+                    payload = result_cache.get(result_key)
+                else:
+                    result_cache.mark_uncacheable()
+
+            if payload is None and replica_sql is not None:
+                try:
+                    # Nicht in den Result Cache: dessen Watermarks beziehen sich auf Postgres
+                    payload = await replica.run(
+                        fetch_replica_page_encoded, sql_query, replica_sql, page_size, page_state, timer
+                    )
+                    engine = "replica"
+                except ReplicaTimeout:
+                    raise
+                except Exception as e:
+                    replica.record_fallback(e)
+                    exec_sql = route_sql(sql_query)
+            elif payload is not None:
+                result_cached = True
+
+            if payload is None:
+                # Snapshot vor der Ausführung, damit parallele ETL-Loads nicht verloren gehen
+                snapshot = result_cache.snapshot(cache_tables) if cache_tables else None
+                async with admitted("db", ticket, timer):
+                    timer.start("db_acquire")
+                    async with db_pool.connection() as conn:
+                        timer.stop("db_acquire")
+                        if chart:
+                            payload, error_msg = await db_pool.run(
+                                fetch_chart_encoded, conn, exec_sql, request.chart_points,
+                                request.chart_mode, request.chart_agg, timer, cancel=conn,
+                            )
+                        elif approximate and exec_sql is sql_query:
+                            # Rollups beantworten ihre Aggregate ohnehin schnell und exakt
+                            payload, error_msg = await db_pool.run(
+                                fetch_approx_encoded, conn, exec_sql, page_size, timer, cancel=conn,
+                            )
+                        else:
+                            payload, error_msg = await db_pool.run(
+                                fetch_page_encoded, conn, exec_sql, page_size, page_state, timer, cancel=conn,
+                            )
+                # Gedowngradete Ergebnisse nicht cachen (der Hinweis gehört zur Antwort)
+                if cache_tables and error_msg is None:
+                    result_cache.set(result_key, payload, snapshot)
+            page_json = payload
+        except Overloaded:
+            raise
         except Exception as e:
-            error_msg = f"SQL Error: {str(e)}"
+            timer.stop("db_acquire")
+            error_msg = db_error_message(e)
+
+        # Nur Übersetzungen cachen, die tatsächlich ausgeführt werden konnten
+        if not from_cache and not page_state and page_json is not EMPTY_PAGE_JSON:
+            translation_cache.set(
+                cache_key, request.natural_language_query, OLLAMA_MODEL, sql_query
+            )
 
-        return {
-            "sql_query": sql_query,
-            "data": data,
-            "error": error_msg
-        }
+        with timer.stage("response"):
+            response = query_response(sql_query, page_json, error_msg)
+        record_request(
+            "query", source, "ok" if page_json is not EMPTY_PAGE_JSON else "sql_error", timer,
+            result_cached=result_cached, routed=exec_sql is not sql_query, engine=engine,
+            response_bytes=len(response.body),
+        )
+        return response
 
+    except HTTPException:
+        raise
+    except Overloaded as e:
+        record_request("query", source, "shed", timer, stage=e.stage, reason=e.reason)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=overload_headers(e))
+    except asyncio.CancelledError:
+        # Client weg (unless_disconnected) - LLM-Request und Statement sind abgebrochen
+        record_request("query", source, "cancelled", timer)
+        raise
     except Exception as e:
         # GLOBAL CRASH HANDLER
-        import traceback
-        error_trace = traceback.format_exc()
-        with open("backend_crash.log", "w") as f:
-            f.write(error_trace)
-        print("CRASH DETECTED!")
+        log.exception("Unhandled error in /query")
+        record_request("query", source, "crash", timer)
         raise HTTPException(status_code=500, detail=f"CRASH: {str(e)}")
+
+async def stream_estimates(sql_query: str, ticket: Ticket | None, timer: RequestTimer):
+    """``estimate`` events: the same aggregate on growing block samples (up to APPROX_MAX_SAMPLE_PERCENT)"""
+    analysis = approximator.analyze(sql_query)
+    steps = [None]  # None = Startgröße aus APPROX_SAMPLE_ROWS
+    while analysis is not None and steps:
+        percent = steps.pop(0)
+        async with admitted("db", ticket, timer):
+            timer.start("db_acquire")
+            async with db_pool.connection() as conn:
+                timer.stop("db_acquire")
+                event, used = await db_pool.run(
+                    fetch_estimate_json, conn, sql_query, analysis, percent, timer, cancel=conn
+                )
+        if event is None:
+            return
+        yield sse("estimate", event)
+        if percent is None:
+            steps = approximator.refinements(used)[1:]
+
+async def stream_query(question: str, ticket: Ticket | None = None, approximate: bool = False):
+    """
+    Event stream for /query/stream:
+    token* -> sql -> estimate* -> rows* -> done   (or error at any point)
+
+    Each ``rows`` event carries one JSON row per ``data:`` line (NDJSON batch).
+    With ``approximate`` eligible aggregates first get ``estimate`` events from
+    growing samples (rows + ``<name>_margin`` columns), then the exact rows.
+    """
+    timer = RequestTimer()
+    log.debug(f"Received streaming query: {question}")
+
+    with timer.stage("sql_lookup"):
+        cache_key = translation_cache.make_key(question, OLLAMA_MODEL, OLLAMA_OPTIONS)
+        intent = intent_matcher.match(question) if INTENTS_ENABLED else None
+        sql_query = intent.sql if intent else await translation_cache.get(cache_key)
+    from_cache = sql_query is not None
+    source = "intent" if intent else "translation_cache" if from_cache else "llm"
+
+    if not from_cache:
+        with timer.stage("prompt_build"):
+            full_prompt = build_prompt(question)
+        llm_result = ""
+        llm_started = time.perf_counter()
+        try:
+            async with admitted("llm", ticket, timer):
+                async for chunk in ollama.generate_stream(full_prompt, options=OLLAMA_OPTIONS):
+                    token = chunk.get("response", "")
+                    if token:
+                        if not llm_result:
+                            timer.add("llm_first_token", time.perf_counter() - llm_started)
+                        llm_result += token
+                        yield sse("token", json.dumps({"token": token}, ensure_ascii=False))
+                    if chunk.get("done"):
+                        observe_llm(chunk)
+        except Overloaded as e:
+            record_request("query_stream", source, "shed", timer, stage=e.stage, reason=e.reason)
+            yield sse("error", json.dumps({"error": str(e), "retry_after": e.retry_after}))
+            return
+        except asyncio.CancelledError:
+            record_request("query_stream", source, "cancelled", timer)
+            raise
+        except Exception as e:
+            log.error(f"Ollama stream failed: {e}", extra={"fields": {"ollama_url": ",".join(OLLAMA_URLS)}})
+            record_request("query_stream", source, "llm_error", timer)
+            yield sse("error", json.dumps({"error": f"Ollama Fail: {str(e)}"}))
+            return
+        # inkl. Zeit, in der der Client die Tokens abgenommen hat
+        timer.add("llm_generate", time.perf_counter() - llm_started)
+        with timer.stage("sql_cleanup"):
+            sql_query = clean_sql(llm_result)
+
+    yield sse("sql", json.dumps({"sql_query": sql_query, "cached": from_cache}, ensure_ascii=False))
+
+    row_count = 0
+    truncated = False
+    error_msg = None
+    try:
+        with timer.stage("sql_validate"):
+            sql_query = guard.validate(sql_query)
+        with timer.stage("sql_route"):
+            exec_sql = route_sql(sql_query)
+        if approximate and exec_sql is sql_query:
+            async for event in stream_estimates(exec_sql, ticket, timer):
+                yield event
+        db_before = timer.stages.get("db_execute", 0.0) + timer.stages.get("db_fetch", 0.0)
+        async with admitted("db", ticket, timer):
+            timer.start("db_acquire")
+            async with db_pool.connection() as conn:
+                timer.stop("db_acquire")
+                cur, max_rows, note, plan = await db_pool.run(open_stream_cursor, conn, exec_sql, timer, cancel=conn)
+                if note:
+                    yield sse("notice", json.dumps({"notice": note}, ensure_ascii=False))
+                try:
+                    while True:
+                        lines = await db_pool.run(fetch_ndjson_batch, cur, STREAM_BATCH_SIZE, timer, cancel=conn)
+                        if not lines:
+                            break
+                        if row_count + len(lines) > max_rows:
+                            lines = lines[:max_rows - row_count]
+                            truncated = True
+                        row_count += len(lines)
+                        if lines:
+                            yield sse("rows", *lines)
+                        if truncated:
+                            break
+                finally:
+                    await db_pool.run(close_cursor, cur)
+                db_seconds = timer.stages.get("db_execute", 0.0) + timer.stages.get("db_fetch", 0.0) - db_before
+                workload.record(exec_sql, db_seconds * 1000, row_count, plan)
+    except asyncio.CancelledError:
+        timer.stop("db_acquire")
+        record_request("query_stream", source, "cancelled", timer, row_count=row_count)
+        raise
+    except Exception as e:
+        timer.stop("db_acquire")
+        error_msg = db_error_message(e)
+        status = "shed" if isinstance(e, Overloaded) else "sql_error"
+
+    if error_msg is not None:
+        record_request("query_stream", source, status, timer, error=error_msg)
+        yield sse("error", json.dumps({"error": error_msg}, ensure_ascii=False))
+        return
+
+    if not from_cache:
+        translation_cache.set(cache_key, question, OLLAMA_MODEL, sql_query)
+    record_request(
+        "query_stream", source, "ok", timer, row_count=row_count, truncated=truncated
+    )
+    yield sse("done", json.dumps({"row_count": row_count, "truncated": truncated}))
+
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest, http_request: Request):
+    ticket = admission_ticket(http_request, "interactive")
+    return StreamingResponse(
+        stream_unless_disconnected(
+            http_request, stream_query(request.natural_language_query, ticket, request.approximate)
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def translate_question(question: str, endpoint: str, timer: RequestTimer, ticket: Ticket | None = None) -> tuple:
+    """
+    Intent -> translation cache -> LLM, for endpoints that answer with HTTP errors
+
+    Returns:
+        (sql_query, source, cache key, from_cache)
+    """
+    with timer.stage("sql_lookup"):
+        cache_key = translation_cache.make_key(question, OLLAMA_MODEL, OLLAMA_OPTIONS)
+        intent = intent_matcher.match(question) if INTENTS_ENABLED else None
+        sql_query = intent.sql if intent else await translation_cache.get(cache_key)
+    from_cache = sql_query is not None
+    source = "intent" if intent else "translation_cache" if from_cache else "llm"
+    if from_cache:
+        return sql_query, source, cache_key, from_cache
+
+    with timer.stage("prompt_build"):
+        full_prompt = build_prompt(question)
+    try:
+        async with admitted("llm", ticket, timer):
+            with timer.stage("llm_generate"):
+                ollama_response = await ollama.generate(full_prompt, options=OLLAMA_OPTIONS)
+        observe_llm(ollama_response)
+    except Overloaded as e:
+        record_request(endpoint, source, "shed", timer, stage=e.stage, reason=e.reason)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=overload_headers(e))
+    except Exception as e:
+        log.error(f"Ollama request failed: {e}", extra={"fields": {"ollama_url": ",".join(OLLAMA_URLS)}})
+        record_request(endpoint, source, "llm_error", timer)
+        raise HTTPException(status_code=500, detail=f"Ollama Fail: {str(e)}")
+    with timer.stage("sql_cleanup"):
+        sql_query = clean_sql(ollama_response.get("response", ""))
+    return sql_query, source, cache_key, from_cache
+
+def export_error_status(e: Exception) -> int:
+    """HTTP status for errors raised before an export body is sent"""
+    if isinstance(e, Overloaded):
+        return e.status_code
+    if isinstance(e, (PoolTimeoutError, psycopg2.OperationalError)) and not isinstance(e, psycopg2.errors.QueryCanceled):
+        return 503
+    if isinstance(e, psycopg2.errors.QueryCanceled):
+        return 504
+    return 400
+
+async def export_chunks(sql_query: str, exec_sql: str, sink, timer: RequestTimer, info: dict, ticket: Ticket | None = None):
+    """
+    Run ``exec_sql`` on a tuple server-side cursor and feed EXPORT_BATCH_SIZE-row
+    RecordBatches into ``sink``; yields whatever the sink returns
+
+    The first chunk (schema + first batch) is produced even for empty results.
+    ``info`` receives max_rows and note before it and row_count/truncated at the end.
+    """
+    row_count = 0
+    async with admitted("db", ticket, timer):
+        timer.start("db_acquire")
+        async with db_pool.connection() as conn:
+            timer.stop("db_acquire")
+            cur, max_rows, note, plan = await db_pool.run(
+                open_stream_cursor, conn, exec_sql, timer, EXPORT_MAX_ROWS,
+                {"max_rows": EXPORT_MAX_ROWS, "max_cost": EXPORT_MAX_COST}, None, cancel=conn,
+            )
+            info.update(max_rows=max_rows, note=note, row_count=0, truncated=False)
+            metadata = {"sql_query": sql_query, "max_rows": str(max_rows)}
+            if note:
+                metadata["notice"] = note
+            state = {"metadata": metadata}
+            try:
+                while True:
+                    chunk, rows, truncated = await db_pool.run(
+                        fetch_export_batch, cur, state, EXPORT_BATCH_SIZE, max_rows - row_count, sink, timer,
+                        cancel=conn,
+                    )
+                    row_count += rows
+                    info.update(row_count=row_count, truncated=truncated)
+                    yield chunk
+                    if truncated or rows < EXPORT_BATCH_SIZE:
+                        break
+            finally:
+                await db_pool.run(close_cursor, cur)
+            db_seconds = timer.stages.get("db_execute", 0.0) + timer.stages.get("db_fetch", 0.0)
+            workload.record(exec_sql, db_seconds * 1000, row_count, plan)
+
+async def prepare_export(question: str, endpoint: str, timer: RequestTimer, ticket: Ticket | None = None) -> tuple:
+    """Translate + validate + route for an export; raises HTTPException on failure"""
+    if pa is None:
+        record_request(endpoint, "none", "unavailable", timer)
+        raise HTTPException(status_code=501, detail="Columnar export needs the optional package pyarrow")
+    log.debug(f"Received export query ({endpoint}): {question}")
+    sql_query, source, cache_key, from_cache = await translate_question(question, endpoint, timer, ticket)
+    try:
+        with timer.stage("sql_validate"):
+            sql_query = guard.validate(sql_query)
+    except SQLRejected as e:
+        record_request(endpoint, source, "sql_error", timer, error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    with timer.stage("sql_route"):
+        exec_sql = route_sql(sql_query)
+    return sql_query, exec_sql, source, cache_key, from_cache
+
+@app.post("/query/arrow")
+async def process_query_arrow(request: QueryRequest, http_request: Request):
+    """
+    Result as an Arrow IPC stream (one record batch per EXPORT_BATCH_SIZE rows)
+
+    The executed SQL and a possible downgrade notice are in the schema metadata;
+    a result with exactly X-Row-Limit rows was cut off.
+    """
+    return await unless_disconnected(
+        http_request, arrow_export(request, http_request, admission_ticket(http_request, "batch"))
+    )
+
+async def arrow_export(request: QueryRequest, http_request: Request, ticket: Ticket | None = None):
+    timer = RequestTimer()
+    question = request.natural_language_query
+    sql_query, exec_sql, source, cache_key, from_cache = await prepare_export(question, "query_arrow", timer, ticket)
+    encoder = ArrowStreamEncoder(EXPORT_ARROW_COMPRESSION)
+    info: dict = {}
+    chunks = export_chunks(sql_query, exec_sql, encoder.write, timer, info, ticket)
+    try:
+        # Schema + erster Batch vor dem Response-Start: Fehler werden noch ein HTTP-Status
+        first = await chunks.__anext__()
+    except asyncio.CancelledError:
+        timer.stop("db_acquire")
+        record_request("query_arrow", source, "cancelled", timer)
+        raise
+    except Exception as e:
+        timer.stop("db_acquire")
+        await chunks.aclose()
+        error_msg = db_error_message(e)
+        record_request(
+            "query_arrow", source, "shed" if isinstance(e, Overloaded) else "sql_error", timer, error=error_msg
+        )
+        raise HTTPException(status_code=export_error_status(e), detail=error_msg, headers=overload_headers(e))
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            yield encoder.close()
+        except asyncio.CancelledError:
+            record_request("query_arrow", source, "cancelled", timer, row_count=info["row_count"])
+            raise
+        except Exception as e:
+            # Abbruch mitten im Stream: ohne EOS/letzten Chunk erkennt der Client den Fehler
+            record_request("query_arrow", source, "sql_error", timer, error=db_error_message(e))
+            raise
+        if not from_cache:
+            translation_cache.set(cache_key, question, OLLAMA_MODEL, sql_query)
+        record_request(
+            "query_arrow", source, "ok", timer,
+            row_count=info["row_count"], truncated=info["truncated"],
+        )
+
+    headers = {"X-Row-Limit": str(info["max_rows"])}
+    if info["note"]:
+        headers["X-Query-Notice"] = info["note"]
+    return StreamingResponse(
+        stream_unless_disconnected(http_request, body()), media_type=ARROW_MEDIA_TYPE, headers=headers
+    )
+
+@app.post("/query/parquet")
+async def process_query_parquet(request: QueryRequest, http_request: Request):
+    """
+    Result as a Parquet file (zstd, one row group per EXPORT_BATCH_SIZE rows)
+
+    The file is complete before the response starts, so errors are HTTP errors and
+    the row count / truncation are sent as headers.
+    """
+    return await unless_disconnected(
+        http_request, parquet_export(request, admission_ticket(http_request, "batch"))
+    )
+
+async def parquet_export(request: QueryRequest, ticket: Ticket | None = None):
+    timer = RequestTimer()
+    question = request.natural_language_query
+    sql_query, exec_sql, source, cache_key, from_cache = await prepare_export(question, "query_parquet", timer, ticket)
+    spool = ParquetSpool(EXPORT_PARQUET_COMPRESSION, EXPORT_SPOOL_BYTES)
+    info: dict = {}
+    try:
+        async for _ in export_chunks(sql_query, exec_sql, spool.write, timer, info, ticket):
+            pass
+        with timer.stage("serialize"):
+            size = await db_pool.run(spool.finish)
+    except asyncio.CancelledError:
+        timer.stop("db_acquire")
+        spool.close()
+        record_request("query_parquet", source, "cancelled", timer, row_count=info.get("row_count", 0))
+        raise
+    except Exception as e:
+        timer.stop("db_acquire")
+        spool.close()
+        error_msg = db_error_message(e)
+        record_request(
+            "query_parquet", source, "shed" if isinstance(e, Overloaded) else "sql_error", timer, error=error_msg
+        )
+        raise HTTPException(status_code=export_error_status(e), detail=error_msg, headers=overload_headers(e))
+
+    if not from_cache:
+        translation_cache.set(cache_key, question, OLLAMA_MODEL, sql_query)
+    record_request(
+        "query_parquet", source, "ok", timer,
+        row_count=info["row_count"], truncated=info["truncated"], bytes=size,
+    )
+
+    async def body():
+        try:
+            while True:
+                data = await db_pool.run(spool.read)
+                if not data:
+                    break
+                yield data
+        finally:
+            spool.close()
+
+    headers = {
+        "Content-Disposition": 'attachment; filename="query.parquet"',
+        "Content-Length": str(size),
+        "X-Row-Count": str(info["row_count"]),
+        "X-Truncated": "true" if info["truncated"] else "false",
+        "X-Row-Limit": str(info["max_rows"]),
+    }
+    if info["note"]:
+        headers["X-Query-Notice"] = info["note"]
+    return StreamingResponse(body(), media_type=PARQUET_MEDIA_TYPE, headers=headers)
+
+async def run_batch(questions: list, page_size: int, timer: RequestTimer, summary: dict, ticket: Ticket | None = None):
+    """
+    Answer a list of questions; yields (question indices, item, page JSON, error) as items finish
+
+    Identical questions are translated once and identical SQL runs once. Translations
+    (intent, cache or LLM - at most BATCH_LLM_CONCURRENCY concurrent Ollama calls)
+    run in parallel. As soon as some SQL is ready, it is executed on one pooled
+    connection per round (see fetch_batch_encoded) while the LLM is still working
+    on the rest.
+    """
+    loop = asyncio.get_running_loop()
+    groups: dict = {}  # Cache-Key -> Indizes der (normalisiert) gleichen Frage
+    for i, question in enumerate(questions):
+        groups.setdefault(translation_cache.make_key(question, OLLAMA_MODEL, OLLAMA_OPTIONS), []).append(i)
+    summary["distinct_questions"] = len(groups)
+
+    items: dict = {}       # Cache-Key -> question, sql_query, source
+    results: asyncio.Queue = asyncio.Queue()
+    waiting: dict = {}     # ausgeführtes SQL -> Cache-Keys, die auf das Ergebnis warten
+    cache_slots: dict = {} # ausgeführtes SQL -> (Result-Cache-Key, Tabellen, Snapshot)
+    pending: list = []     # SQL für die nächste Runde auf Postgres
+    wake = asyncio.Event()
+    llm_slots = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+    translating = len(groups)
+
+    def finish(exec_sql: str, payload, error):
+        if payload is not None and error is None and exec_sql in cache_slots:
+            result_key, tables, snapshot = cache_slots.pop(exec_sql)
+            result_cache.set(result_key, payload, snapshot)
+        for key in waiting.pop(exec_sql, []):
+            results.put_nowait((key, payload, error))
+
+    async def prepare(key: str):
+        question = questions[groups[key][0]]
+        item = items[key] = {"question": question, "sql_query": "", "source": "llm"}
+        intent = intent_matcher.match(question) if INTENTS_ENABLED else None
+        sql_query = intent.sql if intent else await translation_cache.get(key)
+        if sql_query is not None:
+            item["source"] = "intent" if intent else "translation_cache"
+        else:
+            try:
+                async with llm_slots, admitted("llm", ticket, timer):
+                    summary["llm_calls"] += 1
+                    with timer.stage("llm_generate"):
+                        ollama_response = await ollama.generate(build_prompt(question), options=OLLAMA_OPTIONS)
+            except Overloaded as e:
+                summary["shed"] += 1
+                results.put_nowait((key, None, str(e)))
+                return
+            except Exception as e:
+                log.error(f"Ollama request failed: {e}", extra={"fields": {"ollama_url": ",".join(OLLAMA_URLS)}})
+                results.put_nowait((key, None, f"Ollama Fail: {str(e)}"))
+                return
+            observe_llm(ollama_response)
+            sql_query = clean_sql(ollama_response.get("response", ""))
+        item["sql_query"] = sql_query
+
+        try:
+            sql_query = item["sql_query"] = guard.validate(sql_query)
+        except SQLRejected as e:
+            results.put_nowait((key, None, str(e)))
+            return
+
+        cache_tables = result_cache.referenced_tables(sql_query)
+        result_key = f"{sql_query} /* page {page_size}  */"
+        if cache_tables:
+            await result_cache.check_watermarks()
+            payload = result_cache.get(result_key)
+            if payload is not None:
+                summary["result_cached"] += 1
+                results.put_nowait((key, payload, None))
+                return
+
+        replica_sql = replica.route(sql_query) if REPLICA_ENABLED else None
+        if replica_sql is not None:
+            try:
+                payload = await replica.run(
+                    fetch_replica_page_encoded, sql_query, replica_sql, page_size, None, timer
+                )
+                summary["replica"] += 1
+                results.put_nowait((key, payload, None))
+                return
+            except ReplicaTimeout as e:
+                results.put_nowait((key, None, db_error_message(e)))
+                return
+            except Exception as e:
+                replica.record_fallback(e)
+
+        exec_sql = route_sql(sql_query)
+        if exec_sql in waiting:
+            waiting[exec_sql].append(key)
+            return
+        waiting[exec_sql] = [key]
+        if cache_tables:
+            cache_slots[exec_sql] = (result_key, cache_tables, result_cache.snapshot(cache_tables))
+        pending.append(exec_sql)
+        wake.set()
+
+    async def prepare_item(key: str):
+        nonlocal translating
+        try:
+            await prepare(key)
+        except Exception as e:
+            log.exception("Unhandled error in batch item")
+            results.put_nowait((key, None, f"CRASH: {str(e)}"))
+        finally:
+            translating -= 1
+            wake.set()
+
+    async def execute():
+        """One connection checkout per round, all statements ready so far in one transaction"""
+        while True:
+            while not pending:
+                if translating == 0:
+                    return
+                wake.clear()
+                await wake.wait()
+            statements = pending[:]
+            pending.clear()
+            summary["db_rounds"] += 1
+
+            def on_result(exec_sql, payload, error):
+                loop.call_soon_threadsafe(finish, exec_sql, payload, error)
+
+            try:
+                async with admitted("db", ticket, timer):
+                    timer.start("db_acquire")
+                    async with db_pool.connection() as conn:
+                        timer.stop("db_acquire")
+                        await db_pool.run(
+                            fetch_batch_encoded, conn, statements, page_size, timer, on_result, cancel=conn
+                        )
+            except Exception as e:
+                timer.stop("db_acquire")
+                error = db_error_message(e)
+                # Callbacks der schon fertigen Statements zuerst abarbeiten lassen
+                await asyncio.sleep(0)
+                for exec_sql in statements:
+                    if exec_sql in waiting:
+                        finish(exec_sql, None, error)
+
+    tasks = [asyncio.create_task(prepare_item(key)) for key in groups]
+    executor = asyncio.create_task(execute())
+    try:
+        for _ in range(len(groups)):
+            key, payload, error = await results.get()
+            item = items[key]
+            if payload is not None and item["source"] == "llm":
+                translation_cache.set(key, item["question"], OLLAMA_MODEL, item["sql_query"])
+            if payload is None:
+                summary["errors"] += len(groups[key])
+            yield groups[key], item, payload, error
+        await executor
+    finally:
+        # Client-Abbruch: offene LLM-Aufrufe und die laufende DB-Runde abbrechen
+        for task in tasks:
+            task.cancel()
+        executor.cancel()
+
+def batch_item(index: int, item: dict, page_json: bytes | None, error: str | None) -> bytes:
+    """One result object of /query/batch (pre-serialized rows, like query_response)"""
+    return b"".join([
+        b'{"index":', str(index).encode("ascii"),
+        b',"question":', json.dumps(item["question"], ensure_ascii=False).encode("utf-8"),
+        b',"sql_query":', json.dumps(item["sql_query"], ensure_ascii=False).encode("utf-8"),
+        b',"source":', json.dumps(item["source"]).encode("ascii"),
+        b",", page_json if page_json is not None else EMPTY_PAGE_JSON,
+        b',"error":', json.dumps(error, ensure_ascii=False).encode("utf-8"),
+        b"}",
+    ])
+
+@app.post("/query/batch")
+async def process_query_batch(request: BatchQueryRequest, http_request: Request):
+    """
+    Several questions in one round trip: ``{"results": [...]}`` in request order, or
+    with ``stream=true`` NDJSON lines in completion order (each carries its ``index``)
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    timer = RequestTimer()
+    page_size = paginator.page_size(request.page_size)
+    summary = {
+        "questions": len(request.questions),
+        "llm_calls": 0, "result_cached": 0, "replica": 0, "db_rounds": 0, "errors": 0, "shed": 0,
+    }
+    ticket = admission_ticket(http_request, "batch")
+
+    def record():
+        status = "ok" if not summary["errors"] else (
+            "sql_error" if summary["errors"] == summary["questions"] else "partial"
+        )
+        record_request("query_batch", "batch", status, timer, **summary)
+
+    if request.stream:
+        async def lines():
+            try:
+                async for indices, item, payload, error in run_batch(
+                    request.questions, page_size, timer, summary, ticket
+                ):
+                    for index in indices:
+                        yield batch_item(index, item, payload, error) + b"\n"
+            except asyncio.CancelledError:
+                record_request("query_batch", "batch", "cancelled", timer, **summary)
+                raise
+            record()
+
+        return StreamingResponse(stream_unless_disconnected(http_request, lines()), media_type="application/x-ndjson")
+
+    async def collect():
+        results = [b""] * len(request.questions)
+        try:
+            async for indices, item, payload, error in run_batch(
+                request.questions, page_size, timer, summary, ticket
+            ):
+                for index in indices:
+                    results[index] = batch_item(index, item, payload, error)
+        except asyncio.CancelledError:
+            record_request("query_batch", "batch", "cancelled", timer, **summary)
+            raise
+        with timer.stage("response"):
+            body = b'{"results":[' + b",".join(results) + b"]}"
+        record()
+        return Response(content=body, media_type="application/json")
+
+    return await unless_disconnected(http_request, collect())
@@ -0,0 +1,3 @@
+"""
+Middleware Package - ASGI-Middleware der API (Response-Komprimierung)
+"""
@@ -0,0 +1,202 @@
+"""
+Response-Komprimierung (zstd, gzip) per Accept-Encoding
+
+Reine ASGI-Middleware: Die Kodierung wird nach den q-Werten des Clients
+ausgehandelt (bei Gleichstand zstd vor gzip; zstd nur mit dem optionalen Paket
+``zstandard``). Vollständige Bodies werden in einem Stück komprimiert,
+Streaming-Responses (SSE, NDJSON) chunkweise mit Flush pro Chunk - jedes Event
+kommt sofort beim Client an. Kleine Bodies, nicht-textuelle Typen und bereits
+kodierte Responses bleiben unverändert.
+"""
+import time
+import zlib
+from typing import Any, Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def negotiate(accept_encoding: str, available: Sequence[str]) -> Optional[str]:
+    """Best encoding from ``available`` (server preference order) for an Accept-Encoding header"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _StreamEncoder:
+    """Incremental compressor; every chunk is flushed so it can be decoded right away"""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31 = gzip-Container
+            self._flush = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._flush)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class CompressionStats:
+    """Counters shared with the middleware instance (Starlette builds it lazily)"""
+
+    def __init__(self):
+        self.responses: Dict[str, int] = {}
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        self.responses[encoding] = self.responses.get(encoding, 0) + 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "zstd_available": zstandard is not None,
+            "responses": dict(self.responses),
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "compress_ms_total": round(self.seconds * 1000, 3),
+        }
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 5, zstd_level: int = 1) -> bytes:
+    """One-shot compression of a complete body"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=zstd_level).compress(body)
+    obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    return obj.compress(body) + obj.flush()
+
+
+class CompressionMiddleware:
+    """Negotiated zstd/gzip for JSON, NDJSON and text responses"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 5,
+        zstd_level: int = 1,
+        encodings: Sequence[str] = ("zstd", "gzip"),
+        stats: Optional[CompressionStats] = None,
+    ):
+        """
+        Args:
+            app: ASGI app
+            minimum_size: Complete bodies below this many bytes are sent uncompressed
+            gzip_level: zlib level 1-9
+            zstd_level: zstd level (1 compressed JSON results faster and smaller than 3 in bench.serialization)
+            encodings: Offered encodings in server preference order
+            stats: Shared counters (for /metrics)
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.available = [e for e in encodings if e == "gzip" or (e == "zstd" and zstandard is not None)]
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_StreamEncoder] = None
+        passthrough = False
+        streamed_in = streamed_out = 0
+        streamed_seconds = 0.0
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough, streamed_in, streamed_out, streamed_seconds
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    self.stats.skipped += 1
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more:
+                    started = time.perf_counter()
+                    compressed = compress_body(body, encoding, self.gzip_level, self.zstd_level)
+                    self.stats.record(encoding, len(body), len(compressed), time.perf_counter() - started)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    start = None
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                if "content-length" in headers:
+                    del headers["content-length"]
+                encoder = _StreamEncoder(encoding, self.gzip_level, self.zstd_level)
+                await send(start)
+                start = None
+
+            started = time.perf_counter()
+            chunk = encoder.compress(body) if body else b""
+            if not more:
+                chunk += encoder.finish()
+            streamed_seconds += time.perf_counter() - started
+            streamed_in += len(body)
+            streamed_out += len(chunk)
+            if not more:
+                self.stats.record(encoding, streamed_in, streamed_out, streamed_seconds)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
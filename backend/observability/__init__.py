@@ -0,0 +1,3 @@
+"""
+Observability Package - Metriken und Logging
+"""
@@ -0,0 +1,78 @@
+"""
+Nicht-blockierendes, strukturiertes Logging
+
+Handler im Request-Pfad ist ein ``QueueHandler`` (nur ein ``put`` in eine
+Queue); ein ``QueueListener``-Thread schreibt auf die Konsole und als JSON
+Lines in eine rotierende Datei. Ersetzt die synchronen ``open(..., "w")``
+Writes, die den Event Loop blockiert und sich gegenseitig überschrieben haben.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Optional
+
+LOGGER_NAME = "backend"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; ``extra={"fields": {...}}`` is merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + json.dumps(fields, ensure_ascii=False, default=str)
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+def setup_logging(path: Optional[str] = "backend.log", level: str = "INFO") -> logging.handlers.QueueListener:
+    """
+    Route the ``backend`` logger through a queue
+
+    Returns:
+        The (not yet started) QueueListener - start it at startup, stop it at shutdown
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(ConsoleFormatter())
+    handlers = [console]
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper())
+    logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    logger.propagate = False
+
+    return logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+
+def get_logger(name: str = "") -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
@@ -0,0 +1,189 @@
+"""
+Prometheus Metriken (Text Exposition Format)
+
+Bewusst ohne prometheus_client: Histogramme und Counter mit Labels plus
+Collector-Callbacks, die beim Scrape die ``stats()`` von Pool, Caches und
+LLM-Client als Gauges ausgeben.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _label_str(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="' + _fmt(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(series[-2])}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a fixed label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and stats collectors, renders /metrics"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._metrics: List[Any] = []
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.namespace}_{name}", help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(f"{self.namespace}_{name}", help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, subsystem: str, stats_fn: Callable[[], Dict[str, Any]]):
+        """Export every numeric value of ``stats_fn()`` as ``<ns>_<subsystem>_<key>``"""
+        self._collectors.append((subsystem, stats_fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for subsystem, stats_fn in self._collectors:
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.namespace}_{subsystem}_{key}"
+                kind = "counter" if key.endswith("_total") else "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimer:
+    """Per-request stage timings (seconds), filled from the loop and worker threads"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._started: Dict[str, float] = {}
+        self.created = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def start(self, name: str):
+        self._started[name] = time.perf_counter()
+
+    def stop(self, name: str):
+        started = self._started.pop(name, None)
+        if started is not None:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.created
+
+    def as_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def observe(self, histogram: Histogram, **labels):
+        for name, seconds in self.stages.items():
+            histogram.observe(seconds, stage=name, **labels)
+
+
+def maybe_stage(timer: Optional[RequestTimer], name: str):
+    """``timer.stage(name)`` or a no-op when no timer is passed"""
+    if timer is None:
+        return _NOOP
+    return timer.stage(name)
+
+
+class _NoopContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopContext()
@@ -0,0 +1,3 @@
+"""
+Partitions Package - Range-Partitionierung von transactions nach Datum
+"""
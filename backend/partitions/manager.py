@@ -0,0 +1,672 @@
+"""
+Range-Partitionierung von ``public.transactions`` nach ``date``
+
+Umstellung (``convert``), online und in Batches:
+
+1. Neue Tabelle im Staging-Schema ``partitioning``: gleiche Spalten, Defaults
+   und CHECKs, ``PARTITION BY RANGE (date)``, Primärschlüssel um ``date``
+   erweitert. Eine Partition pro Monat bzw. Jahr von der ältesten Zeile bis
+   ``premake`` Perioden in die Zukunft, dazu eine DEFAULT-Partition. Indizes
+   liegen auf der Elterntabelle und damit auf jeder Partition: BRIN auf
+   ``date``, B-Tree auf ``category`` plus die übrigen nicht eindeutigen Indizes
+   der alten Tabelle. Rechte, RLS und Policies werden übernommen.
+2. Ein Trigger spiegelt Inserts/Updates/Deletes der alten Tabelle in die neue.
+3. Kopie in Batches per Keyset über (date, Primärschlüssel) mit einem
+   CONCURRENTLY angelegten Hilfsindex; jeder Batch ist eine eigene Transaktion.
+   ``FOR SHARE`` liest die aktuelle Version gleichzeitig geänderter Zeilen, die
+   Datumsreihenfolge hält die BRIN-Bereiche eng. Zeilen ohne gespiegelte
+   Änderung landen so genau einmal in der neuen Tabelle (``TRUNCATE`` auf der
+   alten Tabelle wird nicht gespiegelt).
+4. Tausch in einer kurzen Transaktion (``lock_timeout``): die alte Tabelle
+   wandert als ``archive.transactions_unpartitioned`` weg (für einen Rollback),
+   die neue nach ``public``. Eigene Trigger der alten Tabelle (z.B. der
+   Rollup-Trigger aus database/rollups.sql) ziehen mit um.
+
+Wartung (``maintain``, periodisch aus dem Backend): fehlende Partitionen bis
+``premake`` Perioden voraus anlegen - Zeilen, die schon in der DEFAULT-Partition
+gelandet sind, ziehen dabei um - und Partitionen, die komplett älter als
+``retention`` Perioden sind, abhängen: ``archive`` verschiebt sie ins Schema
+``archive``, ``drop`` löscht sie.
+
+CLI::
+
+    python -m partitions.manager status
+    python -m partitions.manager convert --granularity month --batch 50000
+    python -m partitions.manager maintain --premake 3 --retention 36 --mode archive
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import sql as pgsql
+
+from observability.logger import get_logger
+
+log = get_logger("partitions")
+
+GRANULARITIES = ("month", "year")
+RETIRE_MODES = ("archive", "drop")
+STAGING_SCHEMA = "partitioning"
+ARCHIVE_SCHEMA = "archive"
+
+PARTITIONS_SQL = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(%s)
+ORDER BY c.relname
+"""
+BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+PRIMARY_KEY_SQL = """
+SELECT a.attname
+FROM pg_index i
+CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+WHERE i.indrelid = to_regclass(%s) AND i.indisprimary
+ORDER BY k.n
+"""
+TRIGGERS_SQL = """
+SELECT tgname, pg_get_triggerdef(oid)
+FROM pg_trigger
+WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal AND tgname <> %s
+"""
+INDEXES_SQL = """
+SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary
+"""
+GRANTS_SQL = """
+SELECT grantee, privilege_type
+FROM information_schema.role_table_grants
+WHERE table_schema = 'public' AND table_name = %s AND grantee <> current_user
+"""
+POLICIES_SQL = """
+SELECT policyname, permissive, roles::text[], cmd, qual, with_check
+FROM pg_policies
+WHERE schemaname = 'public' AND tablename = %s
+"""
+
+
+def period_start(day: datetime.date, granularity: str) -> datetime.date:
+    return day.replace(month=1, day=1) if granularity == "year" else day.replace(day=1)
+
+
+def next_period(start: datetime.date, granularity: str, periods: int = 1) -> datetime.date:
+    """First day of the period ``periods`` after the one starting at ``start`` (negative = back)"""
+    if granularity == "year":
+        return start.replace(year=start.year + periods)
+    months = start.year * 12 + start.month - 1 + periods
+    return datetime.date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime.date, granularity: str) -> str:
+    return f"{table}_p{start:%Y}" if granularity == "year" else f"{table}_p{start:%Y_%m}"
+
+
+class PartitionManager:
+    """Converts a table to date range partitions and keeps the partition set current"""
+
+    def __init__(
+        self,
+        pool,
+        table: str = "transactions",
+        column: str = "date",
+        granularity: str = "month",
+        premake: int = 3,
+        retention: int = 0,
+        retire_mode: str = "archive",
+        brin_pages_per_range: int = 32,
+        lock_timeout_ms: int = 5000,
+    ):
+        """
+        Args:
+            pool: DatabasePool (only used by the *_async helpers)
+            table: Table in ``public`` to partition
+            column: DATE column used as the range key
+            granularity: month or year (for ``convert``; maintenance reads it from the partitions)
+            premake: Periods to create ahead of the current one
+            retention: Periods to keep before the current one; 0 = keep everything
+            retire_mode: archive (detach + move to schema ``archive``) or drop (detach + drop)
+            brin_pages_per_range: BRIN granularity on ``column``
+            lock_timeout_ms: Give up on DDL instead of queueing queries behind it
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}")
+        if retire_mode not in RETIRE_MODES:
+            raise ValueError(f"retire_mode must be one of {RETIRE_MODES}")
+        self.pool = pool
+        self.table = table
+        self.column = column
+        self.granularity = granularity
+        self.premake = premake
+        self.retention = retention
+        self.retire_mode = retire_mode
+        self.brin_pages_per_range = brin_pages_per_range
+        self.lock_timeout_ms = lock_timeout_ms
+        self.available = False
+
+        # Stats
+        self._runs = 0
+        self._failures = 0
+        self._created_total = 0
+        self._retired_total = 0
+        self._moved_total = 0
+        self._last_run: Optional[float] = None
+        self._last_ms: Optional[float] = None
+
+    async def open(self):
+        """Enable maintenance only if the table is already partitioned"""
+        try:
+            async with self.pool.connection() as conn:
+                self.available = await self.pool.run(self.is_partitioned, conn)
+        except Exception as e:
+            log.warning(f"Partition check failed: {e}")
+            self.available = False
+        if not self.available:
+            log.info(f"public.{self.table} is not partitioned - partition maintenance off")
+
+    def _ident(self, *parts: str) -> pgsql.Composable:
+        return pgsql.Identifier(*parts)
+
+    def is_partitioned(self, conn, schema: str = "public") -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (f"{schema}.{self.table}",)
+            )
+            row = cur.fetchone()
+        return bool(row and row[0])
+
+    # --- Bestand ---------------------------------------------------------------
+
+    def partitions(self, conn, schema: str = "public") -> List[Dict[str, Any]]:
+        """Partitions with bounds (``None`` for the DEFAULT partition) and size estimates"""
+        result = []
+        with conn.cursor() as cur:
+            cur.execute(PARTITIONS_SQL, (f"{schema}.{self.table}",))
+            for name, bound, rows, size in cur.fetchall():
+                match = BOUND_RE.search(bound or "")
+                result.append({
+                    "name": name,
+                    "from": datetime.date.fromisoformat(match.group(1)) if match else None,
+                    "to": datetime.date.fromisoformat(match.group(2)) if match else None,
+                    "default": bound == "DEFAULT",
+                    "rows_estimate": rows if rows >= 0 else None,
+                    "bytes": size,
+                })
+        return result
+
+    def detect_granularity(self, partitions: List[Dict[str, Any]]) -> str:
+        for part in partitions:
+            if part["from"] is not None:
+                return "year" if (part["to"] - part["from"]).days >= 365 else "month"
+        return self.granularity
+
+    def status(self, conn) -> Dict[str, Any]:
+        partitioned = self.is_partitioned(conn)
+        parts = self.partitions(conn) if partitioned else []
+        bounded = [p for p in parts if p["from"] is not None]
+        return {
+            "table": f"public.{self.table}",
+            "partitioned": partitioned,
+            "granularity": self.detect_granularity(parts) if partitioned else None,
+            "partitions": len(bounded),
+            "from": str(min(p["from"] for p in bounded)) if bounded else None,
+            "to": str(max(p["to"] for p in bounded)) if bounded else None,
+            "default_rows_estimate": next((p["rows_estimate"] for p in parts if p["default"]), None),
+            "bytes": sum(p["bytes"] for p in parts),
+            "detail": [
+                {**p, "from": p["from"] and str(p["from"]), "to": p["to"] and str(p["to"])} for p in parts
+            ],
+        }
+
+    # --- Wartung ---------------------------------------------------------------
+
+    def _lock_timeout(self, cur):
+        cur.execute(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+
+    def _create_partition(
+        self, cur, schema: str, start: datetime.date, end: datetime.date, name: str, default: Optional[str]
+    ) -> int:
+        """
+        Create one range partition; rows already in the DEFAULT partition for that
+        range are moved into it (Postgres refuses the partition otherwise)
+
+        The rows go straight into the new partition, not through the parent: statement
+        triggers of the parent (the rollup trigger from database/rollups.sql) do not
+        fire, so moved rows are not queued in ``rollup_pending`` a second time.
+
+        Returns:
+            Rows moved out of the DEFAULT partition
+        """
+        parent = self._ident(schema, self.table)
+        column = self._ident(self.column)
+        moved = 0
+        if default:
+            cur.execute(
+                pgsql.SQL(
+                    "CREATE TEMP TABLE partition_move ON COMMIT DROP AS "
+                    "WITH moved AS (DELETE FROM {} WHERE {} >= %s AND {} < %s RETURNING *) SELECT * FROM moved"
+                ).format(self._ident("public", default), column, column),
+                (start, end),
+            )
+            moved = cur.rowcount
+        cur.execute(
+            pgsql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+                self._ident("public", name), parent
+            ),
+            (start, end),
+        )
+        if default:
+            if moved:
+                cur.execute(
+                    pgsql.SQL("INSERT INTO {} SELECT * FROM partition_move").format(self._ident("public", name))
+                )
+            cur.execute("DROP TABLE partition_move")
+        return moved
+
+    def ensure_partitions(self, conn, today: Optional[datetime.date] = None) -> List[str]:
+        """Create the partitions up to ``premake`` periods ahead (one transaction each)"""
+        today = today or datetime.date.today()
+        parts = self.partitions(conn)
+        granularity = self.detect_granularity(parts)
+        default = next((p["name"] for p in parts if p["default"]), None)
+        bounded = [p for p in parts if p["from"] is not None]
+        start = max(p["to"] for p in bounded) if bounded else period_start(today, granularity)
+        last = next_period(period_start(today, granularity), granularity, self.premake)
+        conn.rollback()
+
+        created = []
+        while start <= last:
+            end = next_period(start, granularity)
+            name = partition_name(self.table, start, granularity)
+            try:
+                with conn.cursor() as cur:
+                    self._lock_timeout(cur)
+                    moved = self._create_partition(cur, "public", start, end, name, default)
+                conn.commit()
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            self._moved_total += moved
+            created.append(name)
+            log.info(f"Partition {name} created", extra={"fields": {"from": str(start), "to": str(end), "moved": moved}})
+            start = end
+        return created
+
+    def retire_partitions(self, conn, today: Optional[datetime.date] = None) -> List[str]:
+        """Detach (and archive or drop) partitions entirely older than ``retention`` periods"""
+        if self.retention <= 0:
+            return []
+        today = today or datetime.date.today()
+        parts = self.partitions(conn)
+        granularity = self.detect_granularity(parts)
+        cutoff = next_period(period_start(today, granularity), granularity, -self.retention)
+        conn.rollback()
+
+        retired = []
+        for part in parts:
+            if part["to"] is None or part["to"] > cutoff:
+                continue
+            try:
+                with conn.cursor() as cur:
+                    self._lock_timeout(cur)
+                    cur.execute(pgsql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        self._ident("public", self.table), self._ident("public", part["name"])
+                    ))
+                    if self.retire_mode == "drop":
+                        cur.execute(pgsql.SQL("DROP TABLE {}").format(self._ident("public", part["name"])))
+                    else:
+                        cur.execute(pgsql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(self._ident(ARCHIVE_SCHEMA)))
+                        cur.execute(pgsql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+                            self._ident("public", part["name"]), self._ident(ARCHIVE_SCHEMA)
+                        ))
+                conn.commit()
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            retired.append(part["name"])
+            log.info(f"Partition {part['name']} retired ({self.retire_mode})")
+        return retired
+
+    def maintain(self, conn, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """Blocking: create upcoming partitions, then retire expired ones"""
+        started = time.perf_counter()
+        try:
+            if not self.is_partitioned(conn):
+                raise RuntimeError(f"public.{self.table} is not partitioned - run python -m partitions.manager convert")
+            created = self.ensure_partitions(conn, today)
+            retired = self.retire_partitions(conn, today)
+        except (psycopg2.Error, RuntimeError):
+            conn.rollback()
+            self._failures += 1
+            raise
+        self._runs += 1
+        self._created_total += len(created)
+        self._retired_total += len(retired)
+        self._last_run = time.time()
+        self._last_ms = round((time.perf_counter() - started) * 1000, 3)
+        return {"created": created, "retired": retired, "mode": self.retire_mode}
+
+    async def maintain_async(self) -> Dict[str, Any]:
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self.maintain, conn)
+
+    async def status_async(self) -> Dict[str, Any]:
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self.status, conn)
+
+    # --- Umstellung ------------------------------------------------------------
+
+    def _primary_key(self, cur, regclass: str) -> List[str]:
+        cur.execute(PRIMARY_KEY_SQL, (regclass,))
+        return [row[0] for row in cur.fetchall()]
+
+    def _create_target(self, cur, first_day: datetime.date, today: datetime.date, granularity: str) -> Dict[str, Any]:
+        """Partitioned copy of the table in the staging schema, with partitions, indexes and privileges"""
+        old = self._ident("public", self.table)
+        new = self._ident(STAGING_SCHEMA, self.table)
+        column = self._ident(self.column)
+        key = self._primary_key(cur, f"public.{self.table}")
+        if not key:
+            raise RuntimeError(f"public.{self.table} has no primary key")
+        if self.column not in key:
+            key.append(self.column)  # Der Partitionsschlüssel muss Teil des Primärschlüssels sein
+
+        cur.execute(pgsql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(self._ident(STAGING_SCHEMA)))
+        cur.execute(pgsql.SQL(
+            "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS "
+            "INCLUDING STORAGE INCLUDING GENERATED INCLUDING IDENTITY) PARTITION BY RANGE ({})"
+        ).format(new, old, column))
+        cur.execute(pgsql.SQL("ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ({})").format(
+            new, self._ident(f"{self.table}_pkey"), pgsql.SQL(", ").join(map(self._ident, key))
+        ))
+
+        own_indexes = {f"{self.table}_{self.column}_brin", f"{self.table}_category_idx"}
+        cur.execute(pgsql.SQL("CREATE INDEX {} ON {} USING brin ({}) WITH (pages_per_range = {})").format(
+            self._ident(f"{self.table}_{self.column}_brin"), new, column, pgsql.Literal(self.brin_pages_per_range)
+        ))
+        cur.execute(pgsql.SQL("CREATE INDEX {} ON {} (category)").format(
+            self._ident(f"{self.table}_category_idx"), new
+        ))
+        copied, skipped = [], []
+        cur.execute(INDEXES_SQL, (f"public.{self.table}",))
+        for name, definition, unique in cur.fetchall():
+            using = definition.split(" USING ", 1)[1]
+            if unique or name in own_indexes or using in (f"btree ({self.column})", "btree (category)"):
+                skipped.append(name)  # eindeutige Indizes ohne date gehen auf partitionierten Tabellen nicht
+                continue
+            cur.execute(pgsql.SQL("CREATE INDEX {} ON {} USING ").format(self._ident(name), new) + pgsql.SQL(using))
+            copied.append(name)
+
+        cur.execute(GRANTS_SQL, (self.table,))
+        for grantee, privilege in cur.fetchall():
+            cur.execute(pgsql.SQL("GRANT {} ON {} TO {}").format(
+                pgsql.SQL(privilege), new, pgsql.SQL("PUBLIC") if grantee == "PUBLIC" else self._ident(grantee)
+            ))
+        cur.execute("SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = to_regclass(%s)", (f"public.{self.table}",))
+        rls, force_rls = cur.fetchone()
+        if rls:
+            cur.execute(pgsql.SQL("ALTER TABLE {} ENABLE ROW LEVEL SECURITY").format(new))
+        if force_rls:
+            cur.execute(pgsql.SQL("ALTER TABLE {} FORCE ROW LEVEL SECURITY").format(new))
+        cur.execute(POLICIES_SQL, (self.table,))
+        for name, permissive, roles, command, qual, check in cur.fetchall():
+            statement = pgsql.SQL("CREATE POLICY {} ON {} AS {} FOR {} TO {}").format(
+                self._ident(name), new, pgsql.SQL(permissive), pgsql.SQL(command),
+                pgsql.SQL(", ").join(pgsql.SQL("PUBLIC") if r == "public" else self._ident(r) for r in roles),
+            )
+            if qual:
+                statement += pgsql.SQL(" USING ({})").format(pgsql.SQL(qual))
+            if check:
+                statement += pgsql.SQL(" WITH CHECK ({})").format(pgsql.SQL(check))
+            cur.execute(statement)
+
+        start = period_start(first_day, granularity)
+        last = next_period(period_start(today, granularity), granularity, self.premake)
+        partitions = 0
+        while start <= last:
+            end = next_period(start, granularity)
+            self._create_partition(cur, STAGING_SCHEMA, start, end, partition_name(self.table, start, granularity), None)
+            partitions += 1
+            start = end
+        cur.execute(pgsql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+            self._ident("public", f"{self.table}_default"), new
+        ))
+        return {"key": key, "partitions": partitions, "indexes_copied": copied, "indexes_skipped": skipped}
+
+    def _create_sync_trigger(self, cur, key: List[str]):
+        """Mirror writes on the old table into the new one while the copy runs"""
+        match = pgsql.SQL(" AND ").join(
+            pgsql.SQL("{} = OLD.{}").format(self._ident(c), self._ident(c)) for c in key
+        )
+        cur.execute(pgsql.SQL("""
+            CREATE OR REPLACE FUNCTION {function}() RETURNS trigger
+            LANGUAGE plpgsql SECURITY DEFINER AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM {new} WHERE {match};
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO {new} SELECT (NEW).* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END $$
+        """).format(
+            function=self._ident(STAGING_SCHEMA, f"{self.table}_sync"),
+            new=self._ident(STAGING_SCHEMA, self.table),
+            match=match,
+        ))
+        cur.execute(pgsql.SQL(
+            "CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE ON {} FOR EACH ROW EXECUTE FUNCTION {}()"
+        ).format(
+            self._ident(f"{self.table}_partition_sync"),
+            self._ident("public", self.table),
+            self._ident(STAGING_SCHEMA, f"{self.table}_sync"),
+        ))
+
+    def _copy_batch(self, cur, keyset: List[str], after: Optional[tuple], batch_rows: int) -> Tuple[int, Optional[tuple]]:
+        columns = pgsql.SQL(", ").join(map(self._ident, keyset))
+        where = pgsql.SQL("")
+        if after is not None:
+            where = pgsql.SQL("WHERE ({}) > ({})").format(columns, pgsql.SQL(", ").join(pgsql.Literal(v) for v in after))
+        # Keyset aus dem Snapshot, Zeilen danach mit FOR SHARE: eine gleichzeitig
+        # geänderte Zeile kommt in der neuen Version - oder gar nicht, wenn sich ihr
+        # Schlüssel geändert hat (dann hat der Trigger sie schon kopiert)
+        cur.execute(pgsql.SQL("""
+            WITH keys AS (
+                SELECT {columns} FROM {old} {where} ORDER BY {columns} LIMIT {limit}
+            ), batch AS (
+                SELECT o.* FROM {old} o JOIN keys USING ({columns}) FOR SHARE OF o
+            ), copied AS (
+                INSERT INTO {new} SELECT * FROM batch ON CONFLICT DO NOTHING
+            )
+            SELECT (SELECT count(*) FROM keys), {columns} FROM keys
+            ORDER BY {desc} LIMIT 1
+        """).format(
+            old=self._ident("public", self.table),
+            new=self._ident(STAGING_SCHEMA, self.table),
+            where=where,
+            columns=columns,
+            limit=pgsql.Literal(batch_rows),
+            desc=pgsql.SQL(", ").join(pgsql.SQL("{} DESC").format(self._ident(c)) for c in keyset),
+        ))
+        row = cur.fetchone()
+        if row is None:
+            return 0, None
+        return row[0], tuple(row[1:])
+
+    def _swap(self, cur):
+        """Old table -> archive.<table>_unpartitioned, staged table -> public.<table>"""
+        old = self._ident("public", self.table)
+        self._lock_timeout(cur)
+        cur.execute(pgsql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(old))
+        cur.execute(pgsql.SQL("DROP TRIGGER {} ON {}").format(self._ident(f"{self.table}_partition_sync"), old))
+        cur.execute(pgsql.SQL("DROP FUNCTION {}()").format(self._ident(STAGING_SCHEMA, f"{self.table}_sync")))
+        cur.execute(pgsql.SQL("DROP INDEX {}").format(self._ident("public", f"{self.table}_partition_copy_idx")))
+        # Erst nach der Kopie anlegen, sonst feuern sie für jede kopierte Zeile noch einmal
+        cur.execute(TRIGGERS_SQL, (f"public.{self.table}", f"{self.table}_partition_sync"))
+        triggers = cur.fetchall()
+        for name, _ in triggers:
+            cur.execute(pgsql.SQL("DROP TRIGGER {} ON {}").format(self._ident(name), old))
+        cur.execute(pgsql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(self._ident(ARCHIVE_SCHEMA)))
+        cur.execute(pgsql.SQL("ALTER TABLE {} RENAME TO {}").format(old, self._ident(f"{self.table}_unpartitioned")))
+        cur.execute(pgsql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+            self._ident("public", f"{self.table}_unpartitioned"), self._ident(ARCHIVE_SCHEMA)
+        ))
+        cur.execute(pgsql.SQL("ALTER TABLE {} SET SCHEMA public").format(self._ident(STAGING_SCHEMA, self.table)))
+        cur.execute(pgsql.SQL("DROP SCHEMA {}").format(self._ident(STAGING_SCHEMA)))
+        for _, definition in triggers:
+            cur.execute(definition)  # "ON public.<table>" ist jetzt die neue Tabelle
+
+    def convert(
+        self,
+        conn,
+        batch_rows: int = 50000,
+        pause: float = 0.0,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        today: Optional[datetime.date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Blocking, online conversion of ``public.<table>`` to range partitions
+
+        Every step commits on its own; an interrupted run can be started again
+        (the staged table is reused, the copy is idempotent).
+
+        Args:
+            conn: Connection (switched to autocommit for CREATE INDEX CONCURRENTLY)
+            batch_rows: Rows copied per transaction
+            pause: Seconds to sleep between batches (throttles the load on the primary)
+            progress: Called with the running totals after every batch
+        """
+        started = time.perf_counter()
+        today = today or datetime.date.today()
+        if self.is_partitioned(conn):
+            raise RuntimeError(f"public.{self.table} is already partitioned")
+        old = self._ident("public", self.table)
+        column = self._ident(self.column)
+        result: Dict[str, Any] = {"table": f"public.{self.table}", "granularity": self.granularity}
+
+        with conn.cursor() as cur:
+            staged = self.is_partitioned(conn, STAGING_SCHEMA)
+            if not staged:
+                cur.execute(pgsql.SQL("SELECT min({}) FROM {}").format(column, old))
+                first_day = cur.fetchone()[0] or today
+                result.update(self._create_target(cur, first_day, today, self.granularity))
+                self._create_sync_trigger(cur, result["key"])
+            else:
+                result["key"] = self._primary_key(cur, f"{STAGING_SCHEMA}.{self.table}")
+                log.info("Resuming conversion with the staged table")
+        conn.commit()
+
+        keyset = [self.column] + [c for c in result["key"] if c != self.column]
+        autocommit = conn.autocommit
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(pgsql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({})").format(
+                    self._ident(f"{self.table}_partition_copy_idx"), old,
+                    pgsql.SQL(", ").join(map(self._ident, keyset)),
+                ))
+        finally:
+            conn.autocommit = autocommit
+
+        copied, batches, after = 0, 0, None
+        while True:
+            try:
+                with conn.cursor() as cur:
+                    rows, after = self._copy_batch(cur, keyset, after, batch_rows)
+                conn.commit()
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            if not rows:
+                break
+            copied += rows
+            batches += 1
+            if progress:
+                progress({"rows": copied, "batches": batches, "last": str(after[0]),
+                          "rows_per_s": round(copied / (time.perf_counter() - started), 1)})
+            if pause:
+                time.sleep(pause)
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(pgsql.SQL("ANALYZE {}").format(self._ident(STAGING_SCHEMA, self.table)))
+                self._swap(cur)
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        self.available = True
+        result.update(rows=copied, batches=batches, seconds=round(time.perf_counter() - started, 3),
+                      old_table=f"{ARCHIVE_SCHEMA}.{self.table}_unpartitioned")
+        return result
+
+    def stats(self):
+        return {
+            "available": self.available,
+            "premake": self.premake,
+            "retention": self.retention,
+            "retire_mode": self.retire_mode,
+            "runs": self._runs,
+            "failures": self._failures,
+            "partitions_created_total": self._created_total,
+            "partitions_retired_total": self._retired_total,
+            "default_rows_moved_total": self._moved_total,
+            "last_run": self._last_run,
+            "last_run_ms": self._last_ms,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Partition a table by date range and maintain its partitions")
+    parser.add_argument("command", choices=("status", "convert", "maintain"))
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--table", default="transactions")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default="month")
+    parser.add_argument("--premake", type=int, default=int(os.getenv("PARTITION_PREMAKE", "3")))
+    parser.add_argument("--retention", type=int, default=int(os.getenv("PARTITION_RETENTION", "0")),
+                        help="Periods to keep before the current one (0 = all)")
+    parser.add_argument("--mode", choices=RETIRE_MODES, default=os.getenv("PARTITION_RETIRE_MODE", "archive"))
+    parser.add_argument("--batch", type=int, default=50000, help="convert: rows per copy transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="convert: seconds between batches")
+    parser.add_argument("--brin-pages", type=int, default=32, help="BRIN pages_per_range")
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error("DATABASE_URL is missing in .env (or pass --dsn)")
+
+    manager = PartitionManager(
+        None, table=args.table, granularity=args.granularity, premake=args.premake,
+        retention=args.retention, retire_mode=args.mode, brin_pages_per_range=args.brin_pages,
+    )
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.command == "status":
+            result = manager.status(conn)
+        elif args.command == "convert":
+            result = manager.convert(
+                conn, batch_rows=args.batch, pause=args.pause,
+                progress=lambda p: print(json.dumps(p), file=sys.stderr, flush=True),
+            )
+        else:
+            result = manager.maintain(conn)
+        conn.rollback()
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
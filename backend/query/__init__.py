@@ -0,0 +1,3 @@
+"""
+Query Package - Umschreiben und Absichern des generierten SQL
+"""
@@ -0,0 +1,295 @@
+"""
+Admission Control vor LLM und Datenbank
+
+Jede teure Stufe (Ollama-Generierung, Postgres-Ausführung) hat ein eigenes
+Limit gleichzeitiger Requests. Wer keinen Platz bekommt, wartet in einer
+begrenzten Queue statt sofort Arbeit zu starten:
+
+- Prioritäten: ``interactive`` (/query, /query/stream) wird immer vor ``batch``
+  (/query/batch, Exporte) bedient. Ist die Queue voll, verdrängt ein
+  interaktiver Request den jüngsten wartenden Batch-Request.
+- Fairness: innerhalb einer Priorität reihum pro Client (``X-Client-Id`` bzw.
+  IP), jeder Client darf höchstens ``max_queued_per_client`` Requests pro Stufe
+  in der Queue haben - ein Client mit 50 Fragen blockiert nicht alle anderen.
+- Deadlines: jeder Request hat eine Deadline (pro Priorität, per
+  ``X-Request-Timeout`` verkürzbar). Wer sie in der Queue überschreitet oder
+  erst danach an eine Stufe kommt, wird abgewiesen statt ausgeführt - dessen
+  Ergebnis liest niemand mehr.
+
+Abgewiesene Requests bekommen ``Overloaded`` mit einem ``Retry-After``-Wert aus
+der mittleren Belegungsdauer der Stufe.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Iterable, Optional
+
+PRIORITIES = ("interactive", "batch")
+SHED_REASONS = ("queue_full", "client_limit", "evicted", "deadline")
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted"""
+
+    def __init__(self, stage: str, reason: str, retry_after: float):
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Overloaded ({stage}: {reason.replace('_', ' ')}), retry in {retry_after:.0f}s")
+
+    @property
+    def status_code(self) -> int:
+        # Ein Client über seinem eigenen Limit soll langsamer senden, alles andere ist Serverlast
+        return 429 if self.reason == "client_limit" else 503
+
+
+class Ticket:
+    """Who is asking, how urgently and until when (one per request, shared by all stages)"""
+
+    __slots__ = ("client", "priority", "deadline")
+
+    def __init__(self, client: str, priority: str = "interactive", timeout: Optional[float] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}")
+        self.client = client
+        self.priority = priority
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (None = no deadline)"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+class _Waiter:
+    __slots__ = ("ticket", "future", "enqueued")
+
+    def __init__(self, ticket: Ticket, future: asyncio.Future):
+        self.ticket = ticket
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class AdmissionStage:
+    """Concurrency limit + bounded priority queue with per-client round robin"""
+
+    def __init__(self, name: str, limit: int, max_queue: int = 64, max_queued_per_client: int = 8):
+        """
+        Args:
+            name: Stage name in errors and stats ("llm", "db")
+            limit: Requests allowed inside the stage at the same time
+            max_queue: Waiting requests over all priorities and clients
+            max_queued_per_client: Waiting requests of one client
+        """
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.max_queued_per_client = max(1, max_queued_per_client)
+        self.active = 0
+        # Priorität -> Client -> wartende Requests; die Reihenfolge der Clients ist die Round-Robin-Reihenfolge
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._queued = 0
+        self._hold_seconds: Optional[float] = None  # EWMA der Belegungsdauer
+
+        # Stats
+        self._admitted_total = 0
+        self._queued_total = 0
+        self._waited_total = 0
+        self._abandoned_total = 0
+        self._shed_total = {reason: 0 for reason in SHED_REASONS}
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def retry_after(self) -> float:
+        """Rough time until a new request would get in"""
+        hold = self._hold_seconds or 1.0
+        return max(1.0, math.ceil(hold * (self._queued + 1) / self.limit))
+
+    def _shed(self, reason: str) -> Overloaded:
+        self._shed_total[reason] += 1
+        return Overloaded(self.name, reason, self.retry_after())
+
+    def _client_queued(self, ticket: Ticket) -> int:
+        return sum(len(q.get(ticket.client, ())) for q in self._queues.values())
+
+    def _enqueue(self, waiter: _Waiter):
+        self._queues[waiter.ticket.priority].setdefault(waiter.ticket.client, deque()).append(waiter)
+        self._queued += 1
+        self._queued_total += 1
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        clients = self._queues[waiter.ticket.priority]
+        queue = clients.get(waiter.ticket.client)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del clients[waiter.ticket.client]
+        self._queued -= 1
+        return True
+
+    def _evict_batch(self) -> bool:
+        """Drop the most recently queued batch request to make room for an interactive one"""
+        newest = None
+        for queue in self._queues["batch"].values():
+            if queue and (newest is None or queue[-1].enqueued > newest.enqueued):
+                newest = queue[-1]
+        if newest is None:
+            return False
+        self._remove(newest)
+        newest.future.set_exception(self._shed("evicted"))
+        return True
+
+    def _next(self) -> Optional[_Waiter]:
+        for priority in PRIORITIES:
+            clients = self._queues[priority]
+            while clients:
+                client, queue = next(iter(clients.items()))
+                waiter = queue.popleft()
+                if queue:
+                    clients.move_to_end(client)  # nächster Client ist dran
+                else:
+                    del clients[client]
+                self._queued -= 1
+                if waiter.future.done():
+                    continue
+                if waiter.ticket.expired():
+                    waiter.future.set_exception(self._shed("deadline"))
+                    continue
+                return waiter
+        return None
+
+    def _dispatch(self):
+        while self.active < self.limit:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self.active += 1
+            waiter.future.set_result(None)
+
+    async def acquire(self, ticket: Ticket):
+        """
+        Wait for a slot
+
+        Raises:
+            Overloaded: queue full, client over its queue share, evicted or past the deadline
+        """
+        if ticket.expired():
+            raise self._shed("deadline")
+        if self.active < self.limit and not self._queued:
+            self.active += 1
+            self._admitted_total += 1
+            return
+        if self._client_queued(ticket) >= self.max_queued_per_client:
+            raise self._shed("client_limit")
+        if self._queued >= self.max_queue and not (ticket.priority == "interactive" and self._evict_batch()):
+            raise self._shed("queue_full")
+
+        waiter = _Waiter(ticket, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), ticket.remaining())
+        except asyncio.TimeoutError:
+            if self._remove(waiter):
+                raise self._shed("deadline")
+            # Gleichzeitig freigegeben - der Slot gehört uns
+            if waiter.future.exception() is not None:
+                raise waiter.future.exception()
+        except asyncio.CancelledError:
+            # Client weg, während er wartete: Platz in der Queue bzw. schon vergebenen Slot zurückgeben
+            self._abandoned_total += 1
+            if not self._remove(waiter) and waiter.future.done() and not waiter.future.exception():
+                self.release()
+            raise
+        waited = time.perf_counter() - waiter.enqueued
+        self._admitted_total += 1
+        self._waited_total += 1
+        self._wait_seconds_total += waited
+        self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+    def release(self, held: Optional[float] = None):
+        """Free a slot; ``held`` (seconds) feeds the Retry-After estimate"""
+        self.active -= 1
+        if held is not None:
+            self._hold_seconds = held if self._hold_seconds is None else 0.8 * self._hold_seconds + 0.2 * held
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {p: sum(len(q) for q in self._queues[p].values()) for p in PRIORITIES}
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self._queued,
+            **{f"queued_{p}": n for p, n in queued.items()},
+            "queued_clients": len({c for p in PRIORITIES for c in self._queues[p]}),
+            "admitted_total": self._admitted_total,
+            "queued_total": self._queued_total,
+            "abandoned_total": self._abandoned_total,
+            "shed_total": sum(self._shed_total.values()),
+            **{f"shed_{reason}_total": n for reason, n in self._shed_total.items()},
+            "queue_wait_avg_ms": round(
+                1000 * self._wait_seconds_total / self._waited_total, 3
+            ) if self._waited_total else 0.0,
+            "queue_wait_max_ms": round(1000 * self._wait_seconds_max, 3),
+            "hold_avg_ms": round(1000 * self._hold_seconds, 3) if self._hold_seconds is not None else None,
+        }
+
+
+class AdmissionController:
+    """Named admission stages + request tickets"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_queue: int = 64,
+        max_queued_per_client: int = 8,
+        deadlines: Optional[Dict[str, float]] = None,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            limits: Concurrent requests per stage, e.g. ``{"llm": 4, "db": 10}``
+            max_queue: Waiting requests per stage
+            max_queued_per_client: Waiting requests of one client per stage
+            deadlines: Seconds per priority from request start (0/None = no deadline)
+            enabled: False = every ``slot`` is a no-op (stats stay empty)
+        """
+        self.enabled = enabled
+        self.stages = {
+            name: AdmissionStage(name, limit, max_queue, max_queued_per_client)
+            for name, limit in limits.items()
+        }
+        self.deadlines = deadlines or {}
+
+    def ticket(self, client: str, priority: str = "interactive", timeout: Optional[float] = None) -> Ticket:
+        """Ticket with the priority's deadline, shortened (never extended) by ``timeout``"""
+        deadline = self.deadlines.get(priority) or None
+        if timeout is not None and timeout > 0:
+            deadline = min(deadline, timeout) if deadline else timeout
+        return Ticket(client, priority, deadline)
+
+    @asynccontextmanager
+    async def slot(self, stage: str, ticket: Optional[Ticket]):
+        """Hold a slot of ``stage`` for the ``async with`` block (no ticket = not admission-controlled)"""
+        if not self.enabled or ticket is None:
+            yield
+            return
+        gate = self.stages[stage]
+        await gate.acquire(ticket)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            gate.release(time.perf_counter() - started)
+
+    def stats(self, stages: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Flat ``<stage>_<key>`` stats (for /metrics and /admin/admission)"""
+        result: Dict[str, Any] = {"enabled": self.enabled}
+        for name in stages or self.stages:
+            for key, value in self.stages[name].stats().items():
+                result[f"{name}_{key}"] = value
+        return result
@@ -0,0 +1,386 @@
+"""
+Näherungsweise Aggregate über eine Stichprobe
+
+Summen, Zählungen und Durchschnitte über große Tabellen (z.B. "Ausgaben pro
+Kategorie" über ``public.transactions``) müssen für die erste Anzeige nicht
+auf den Cent stimmen. Solche Statements werden auf eine Block-Stichprobe
+umgeschrieben (``TABLESAMPLE SYSTEM``, jeder Block mit Wahrscheinlichkeit p)
+und hochgerechnet:
+
+    WITH sample AS (SELECT Blocknummer, WHERE-Bedingung, <Gruppen>, <Argumente>
+                    FROM t TABLESAMPLE SYSTEM (p) REPEATABLE (seed)),
+         blocks AS (SELECT <Gruppen>, Blocknummer, sum(x), count(x) FROM sample WHERE ... GROUP BY ...)
+    SELECT <Gruppen>, N * sum(s) / n, ... FROM blocks GROUP BY <Gruppen>
+
+Hochgerechnet wird über das Verhältnis zur gelesenen Zeilenzahl (N = Zeilen
+der Tabelle wie beim Planer aus ``reltuples`` und aktueller Größe, n = Zeilen
+der Stichprobe) statt über 1/p - der zufällige Stichprobenumfang geht so
+nicht in den Fehler ein. Die Konfidenzintervalle kommen aus der Streuung der
+Residuen pro Klumpen (linearisierter Ratio-Schätzer, AVG analog mit der
+Zeilenzahl der Gruppe): pro Aggregat eine zusätzliche Spalte ``<name>_margin``
+mit der halben Intervallbreite.
+
+Klumpen sind Blocknummern, nicht einzelne Blöcke: ``SYSTEM`` wählt anhand von
+(Blocknummer, Seed) und damit in allen Partitionen dieselben Blocknummern. Die
+erste Stichprobe ist deshalb so groß, dass sie im Mittel ``MIN_CLUSTERS``
+Blocknummern trifft; Gruppen aus nur einem Klumpen bekommen keine Fehlerschranke (NULL).
+
+Geeignet sind SELECTs über genau eine der konfigurierten Tabellen mit SUM,
+COUNT und AVG (ohne DISTINCT/FILTER), ohne Joins, Subqueries, HAVING und
+Window-Funktionen; MIN/MAX lassen sich aus einer Stichprobe nicht schätzen.
+Gruppen, die in der Stichprobe nicht vorkommen, fehlen in der Schätzung.
+Tabellen unter ``min_rows`` laufen exakt.
+"""
+import statistics
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import sqlglot
+from psycopg2 import sql as pgsql
+from psycopg2.extras import RealDictCursor
+from sqlglot import exp
+
+from observability.metrics import maybe_stage
+from query.pagination import strip_statement
+from rollups.router import DEFAULT_NAMES
+
+ESTIMABLE = (exp.Sum, exp.Count, exp.Avg)
+# Darf um ein Aggregat liegen, ohne dass sich die Fehlerschranke ändert (bis auf Rundung)
+TRANSPARENT = (exp.Round, exp.Abs, exp.Neg, exp.Paren)
+UNSUPPORTED = (exp.Min, exp.Max, exp.Window, exp.Filter, exp.Distinct)
+# Weniger Blocknummern in der Stichprobe -> Streuung nicht belastbar, lieber exakt
+MIN_CLUSTERS = 30
+
+# Zeilen (wie der Planer: reltuples pro Seite * aktuelle Seiten) und Blocknummern (größte Partition);
+# pg_partition_tree liefert für normale Tabellen nichts, daher die Tabelle selbst als Fallback
+TABLE_SIZE_SQL = """
+WITH leaves AS (
+    SELECT c.reltuples, c.relpages, pg_relation_size(c.oid) / current_setting('block_size')::int AS pages
+    FROM pg_class c
+    WHERE c.oid IN (SELECT relid FROM pg_partition_tree(to_regclass(%(table)s)) WHERE isleaf)
+       OR (c.oid = to_regclass(%(table)s) AND c.relkind = 'r')
+)
+SELECT coalesce(sum(reltuples / relpages * pages) FILTER (WHERE reltuples > 0 AND relpages > 0), 0),
+       coalesce(max(pages), 0)
+FROM leaves
+"""
+
+
+def _output_name(node: exp.Expression) -> str:
+    if isinstance(node, exp.Column):
+        return node.name
+    if isinstance(node, exp.Cast):
+        return _output_name(node.this)
+    if isinstance(node, exp.Anonymous):
+        return node.name.lower()
+    return DEFAULT_NAMES.get(type(node), "?column?")
+
+
+class _Analysis:
+    """Parsed, eligible statement: the table, group expressions and aggregates"""
+
+    def __init__(self, tree: exp.Select, table: exp.Table, groups: List[exp.Expression]):
+        self.tree = tree
+        self.table = table
+        self.groups = groups
+        self.aggregates: Dict[str, exp.Expression] = {}  # SQL -> Aggregat (dedupliziert)
+        self.margins: List[tuple] = []                    # (Spaltenname, Aggregat-SQL)
+
+
+class SampleApproximator:
+    """Rewrites eligible aggregates to block-sample estimates with confidence margins"""
+
+    def __init__(
+        self,
+        tables: Sequence[str] = ("transactions",),
+        min_rows: int = 1000000,
+        sample_rows: int = 100000,
+        confidence: float = 0.95,
+        refine_factor: float = 10.0,
+        max_sample_percent: float = 20.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            tables: Tables (in ``public``) whose aggregates may be estimated
+            min_rows: Smaller tables are always queried exactly
+            sample_rows: Rows the first estimate should read (sets the sample percentage)
+            confidence: Level of the reported intervals
+            refine_factor: Sample growth per refinement step (progressive answers)
+            max_sample_percent: Refinements stop here; the next step is the exact answer
+            seed: ``REPEATABLE`` seed - the same question gives the same estimate (pages, caches)
+        """
+        self.tables = {t.strip() for t in tables if t.strip()}
+        self.min_rows = min_rows
+        self.sample_rows = max(1, sample_rows)
+        self.confidence = confidence
+        self.z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        self.refine_factor = max(1.5, refine_factor)
+        self.max_sample_percent = min(max_sample_percent, 100.0)
+        self.seed = seed
+
+        # Stats
+        self._estimated = 0
+        self._too_small = 0
+        self._ineligible = 0
+
+    # --- Analyse ------------------------------------------------------------
+
+    def analyze(self, sql_query: str) -> Optional[_Analysis]:
+        """The statement's structure if it can be estimated from a sample, else None"""
+        try:
+            tree = sqlglot.parse_one(strip_statement(sql_query), read="postgres")
+        except sqlglot.errors.ParseError:
+            return None
+        if not isinstance(tree, exp.Select) or tree.args.get("with_") or tree.args.get("joins"):
+            return None
+        if tree.args.get("distinct") or tree.args.get("having"):
+            return None
+        source = tree.args.get("from_")
+        if source is None or not isinstance(source.this, exp.Table):
+            return None
+        table = source.this
+        if table.name not in self.tables or table.db not in ("", "public") or table.args.get("sample"):
+            return None
+        if any(node is not tree for node in tree.find_all(exp.Select)) or tree.find(*UNSUPPORTED):
+            return None
+        if not any(tree.find_all(*ESTIMABLE)):
+            return None
+        for agg in tree.find_all(exp.AggFunc):
+            # z.B. string_agg, stddev oder verschachtelte Aggregate
+            if not isinstance(agg, ESTIMABLE) or (agg.this is not None and agg.this.find(exp.AggFunc)):
+                return None
+
+        # GROUP BY 1 / GROUP BY <Alias> -> Ausdruck der Projektion
+        projections = {p.alias: p.this for p in tree.expressions if isinstance(p, exp.Alias)}
+        groups = []
+        group = tree.args.get("group")
+        for item in (group.expressions if group is not None else []):
+            if isinstance(item, exp.Literal) and not item.is_string:
+                index = int(item.this) - 1
+                if not 0 <= index < len(tree.expressions):
+                    return None
+                item = tree.expressions[index].unalias()
+            elif isinstance(item, exp.Column) and not item.table and item.name in projections:
+                item = projections[item.name]
+            if item.find(exp.AggFunc):
+                return None
+            groups.append(item.copy())
+
+        analysis = _Analysis(tree, table, groups)
+        for projection in tree.expressions:
+            node = projection.unalias()
+            aggregates = list(node.find_all(exp.AggFunc))
+            if not aggregates:
+                continue
+            # Nur Aggregat (ggf. in ROUND/ABS/-) - sonst stimmt die Fehlerschranke nicht
+            inner = node
+            while isinstance(inner, TRANSPARENT):
+                inner = inner.this
+            if len(aggregates) != 1 or inner is not aggregates[0]:
+                return None
+            name = projection.alias or _output_name(node)
+            analysis.margins.append((f"{name}_margin", inner.sql(dialect="postgres")))
+        for agg in tree.find_all(*ESTIMABLE):
+            analysis.aggregates.setdefault(agg.sql(dialect="postgres"), agg)
+        return analysis
+
+    # --- Umschreiben --------------------------------------------------------
+
+    def rewrite(self, analysis: _Analysis, percent: float, rows: float) -> str:
+        """
+        Sample statement for ``percent`` % of the blocks (same column names as the original + margins)
+
+        Args:
+            rows: Estimated rows of the table (the total the sample is scaled up to)
+        """
+        q = 1 - Decimal(str(percent)) / 100
+        z = round(self.z, 4)
+        total = Decimal(round(rows))
+        keys = list(analysis.aggregates)
+        where = analysis.tree.args.get("where")
+        condition = where.this.sql(dialect="postgres") if where is not None else None
+
+        def guarded(expression: str) -> str:
+            # Gruppen/Argumente nur für Zeilen der WHERE-Bedingung auswerten (z.B. 1 / x mit WHERE x <> 0)
+            return f"CASE WHEN {condition} THEN {expression} END" if condition else expression
+
+        sampled = ["(ctid::text::point)[0] AS _blk", f"coalesce({condition}, false) AS _keep" if condition else "true AS _keep"]
+        sampled += [f"{guarded(g.sql(dialect='postgres'))} AS _g{i}" for i, g in enumerate(analysis.groups)]
+        per_block = [f"_g{i}" for i in range(len(analysis.groups))] + ["_blk"]
+        # n = Zeilen der Stichprobe, nn = Summe der quadrierten Klumpengrößen (für die Residuen)
+        n = "(SELECT _n FROM clusters)"
+        nn = "(SELECT _nn FROM clusters)"
+        estimates: Dict[str, str] = {}
+        margins: Dict[str, str] = {}
+
+        def ratio_total(y: str) -> tuple:
+            ratio = f"(sum({y}) / {n})"
+            residual = (
+                f"greatest(sum({y} * {y}) - 2 * {ratio} * sum({y} * _x)"
+                f" + {ratio} * {ratio} * {nn}, 0)"
+            )
+            return f"{total} * {ratio}", f"{z} * {total} * sqrt({q} * {residual})::float8 / {n}"
+
+        for k, key in enumerate(keys):
+            agg = analysis.aggregates[key]
+            arg = agg.this
+            if isinstance(agg, exp.Count) and (arg is None or isinstance(arg, exp.Star)):
+                per_block.append(f"count(*) AS _c{k}")
+            else:
+                sampled.append(f"{guarded(arg.sql(dialect='postgres'))} AS _a{k}")
+                per_block.append(f"count(_a{k}) AS _c{k}")
+            if isinstance(agg, exp.Count):
+                estimate, margins[key] = ratio_total(f"_c{k}")
+                estimates[key] = f"round({estimate})::bigint"
+                continue
+            per_block.append(f"sum((_a{k})::numeric) AS _s{k}")
+            if isinstance(agg, exp.Sum):
+                estimate, margins[key] = ratio_total(f"_s{k}")
+                estimates[key] = f"round({estimate}, 2)"
+            else:
+                ratio = f"(sum(_s{k}) / nullif(sum(_c{k}), 0))"
+                estimates[key] = f"round({ratio}, 2)"
+                # Linearisierung des Ratio-Schätzers: Residuen s_b - R * c_b pro Block
+                residual = (
+                    f"greatest(sum(_s{k} * _s{k}) - 2 * {ratio} * sum(_s{k} * _c{k})"
+                    f" + {ratio} * {ratio} * sum(_c{k} * _c{k}), 0)"
+                )
+                margins[key] = f"{z} * sqrt({q} * {residual})::float8 / nullif(sum(_c{k}), 0)"
+
+        group_by = ", ".join(str(i + 1) for i in range(len(analysis.groups) + 1))
+        ctes = (
+            f"sample AS (SELECT {', '.join(sampled)} FROM {analysis.table.sql(dialect='postgres')} "
+            f"TABLESAMPLE SYSTEM ({Decimal(str(percent))}) REPEATABLE ({int(self.seed)})), "
+            "sizes AS (SELECT _blk, count(*) AS _x FROM sample GROUP BY _blk), "
+            "clusters AS (SELECT sum(_x) AS _n, sum(_x * _x) AS _nn FROM sizes), "
+            f"blocks AS (SELECT {', '.join(per_block)} FROM sample WHERE _keep GROUP BY {group_by})"
+        )
+
+        outer = analysis.tree.copy()
+        # Jede Projektion behält ihren Spaltennamen, auch wenn der Ausdruck ersetzt wird
+        outer.set("expressions", [
+            p if isinstance(p, exp.Alias) else exp.alias_(p, _output_name(p), quoted=True)
+            for p in outer.expressions
+        ])
+        group_sql = {g.sql(dialect="postgres"): i for i, g in enumerate(analysis.groups)}
+
+        def transform(node):
+            if isinstance(node, ESTIMABLE):
+                return sqlglot.parse_one(estimates[node.sql(dialect="postgres")], read="postgres")
+            if not isinstance(node, (exp.Alias, exp.Ordered, exp.Identifier)):
+                i = group_sql.get(node.sql(dialect="postgres"))
+                if i is not None and node.find_ancestor(exp.Group) is None:
+                    return exp.column(f"_g{i}")
+            return node
+
+        outer.set("where", None)
+        outer.set("group", None)
+        outer.set("from_", None)
+        outer = outer.transform(transform)
+        for name, key in analysis.margins:
+            # count(*) = Klumpen der Gruppe; aus einem einzigen lässt sich keine Streuung schätzen
+            outer.append("expressions", exp.alias_(
+                sqlglot.parse_one(f"CASE WHEN count(*) > 1 THEN {margins[key]} END", read="postgres"),
+                name, quoted=True,
+            ))
+        outer = outer.from_("blocks JOIN sizes USING (_blk)")
+        if analysis.groups:
+            outer = outer.group_by(*[f"_g{i}" for i in range(len(analysis.groups))])
+        return f"WITH {ctes} {outer.sql(dialect='postgres')}"
+
+    # --- Ausführung ---------------------------------------------------------
+
+    def table_size(self, conn, table: str) -> tuple:
+        """(estimated current rows, block numbers = pages of the largest partition)"""
+        with conn.cursor() as cur:
+            cur.execute(TABLE_SIZE_SQL, {"table": f"public.{table}"})
+            row = cur.fetchone()
+        return (float(row[0] or 0), int(row[1] or 0)) if row else (0.0, 0)
+
+    def sample_percent(self, rows: float, blocks: int) -> Optional[float]:
+        """First sample percentage for a table of ``rows`` rows (None = query exactly)"""
+        if rows < self.min_rows:
+            return None
+        percent = max(100.0 * self.sample_rows / rows, 100.0 * MIN_CLUSTERS / max(blocks, 1))
+        if percent > self.max_sample_percent:
+            return None
+        # zwei signifikante Stellen reichen, und REPEATABLE-Stichproben bleiben vergleichbar
+        return float(f"{percent:.2g}")
+
+    def refinements(self, percent: float) -> List[float]:
+        """Sample percentages of a progressive answer, starting with ``percent`` (exact comes after)"""
+        steps = [percent]
+        while steps[-1] * self.refine_factor <= self.max_sample_percent:
+            steps.append(float(f"{steps[-1] * self.refine_factor:.2g}"))
+        return steps
+
+    def estimate(
+        self,
+        conn,
+        sql_query: str,
+        limit: int,
+        percent: Optional[float] = None,
+        check: Optional[Callable] = None,
+        timer=None,
+        analysis: Optional[_Analysis] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Estimate ``sql_query`` from a block sample (blocking, inside an open read-only transaction)
+
+        Args:
+            percent: Sample percentage (default: from ``sample_rows`` and the table size)
+            check: ``check(conn, sql, limit) -> (limit, note, plan)`` (the query guard)
+
+        Returns:
+            {"rows", "approximate", "note", "plan", "statement"} or None if the statement
+            is not eligible or the table is small enough to query exactly
+        """
+        analysis = analysis or self.analyze(sql_query)
+        if analysis is None:
+            self._ineligible += 1
+            return None
+        check = check or (lambda conn, statement, limit: (limit, None, {}))
+        with maybe_stage(timer, "sql_lookup"):
+            rows, blocks = self.table_size(conn, analysis.table.name)
+        if percent is None:
+            percent = self.sample_percent(rows, blocks)
+            if percent is None:
+                self._too_small += 1
+                return None
+
+        statement = self.rewrite(analysis, percent, rows)
+        with maybe_stage(timer, "sql_cost_check"):
+            limit, note, plan = check(conn, statement, limit)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with maybe_stage(timer, "db_execute"):
+                cur.execute(pgsql.SQL("SELECT * FROM ({}) AS q LIMIT {}").format(
+                    pgsql.SQL(statement), pgsql.Literal(limit)
+                ))
+            with maybe_stage(timer, "db_fetch"):
+                result = cur.fetchall()
+        self._estimated += 1
+        return {
+            "rows": result,
+            "approximate": {
+                "sample_percent": percent,
+                "sampled_rows_estimate": round(rows * percent / 100),
+                "table_rows_estimate": round(rows),
+                "confidence": self.confidence,
+                "margin_columns": [name for name, _ in analysis.margins],
+            },
+            "note": note,
+            "plan": plan,
+            "statement": statement,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": sorted(self.tables),
+            "min_rows": self.min_rows,
+            "sample_rows": self.sample_rows,
+            "confidence": self.confidence,
+            "estimated": self._estimated,
+            "too_small": self._too_small,
+            "ineligible": self._ineligible,
+        }
@@ -0,0 +1,284 @@
+"""
+Server-seitiges Downsampling von Zeitreihen für Charts
+
+Erkennt die Form eines Ergebnisses (erste Datums-/Zeitspalte - sonst erste
+numerische Spalte - als x, übrige numerische Spalten als y) und liefert höchstens
+``points`` Punkte:
+
+- ``raw``: passt schon, alle Zeilen nach x sortiert
+- ``lttb``: Largest-Triangle-Three-Buckets auf der ersten y-Spalte - behält die
+  Form der Kurve, Zeilen bleiben vollständig (inkl. Text-Spalten)
+- ``minmax``: pro x-Intervall die Zeilen mit kleinstem und größtem y (Ausreißer
+  bleiben sichtbar)
+- ``bucket``: Aggregation in Postgres (``date_trunc`` auf die feinste
+  Kalendereinheit, die in ``points`` Buckets passt, bzw. ``width_bucket`` für
+  numerische x) - es wandern nur die Buckets über die Leitung
+
+``auto`` wählt ``bucket`` für Rohdaten (mehrere Zeilen pro x, z.B. "alle
+Transaktionen") und für Ergebnisse über ``max_rows``, sonst ``lttb``.
+LTTB/MinMax laufen im Worker-Thread auf höchstens ``max_rows`` Zeilen.
+"""
+import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2 import sql as pgsql
+from psycopg2.extras import RealDictCursor
+
+from observability.metrics import maybe_stage
+from query.pagination import strip_statement
+
+MODES = ("auto", "lttb", "minmax", "bucket")
+AGGREGATES = ("sum", "avg", "min", "max", "count")
+TEMPORAL_OIDS = (1082, 1114, 1184)  # date, timestamp, timestamptz
+NUMERIC_OIDS = (20, 21, 23, 700, 701, 1700)
+# Kalendereinheiten für date_trunc, fein -> grob (ungefähre Länge in Sekunden)
+TIME_UNITS = (
+    ("second", 1), ("minute", 60), ("hour", 3600), ("day", 86400), ("week", 7 * 86400),
+    ("month", 30.44 * 86400), ("quarter", 91.31 * 86400), ("year", 365.25 * 86400),
+)
+
+
+def detect_shape(description) -> Optional[Dict[str, Any]]:
+    """
+    x/y columns from ``cursor.description``
+
+    Returns:
+        {"x", "x_kind" ("time" | "number"), "y": [...]} or None if the result is no series
+    """
+    columns = [(d.name, d.type_code) for d in description]
+    x = next((name for name, oid in columns if oid in TEMPORAL_OIDS), None)
+    kind = "time"
+    if x is None:
+        x = next((name for name, oid in columns if oid in NUMERIC_OIDS), None)
+        kind = "number"
+    ys = [name for name, oid in columns if oid in NUMERIC_OIDS and name != x]
+    if x is None or not ys:
+        return None
+    return {"x": x, "x_kind": kind, "y": ys}
+
+
+def _number(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return float(value.toordinal())
+    if isinstance(value, Decimal):
+        return float(value) if value.is_finite() else None
+    return float(value)
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps (xs ascending)"""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n)) if threshold >= n else [0, n - 1][:max(threshold, 0)]
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Mittelwert des nächsten Buckets als dritter Dreieckspunkt
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = max(next_end - next_start, 1)
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def minmax(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Indices of the min and max y per x interval (``threshold // 2`` intervals, xs ascending)"""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    buckets = max(threshold // 2, 1)
+    lo, hi = xs[0], xs[-1]
+    width = (hi - lo) / buckets or 1.0
+    chosen: Dict[int, Tuple[int, int]] = {}
+    for i in range(n):
+        b = min(int((xs[i] - lo) / width), buckets - 1)
+        if b not in chosen:
+            chosen[b] = (i, i)
+        else:
+            low, high = chosen[b]
+            chosen[b] = (i if ys[i] < ys[low] else low, i if ys[i] > ys[high] else high)
+    return sorted({i for pair in chosen.values() for i in pair})
+
+
+def time_unit(low, high, points: int, x_is_date: bool) -> str:
+    """Finest date_trunc unit that gives at most ``points`` buckets between ``low`` and ``high``"""
+    span = (_number(high) - _number(low)) * (86400 if x_is_date else 1)
+    for unit, seconds in TIME_UNITS:
+        if x_is_date and seconds < 86400:
+            continue
+        if span / seconds + 1 <= points:
+            return unit
+    return "year"
+
+
+class SeriesReducer:
+    """Bounded chart series for arbitrary SELECTs"""
+
+    def __init__(self, max_points: int = 2000, max_rows: int = 200000):
+        """
+        Args:
+            max_points: Upper bound for the client's target point count
+            max_rows: Most rows fetched for in-memory reduction (LTTB/MinMax); more -> bucket
+        """
+        self.max_points = max_points
+        self.max_rows = max_rows
+
+    def points(self, requested: int) -> int:
+        return max(3, min(requested, self.max_points))
+
+    def _wrap(self, sql_query: str) -> pgsql.Composable:
+        return pgsql.SQL("({}) AS q").format(pgsql.SQL(strip_statement(sql_query)))
+
+    def _bucket_sql(self, sql_query: str, shape: Dict[str, Any], profile: tuple, points: int,
+                    agg: str, x_is_date: bool) -> Tuple[pgsql.Composable, Optional[str]]:
+        x = pgsql.Identifier(shape["x"])
+        _, _, low, high = profile
+        if shape["x_kind"] == "time":
+            unit = time_unit(low, high, points, x_is_date)
+            bucket = pgsql.SQL("date_trunc({}, q.{}::timestamp)" if x_is_date else "date_trunc({}, q.{})").format(
+                pgsql.Literal(unit), x
+            )
+            if x_is_date:
+                bucket = pgsql.SQL("{}::date").format(bucket)
+            group = pgsql.SQL("1")
+        else:
+            # numerisches x: gleich breite Intervalle zwischen min und max
+            unit = None
+            bucket = pgsql.SQL("min(q.{})").format(x)
+            group = pgsql.SQL("width_bucket(q.{}::float8, {}, {}, {})").format(
+                x, pgsql.Literal(float(low)), pgsql.Literal(float(high) if high != low else float(low) + 1),
+                pgsql.Literal(points - 1),  # x = max landet im Bucket points
+            )
+        values = pgsql.SQL(", ").join(
+            pgsql.SQL("{}(q.{}) AS {}").format(pgsql.SQL(agg), pgsql.Identifier(y), pgsql.Identifier(y))
+            for y in shape["y"]
+        )
+        statement = pgsql.SQL(
+            "SELECT {bucket} AS {x}, count(*) AS {rows}, {values} FROM {source} "
+            "WHERE q.{x} IS NOT NULL GROUP BY {group} ORDER BY 1"
+        ).format(
+            bucket=bucket, x=x, rows=pgsql.Identifier("rows"), values=values,
+            source=self._wrap(sql_query), group=group,
+        )
+        return statement, unit
+
+    def fetch(
+        self,
+        conn,
+        sql_query: str,
+        points: int,
+        mode: str = "auto",
+        agg: str = "sum",
+        check: Optional[Callable] = None,
+        timer=None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reduced series for ``sql_query`` (blocking, inside an open read-only transaction)
+
+        Args:
+            check: ``check(conn, sql, limit) -> (limit, note, plan)`` run before every statement
+                (the query guard); may lower the limit or raise
+
+        Returns:
+            {"rows", "series", "note", "plan", "statement"} or None if the result is no series
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {AGGREGATES}")
+        points = self.points(points)
+        check = check or (lambda conn, statement, limit: (limit, None, {}))
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with maybe_stage(timer, "db_execute"):
+                cur.execute(pgsql.SQL("SELECT * FROM {} LIMIT 0").format(self._wrap(sql_query)))
+            shape = detect_shape(cur.description)
+            if shape is None:
+                return None
+            x_is_date = next(d.type_code for d in cur.description if d.name == shape["x"]) == 1082
+            x = pgsql.Identifier(shape["x"])
+
+            profile_sql = pgsql.SQL(
+                "SELECT count(q.{x}) AS n, count(DISTINCT q.{x}) AS n_distinct, min(q.{x}) AS low, "
+                "max(q.{x}) AS high FROM {source}"
+            ).format(x=x, source=self._wrap(sql_query))
+            with maybe_stage(timer, "sql_cost_check"):
+                check(conn, profile_sql.as_string(conn), 1)
+            with maybe_stage(timer, "db_execute"):
+                cur.execute(profile_sql)
+                row = cur.fetchone()
+                profile = (row["n"], row["n_distinct"], row["low"], row["high"])
+            count, distinct = profile[0], profile[1]
+
+            if count == 0:
+                mode = "raw"
+            elif mode == "auto":
+                if count <= points:
+                    mode = "raw"
+                elif count > self.max_rows or distinct < count:
+                    mode = "bucket"
+                else:
+                    mode = "lttb"
+            elif mode in ("lttb", "minmax") and count > self.max_rows:
+                mode = "bucket"
+
+            note, unit = None, None
+            if mode == "bucket":
+                statement, unit = self._bucket_sql(sql_query, shape, profile, points, agg, x_is_date)
+                limit = points + 1
+            else:
+                statement = pgsql.SQL("SELECT * FROM {} WHERE q.{} IS NOT NULL ORDER BY q.{}").format(
+                    self._wrap(sql_query), x, x
+                )
+                limit = self.max_rows
+            statement = statement.as_string(conn)
+            with maybe_stage(timer, "sql_cost_check"):
+                limit, note, plan = check(conn, statement, limit)
+            with maybe_stage(timer, "db_execute"):
+                cur.execute(pgsql.SQL("SELECT * FROM ({}) AS s LIMIT {}").format(
+                    pgsql.SQL(statement), pgsql.Literal(limit)
+                ))
+            with maybe_stage(timer, "db_fetch"):
+                rows = cur.fetchall()
+
+        fetched = len(rows)
+        if mode in ("lttb", "minmax") and fetched > points:
+            with maybe_stage(timer, "downsample"):
+                y = shape["y"][0]
+                kept = [r for r in rows if r[y] is not None]
+                xs = [_number(r[shape["x"]]) for r in kept]
+                ys = [_number(r[y]) for r in kept]
+                reduce = lttb if mode == "lttb" else minmax
+                rows = [kept[i] for i in reduce(xs, ys, points)]
+
+        series = {
+            "mode": mode,
+            "x": shape["x"],
+            "y": shape["y"],
+            "points": len(rows),
+            "target_points": points,
+            "source_rows": count,
+            "bucket": unit if mode == "bucket" else None,
+            "agg": agg if mode == "bucket" else None,
+        }
+        return {"rows": rows, "series": series, "note": note, "plan": plan, "statement": statement,
+                "fetched": fetched}
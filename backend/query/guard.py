@@ -0,0 +1,190 @@
+"""
+SQL Guardrail und Cost Gate
+
+Bevor generiertes SQL ausgeführt wird:
+1. Parsen (sqlglot, Postgres-Dialekt) - nur ein einzelnes SELECT ist erlaubt,
+   keine datenverändernden CTEs, kein SELECT INTO, kein FOR UPDATE, keine
+   gefährlichen Server-Funktionen.
+2. Read-only Transaktion mit ``statement_timeout`` pro Request.
+3. ``EXPLAIN`` des tatsächlich ausgeführten (gelimiteten) Statements gegen ein
+   Cost-Budget; zu teure Queries werden mit kleinerem LIMIT erneut geschätzt
+   (Downgrade) oder abgelehnt.
+"""
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from psycopg2 import sql as pgsql
+
+from query.pagination import strip_statement
+
+# Funktionen, die auch in einer read-only Transaktion Schaden anrichten können
+DENIED_FUNCTIONS = re.compile(
+    r"^(pg_sleep.*|pg_terminate_backend|pg_cancel_backend|pg_reload_conf|pg_rotate_logfile|"
+    r"pg_read_file|pg_read_binary_file|pg_ls_dir|pg_stat_file|lo_.*|dblink.*|set_config|"
+    r"pg_advisory.*|pg_try_advisory.*|query_to_xml.*|pg_file_.*)$",
+    re.IGNORECASE,
+)
+FORBIDDEN_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter,
+    exp.Command, exp.Into, exp.Lock, exp.Set, exp.Transaction, exp.Commit, exp.Rollback,
+)
+
+
+class SQLRejected(Exception):
+    """Raised when generated SQL fails validation or exceeds the cost budget"""
+
+
+class QueryGuard:
+    """Validates generated SQL and enforces read-only, time and cost limits"""
+
+    def __init__(
+        self,
+        max_cost: float = 1_000_000.0,
+        max_rows: int = 100_000,
+        statement_timeout_ms: int = 15000,
+        downgrade_limit: Optional[int] = 1000,
+    ):
+        """
+        Args:
+            max_cost: Planner cost budget for the executed statement
+            max_rows: Maximum rows a single response may carry
+            statement_timeout_ms: ``statement_timeout`` for every request transaction
+            downgrade_limit: LIMIT to retry with when over budget (None = reject directly)
+        """
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.statement_timeout_ms = statement_timeout_ms
+        self.downgrade_limit = downgrade_limit
+
+        # Stats
+        self._validated = 0
+        self._rejected = 0
+        self._downgraded = 0
+
+    def validate(self, sql_query: str) -> str:
+        """
+        Parse and check a statement
+
+        Returns:
+            The statement without trailing semicolon
+
+        Raises:
+            SQLRejected: if it is not exactly one read-only SELECT
+        """
+        reason = self._rejection(sql_query)
+        if reason is not None:
+            self._rejected += 1
+            raise SQLRejected(f"Query rejected: {reason}")
+        self._validated += 1
+        return strip_statement(sql_query)
+
+    def is_valid(self, sql_query: str) -> bool:
+        """Same checks as ``validate`` without counting (e.g. to pick the first usable LLM answer)"""
+        return self._rejection(sql_query) is None
+
+    def _rejection(self, sql_query: str) -> Optional[str]:
+        try:
+            statements = [s for s in sqlglot.parse(sql_query, read="postgres") if s is not None]
+        except sqlglot.errors.ParseError as e:
+            return f"could not parse SQL ({str(e).splitlines()[0]})"
+
+        if len(statements) != 1:
+            return f"expected 1 statement, got {len(statements)}"
+
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            return f"only SELECT is allowed, got {tree.key.upper()}"
+
+        forbidden = tree.find(*FORBIDDEN_NODES)
+        if forbidden is not None:
+            return f"{forbidden.key.upper()} is not allowed"
+
+        for func in tree.find_all(exp.Anonymous):
+            if DENIED_FUNCTIONS.match(func.name):
+                return f"function {func.name}() is not allowed"
+        return None
+
+    def begin(self, conn):
+        """Start the request transaction as READ ONLY with a statement_timeout"""
+        with conn.cursor() as cur:
+            cur.execute(
+                "SET TRANSACTION READ ONLY; SET LOCAL statement_timeout = %s",
+                (self.statement_timeout_ms,),
+            )
+
+    @staticmethod
+    def limited(sql_query: str, limit: int) -> pgsql.Composable:
+        """Default shape of an executed statement: the query wrapped with ``limit``"""
+        return pgsql.SQL("SELECT * FROM ({}) AS q LIMIT {}").format(
+            pgsql.SQL(strip_statement(sql_query)), pgsql.Literal(limit)
+        )
+
+    def _estimate(self, cur, statement: pgsql.Composable) -> Tuple[float, int, Dict[str, Any]]:
+        cur.execute(pgsql.SQL("EXPLAIN (FORMAT JSON) {}").format(statement))
+        row = cur.fetchone()
+        plan = (list(row.values()) if isinstance(row, dict) else list(row))[0][0]["Plan"]
+        return float(plan["Total Cost"]), int(plan["Plan Rows"]), plan
+
+    def check_cost(
+        self,
+        conn,
+        sql_query: str,
+        limit: int,
+        max_rows: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        statement: Optional[Callable[[int], pgsql.Composable]] = None,
+    ) -> Tuple[int, Optional[str], Dict[str, Any]]:
+        """
+        EXPLAIN the statement as it will run
+
+        ``max_rows``/``max_cost`` override the budget for this call (e.g. bulk exports).
+        ``statement(limit)`` builds the executed statement for a row limit (default:
+        ``limited``); callers that sort or filter around the query (pagination) pass
+        theirs, so a sort under the LIMIT is costed instead of an early-stopping scan.
+
+        Returns:
+            (effective row limit, downgrade reason or None, top plan node)
+
+        Raises:
+            SQLRejected: if even the downgraded statement is over budget
+        """
+        max_rows = self.max_rows if max_rows is None else max_rows
+        max_cost = self.max_cost if max_cost is None else max_cost
+        statement = statement or (lambda limit: self.limited(sql_query, limit))
+        note = None
+        if limit > max_rows:
+            note = f"Query downgraded: row limit {limit} exceeds budget, LIMIT {max_rows} applied"
+            limit = max_rows
+
+        with conn.cursor() as cur:
+            cost, _, plan = self._estimate(cur, statement(limit))
+            if cost <= max_cost:
+                if note:
+                    self._downgraded += 1
+                return limit, note, plan
+
+            if self.downgrade_limit and self.downgrade_limit < limit:
+                downgraded_cost, _, plan = self._estimate(cur, statement(self.downgrade_limit))
+                if downgraded_cost <= max_cost:
+                    self._downgraded += 1
+                    return self.downgrade_limit, (
+                        f"Query downgraded: estimated cost {cost:.0f} exceeds budget "
+                        f"{max_cost:.0f}, LIMIT {self.downgrade_limit} applied"
+                    ), plan
+
+        self._rejected += 1
+        raise SQLRejected(
+            f"Query rejected: estimated cost {cost:.0f} exceeds budget {max_cost:.0f}"
+        )
+
+    def stats(self):
+        return {
+            "max_cost": self.max_cost,
+            "max_rows": self.max_rows,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "validated": self._validated,
+            "rejected": self._rejected,
+            "downgraded": self._downgraded,
+        }
@@ -0,0 +1,370 @@
+"""
+Index Advisor auf Basis des Workload Logs
+
+1. Jedes geloggte Statement wird mit sqlglot zerlegt: Gleichheits-, Bereichs-,
+   ORDER BY- und GROUP BY-Spalten pro Tabelle.
+2. Daraus entstehen Kandidaten (Gleichheit vor Bereich/Sortierung, max. 3 Spalten),
+   gewichtet mit der Laufzeit, die die betroffenen Statements verursacht haben.
+3. Nutzen wird per EXPLAIN mit vs. ohne Index geschätzt - mit HypoPG als
+   hypothetischer Index, optional (``transaction``) als echter Index in einer
+   Transaktion, die zurückgerollt wird.
+
+CLI::
+
+    python -m query.index_advisor --top 5
+    python -m query.index_advisor --emit migration.sql
+    python -m query.index_advisor --apply
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+EQUALITY = (exp.EQ, exp.In)
+RANGE = (exp.LT, exp.LTE, exp.GT, exp.GTE, exp.Between)
+METHODS = ("auto", "hypopg", "transaction", "none")
+
+EXISTING_INDEXES_SQL = """
+SELECT t.relname, array_agg(a.attname::text ORDER BY k.n)
+FROM pg_index i
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_namespace ns ON ns.oid = t.relnamespace
+CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, n)
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+WHERE ns.nspname = 'public' AND i.indpred IS NULL AND NOT 0 = ANY(i.indkey::int2[])
+GROUP BY i.indexrelid, t.relname
+"""
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    return f"idx_{table}_{'_'.join(columns)}"[:63]
+
+
+def index_ddl(table: str, columns: Tuple[str, ...], migration: bool = True) -> str:
+    """Migration form (named, CONCURRENTLY, IF NOT EXISTS) or the bare form for EXPLAIN tests"""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    if not migration:
+        return f"CREATE INDEX ON public.{table} ({cols})"
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(table, columns)} ON public.{table} ({cols})"
+
+
+def column_usage(sql: str, tables: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Indexable column references per table
+
+    Returns:
+        {table: {"eq": [...], "range": [...], "order": [...], "group": [...]}}
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except sqlglot.errors.ParseError:
+        return {}
+    if tree is None:
+        return {}
+
+    known = set(tables)
+    aliases = {}
+    for table in tree.find_all(exp.Table):
+        if table.name in known and table.db in ("", "public"):
+            aliases[table.alias_or_name] = table.name
+    if not aliases:
+        return {}
+    default = next(iter(aliases.values())) if len(set(aliases.values())) == 1 else None
+
+    usage: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+
+    def resolve(node) -> Optional[Tuple[str, str]]:
+        if not isinstance(node, exp.Column):
+            return None
+        table = aliases.get(node.table) if node.table else default
+        return (table, node.name) if table else None
+
+    def add(kind: str, node):
+        ref = resolve(node)
+        if ref and ref[1] not in usage[ref[0]][kind]:
+            usage[ref[0]][kind].append(ref[1])
+
+    for where in tree.find_all(exp.Where):
+        for predicate in where.find_all(*EQUALITY, *RANGE):
+            kind = "eq" if isinstance(predicate, EQUALITY) else "range"
+            add(kind, predicate.this)
+            if isinstance(predicate, exp.EQ):
+                add(kind, predicate.expression)
+
+    for order in tree.find_all(exp.Order):
+        for ordered in order.expressions:
+            add("order", ordered.this)
+    for group in tree.find_all(exp.Group):
+        for expression in group.expressions:
+            add("group", expression)
+
+    return {table: dict(kinds) for table, kinds in usage.items()}
+
+
+def candidates_for(usage: Dict[str, List[str]], max_columns: int = 3) -> List[Tuple[str, ...]]:
+    """Column lists worth trying for one statement on one table"""
+    eq = sorted(usage.get("eq", []))
+    trailing = usage.get("range", []) + usage.get("order", []) + usage.get("group", [])
+    result = []
+    if eq:
+        composite = list(eq[:max_columns])
+        for column in trailing:
+            if len(composite) >= max_columns:
+                break
+            if column not in composite:
+                composite.append(column)
+                break
+        result.append(tuple(composite))
+    for column in eq + usage.get("range", []) + usage.get("order", []):
+        if (column,) not in result:
+            result.append((column,))
+    return result
+
+
+class IndexAdvisor:
+    """Ranks index candidates for the logged workload"""
+
+    def __init__(
+        self,
+        tables: Iterable[str] = ("transactions", "budgets"),
+        method: str = "auto",
+        min_improvement: float = 0.05,
+        max_columns: int = 3,
+    ):
+        """
+        Args:
+            tables: Tables to recommend indexes for
+            method: auto (HypoPG if installed, else none), hypopg, transaction or none
+            min_improvement: Minimum relative cost reduction for an evaluated candidate
+            max_columns: Maximum columns per composite index
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        self.tables = tuple(tables)
+        self.method = method
+        self.min_improvement = min_improvement
+        self.max_columns = max_columns
+
+    def collect(self, statements: List[Dict[str, Any]]) -> Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]]:
+        """Aggregate candidates over the workload (weight = total ms of the statements)"""
+        candidates: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        for statement in statements:
+            for table, usage in column_usage(statement["sql"], self.tables).items():
+                for columns in candidates_for(usage, self.max_columns):
+                    entry = candidates.setdefault(
+                        (table, columns),
+                        {"table": table, "columns": columns, "statements": [], "workload_ms": 0.0, "calls": 0},
+                    )
+                    entry["statements"].append(statement)
+                    entry["workload_ms"] += statement["total_ms"]
+                    entry["calls"] += statement["calls"]
+        return candidates
+
+    @staticmethod
+    def existing_indexes(conn) -> List[Tuple[str, Tuple[str, ...]]]:
+        with conn.cursor() as cur:
+            cur.execute(EXISTING_INDEXES_SQL)
+            return [(row[0], tuple(row[1])) for row in cur.fetchall()]
+
+    @staticmethod
+    def _has_hypopg(conn) -> bool:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+            return cur.fetchone() is not None
+
+    @staticmethod
+    def _cost(cur, sql: str) -> Optional[float]:
+        """Planner cost, None if the statement cannot be planned (anymore)"""
+        cur.execute("SAVEPOINT advisor_explain")
+        try:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+            row = cur.fetchone()
+            plan = (list(row.values()) if isinstance(row, dict) else list(row))[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            cur.execute("RELEASE SAVEPOINT advisor_explain")
+            return float(plan[0]["Plan"]["Total Cost"])
+        except Exception:
+            cur.execute("ROLLBACK TO SAVEPOINT advisor_explain")
+            return None
+
+    def _evaluate(self, cur, method: str, candidate: Dict[str, Any], baseline: Dict[str, Optional[float]]):
+        """Fill est_cost_reduction / est_saved_ms by EXPLAINing with the index in place"""
+        table, columns = candidate["table"], candidate["columns"]
+        size = None
+        if method == "hypopg":
+            cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)", (index_ddl(table, columns, False),))
+            index_oid = cur.fetchone()[0]
+            cur.execute("SELECT hypopg_relation_size(%s)", (index_oid,))
+            size = int(cur.fetchone()[0])
+        else:
+            cur.execute("SAVEPOINT advisor_index")
+            cur.execute(index_ddl(table, columns, False))
+
+        before_total = after_total = saved = 0.0
+        try:
+            for statement in candidate["statements"]:
+                before = baseline.get(statement["fingerprint"])
+                after = self._cost(cur, statement["sql"]) if before else None
+                if not before or after is None:
+                    continue
+                before_total += before
+                after_total += min(after, before)
+                saved += statement["total_ms"] * (1 - min(after, before) / before)
+        finally:
+            if method == "hypopg":
+                cur.execute("SELECT hypopg_reset()")
+            else:
+                cur.execute("ROLLBACK TO SAVEPOINT advisor_index")
+
+        candidate["est_cost_reduction"] = round(1 - after_total / before_total, 4) if before_total else None
+        candidate["est_saved_ms"] = round(saved, 3)
+        candidate["size_bytes"] = size
+
+    def recommend(self, conn, statements: List[Dict[str, Any]], top: int = 10) -> List[Dict[str, Any]]:
+        """
+        Blocking: ranked recommendations for ``statements`` (WorkloadLog.statements())
+
+        The connection's transaction is left open - roll it back afterwards.
+        """
+        candidates = self.collect(statements)
+        existing = self.existing_indexes(conn)
+        for key in list(candidates):
+            table, columns = key
+            if any(t == table and cols[: len(columns)] == columns for t, cols in existing):
+                del candidates[key]  # schon durch einen bestehenden Index (Präfix) abgedeckt
+
+        method = self.method
+        if method == "auto":
+            method = "hypopg" if self._has_hypopg(conn) else "none"
+        elif method == "hypopg" and not self._has_hypopg(conn):
+            raise RuntimeError("HypoPG is not installed (CREATE EXTENSION hypopg)")
+
+        ranked = list(candidates.values())
+        if method != "none":
+            with conn.cursor() as cur:
+                baseline = {}
+                for statement in statements:
+                    baseline[statement["fingerprint"]] = self._cost(cur, statement["sql"])
+                for candidate in ranked:
+                    self._evaluate(cur, method, candidate, baseline)
+            ranked = [
+                c for c in ranked
+                if c["est_cost_reduction"] is not None and c["est_cost_reduction"] >= self.min_improvement
+            ]
+            ranked.sort(key=lambda c: (c["est_saved_ms"], c["workload_ms"]), reverse=True)
+        else:
+            ranked.sort(key=lambda c: (c["workload_ms"], len(c["columns"])), reverse=True)
+
+        result = []
+        for candidate in ranked:
+            # Präfix eines besser platzierten Kandidaten -> überflüssig
+            if any(
+                r["table"] == candidate["table"] and r["columns"][: len(candidate["columns"])] == candidate["columns"]
+                for r in result
+            ):
+                continue
+            result.append({
+                "table": candidate["table"],
+                "columns": list(candidate["columns"]),
+                "ddl": index_ddl(candidate["table"], candidate["columns"]) + ";",
+                "method": method,
+                "statements": len(candidate["statements"]),
+                "calls": candidate["calls"],
+                "workload_ms": round(candidate["workload_ms"], 3),
+                "est_cost_reduction": candidate.get("est_cost_reduction"),
+                "est_saved_ms": candidate.get("est_saved_ms"),
+                "size_bytes": candidate.get("size_bytes"),
+            })
+            if len(result) >= top:
+                break
+        return result
+
+
+def migration_sql(recommendations: List[Dict[str, Any]]) -> str:
+    """Migration file; CONCURRENTLY -> run without a wrapping transaction (no psql -1)"""
+    lines = ["-- Index recommendations generated from the workload log", ""]
+    for rec in recommendations:
+        detail = f"{rec['statements']} statements, {rec['calls']} calls, {rec['workload_ms']:.0f} ms total"
+        if rec["est_cost_reduction"] is not None:
+            detail += f", est. cost -{rec['est_cost_reduction'] * 100:.0f}%, ~{rec['est_saved_ms']:.0f} ms saved"
+        lines.append(f"-- {detail}")
+        lines.append(rec["ddl"])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import psycopg2
+    from dotenv import load_dotenv
+
+    from query.workload import WorkloadLog
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Recommend indexes for the logged SQL workload")
+    parser.add_argument("--workload", default=os.getenv("WORKLOAD_LOG_PATH", "workload.sqlite3"))
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--statements", type=int, default=500, help="Heaviest N statements to analyze")
+    parser.add_argument("--method", choices=METHODS, default="auto")
+    parser.add_argument("--tables", default="transactions,budgets")
+    parser.add_argument("--emit", metavar="FILE", help="Write a migration ('-' = stdout)")
+    parser.add_argument("--apply", action="store_true", help="Create the indexes (CONCURRENTLY)")
+    parser.add_argument("--json", action="store_true", help="Print recommendations as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error("DATABASE_URL is missing in .env (or pass --dsn)")
+    if not os.path.exists(args.workload):
+        parser.error(f"workload log {args.workload} not found - run the backend with WORKLOAD_LOG_PATH set")
+
+    workload = WorkloadLog(args.workload)
+    workload.open()
+    statements = workload.statements(args.statements)
+    workload.close()
+
+    advisor = IndexAdvisor(args.tables.split(","), method=args.method)
+    conn = psycopg2.connect(args.dsn)
+    try:
+        recommendations = advisor.recommend(conn, statements, args.top)
+        conn.rollback()
+
+        if args.json:
+            print(json.dumps(recommendations, indent=2))
+        else:
+            print(f"{len(statements)} statements analyzed, {len(recommendations)} recommendations")
+            for rec in recommendations:
+                gain = (
+                    f"-{rec['est_cost_reduction'] * 100:.0f}% cost, ~{rec['est_saved_ms']:.0f} ms saved"
+                    if rec["est_cost_reduction"] is not None
+                    else "not evaluated"
+                )
+                print(f"  {rec['ddl']}  [{rec['workload_ms']:.0f} ms workload, {gain}]")
+
+        if args.emit:
+            text = migration_sql(recommendations)
+            if args.emit == "-":
+                sys.stdout.write(text)
+            else:
+                with open(args.emit, "w", encoding="utf-8") as f:
+                    f.write(text)
+                print(f"Migration written to {args.emit}")
+
+        if args.apply:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for rec in recommendations:
+                    print(f"Applying: {rec['ddl']}")
+                    cur.execute(rec["ddl"])
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""
+Server-seitige Row Limits und Keyset Pagination
+
+Das generierte Statement wird als Subquery gewrappt, damit das LIMIT in der
+Datenbank greift statt nach dem Fetch. Für die Folgeseiten wird eine stabile
+Sortierung gebildet (ORDER BY des Statements + ``id`` als Tie-Breaker) und der
+Schlüssel der letzten Zeile in ein signiertes, opakes Continuation Token gepackt.
+Ohne eindeutigen Schlüssel (z.B. Aggregate ohne ``id``) fällt das Token auf
+OFFSET zurück.
+"""
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import re
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2 import sql as pgsql
+from psycopg2.extras import RealDictCursor
+
+from observability.metrics import maybe_stage
+
+
+class InvalidPageToken(Exception):
+    """Raised for tampered, malformed or foreign continuation tokens"""
+
+
+IDENTIFIER = re.compile(r'^(?:"?[A-Za-z_]\w*"?\.)?"?([A-Za-z_]\w*)"?$')
+ORDER_ITEM = re.compile(
+    r"^(?P<expr>.+?)(?:\s+(?P<dir>asc|desc))?(?P<nulls>\s+nulls\s+(?:first|last))?$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def strip_statement(sql_query: str) -> str:
+    return sql_query.strip().rstrip(";").strip()
+
+
+def _top_level_keywords(sql_query: str):
+    """Yield (position, keyword) of ORDER BY / LIMIT / OFFSET / FETCH / FOR at paren depth 0"""
+    depth = 0
+    i = 0
+    n = len(sql_query)
+    lowered = sql_query.lower()
+    while i < n:
+        ch = sql_query[i]
+        if ch in ("'", '"'):
+            end = sql_query.find(ch, i + 1)
+            while end != -1 and end + 1 < n and sql_query[end + 1] == ch:
+                end = sql_query.find(ch, end + 2)
+            i = n if end == -1 else end + 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0 and (i == 0 or not (sql_query[i - 1].isalnum() or sql_query[i - 1] == "_")):
+            for kw in ("order by", "limit", "offset", "fetch", "for"):
+                if lowered.startswith(kw, i):
+                    after = i + len(kw)
+                    if after == n or not (sql_query[after].isalnum() or sql_query[after] == "_"):
+                        yield i, kw
+                        i = after - 1
+                        break
+        i += 1
+
+
+def _split_top_level(text: str, sep: str = ",") -> List[str]:
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_order_by(sql_query: str) -> Optional[List[Tuple[str, str, bool]]]:
+    """
+    Top-level ORDER BY items of a statement
+
+    Returns:
+        List of (expression, "asc"|"desc", has_explicit_nulls) or None if there is no ORDER BY
+    """
+    keywords = list(_top_level_keywords(sql_query))
+    order_pos = [pos for pos, kw in keywords if kw == "order by"]
+    if not order_pos:
+        return None
+    start = order_pos[-1] + len("order by")
+    end = min([pos for pos, kw in keywords if pos > start] or [len(sql_query)])
+    items = []
+    for item in _split_top_level(sql_query[start:end]):
+        m = ORDER_ITEM.match(item)
+        items.append((m.group("expr").strip(), (m.group("dir") or "asc").lower(), bool(m.group("nulls"))))
+    return items
+
+
+def _token_value(value: Any) -> Any:
+    # Als untypisiertes Literal gesendet, castet Postgres es auf den Spaltentyp
+    if isinstance(value, (Decimal, uuid.UUID, datetime.date, datetime.datetime, datetime.time)):
+        return str(value)
+    return value
+
+
+class Paginator:
+    """Wraps statements with a DB-side LIMIT and issues signed continuation tokens"""
+
+    def __init__(self, secret: str, default_page_size: int = 500, max_page_size: int = 5000):
+        """
+        Args:
+            secret: HMAC key for continuation tokens
+            default_page_size: Rows per page when the client asks for none
+            max_page_size: Hard upper bound the client cannot exceed
+        """
+        self._secret = secret.encode("utf-8")
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
+
+    def page_size(self, requested: Optional[int]) -> int:
+        if not requested or requested < 1:
+            return self.default_page_size
+        return min(requested, self.max_page_size)
+
+    def encode_token(self, state: Dict[str, Any]) -> str:
+        body = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        sig = hmac.new(self._secret, body, hashlib.sha256).digest()[:16]
+        return base64.urlsafe_b64encode(sig + body).decode("ascii").rstrip("=")
+
+    def decode_token(self, token: str) -> Dict[str, Any]:
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            raise InvalidPageToken("Malformed page token")
+        sig, body = raw[:16], raw[16:]
+        expected = hmac.new(self._secret, body, hashlib.sha256).digest()[:16]
+        if not hmac.compare_digest(sig, expected):
+            raise InvalidPageToken("Invalid page token signature")
+        return json.loads(body)
+
+    def order_keys(self, sql_query: str, columns: List[str]) -> Optional[List[Tuple[str, str]]]:
+        """
+        Stable total ordering over the statement's output columns, or None
+        if keyset pagination is not possible (then OFFSET is used)
+        """
+        order = parse_order_by(sql_query) or []
+        keys: List[Tuple[str, str]] = []
+        for expr, direction, explicit_nulls in order:
+            if explicit_nulls:
+                return None
+            if expr.isdigit() and 0 < int(expr) <= len(columns):
+                name = columns[int(expr) - 1]
+            else:
+                m = IDENTIFIER.match(expr)
+                name = m.group(1).lower() if m else None
+            if name not in columns:
+                return None
+            keys.append((name, direction))
+        if "id" not in columns:
+            return None
+        if "id" not in [k for k, _ in keys]:
+            keys.append(("id", "asc"))
+        return keys
+
+    @staticmethod
+    def _same(col: str, value: Any):
+        if value is None:
+            return pgsql.SQL("q.{} IS NULL").format(pgsql.Identifier(col))
+        return pgsql.SQL("q.{} = {}").format(pgsql.Identifier(col), pgsql.Literal(value))
+
+    @staticmethod
+    def _after(col: str, direction: str, value: Any):
+        """Rows sorting strictly after ``value`` in this column, or None if there are none"""
+        ident = pgsql.Identifier(col)
+        if direction == "desc":
+            # DESC => NULLS FIRST: nach NULL kommen alle Nicht-NULL-Werte, danach keine NULLs mehr
+            if value is None:
+                return pgsql.SQL("q.{} IS NOT NULL").format(ident)
+            return pgsql.SQL("q.{} < {}").format(ident, pgsql.Literal(value))
+        # ASC => NULLS LAST: nach NULL kommt nichts mehr, nach einem Wert noch die NULLs
+        if value is None:
+            return None
+        return pgsql.SQL("(q.{0} > {1} OR q.{0} IS NULL)").format(ident, pgsql.Literal(value))
+
+    def _keyset_predicate(self, keys: List[Tuple[str, str]], last: List[Any]):
+        """(k1 after v1) OR (k1 = v1 AND k2 after v2) OR ... incl. default NULL placement"""
+        clauses = []
+        for i, (col, direction) in enumerate(keys):
+            after = self._after(col, direction, last[i])
+            if after is None:
+                continue
+            parts = [self._same(keys[j][0], last[j]) for j in range(i)] + [after]
+            clauses.append(pgsql.SQL("(") + pgsql.SQL(" AND ").join(parts) + pgsql.SQL(")"))
+        return pgsql.SQL(" OR ").join(clauses) if clauses else pgsql.SQL("false")
+
+    def page_statement(self, sql_query: str, page_size: int, state: Optional[Dict[str, Any]]):
+        """Build the wrapped, DB-limited statement for one page"""
+        inner = pgsql.SQL(strip_statement(sql_query))
+        limit = pgsql.Literal(page_size + 1)  # +1 um has_more ohne COUNT zu erkennen
+        keys = (state or {}).get("keys")
+        if keys:
+            order = pgsql.SQL(", ").join(
+                pgsql.SQL("q.{} {}").format(pgsql.Identifier(col), pgsql.SQL(direction.upper()))
+                for col, direction in keys
+            )
+            where = pgsql.SQL("")
+            if state.get("last") is not None:
+                where = pgsql.SQL(" WHERE ") + self._keyset_predicate(keys, state["last"])
+            return pgsql.SQL("SELECT * FROM ({}) AS q{} ORDER BY {} LIMIT {}").format(
+                inner, where, order, limit
+            )
+        return pgsql.SQL("SELECT * FROM ({}) AS q LIMIT {} OFFSET {}").format(
+            inner, limit, pgsql.Literal((state or {}).get("offset", 0))
+        )
+
+    def page_state(self, conn, sql_query: str, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Blocking: state of the first page (sort keys from the output columns), or ``state`` itself
+
+        Pass the result to ``page_statement`` (e.g. for the guard's cost check) and ``fetch_page``.
+        """
+        if state is not None:
+            return state
+        with conn.cursor() as cur:
+            # LIMIT 0 plant nur - liefert die Output-Spalten für die Sortierung
+            cur.execute(
+                pgsql.SQL("SELECT * FROM ({}) AS q LIMIT 0").format(pgsql.SQL(strip_statement(sql_query)))
+            )
+            columns = [d.name for d in cur.description]
+        keys = self.order_keys(sql_query, columns)
+        return {"sql": strip_statement(sql_query), "offset": 0, "keys": keys, "last": None}
+
+    def fetch_page(
+        self,
+        conn,
+        sql_query: str,
+        page_size: int,
+        state: Optional[Dict[str, Any]] = None,
+        timer=None,
+    ) -> Dict[str, Any]:
+        """
+        Blocking: fetch one page (runs on a pool worker thread)
+
+        ``timer`` (RequestTimer, optional) receives ``db_execute``/``db_fetch`` timings.
+
+        Returns:
+            Dict with ``rows``, ``has_more``, ``next_token`` and, on the first page,
+            ``total_rows_estimate`` (planner estimate, exact if everything fit)
+        """
+        state = self.page_state(conn, sql_query, state)
+        first_page = state["offset"] == 0 and state["last"] is None
+        total_estimate = None
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with maybe_stage(timer, "db_execute"):
+                cur.execute(self.page_statement(sql_query, page_size, state))
+            with maybe_stage(timer, "db_fetch"):
+                rows = cur.fetchall()
+
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+
+            if first_page:
+                if has_more:
+                    cur.execute(
+                        pgsql.SQL("EXPLAIN (FORMAT JSON) {}").format(
+                            pgsql.SQL(strip_statement(sql_query))
+                        )
+                    )
+                    plan = list(cur.fetchone().values())[0]
+                    total_estimate = int(plan[0]["Plan"]["Plan Rows"])
+                else:
+                    total_estimate = len(rows)
+
+        next_token = None
+        if has_more:
+            next_state = {
+                "sql": state["sql"],
+                "offset": state["offset"] + len(rows),
+                "keys": state["keys"],
+                "last": None,
+            }
+            if state["keys"]:
+                next_state["last"] = [_token_value(rows[-1][col]) for col, _ in state["keys"]]
+            next_token = self.encode_token(next_state)
+
+        return {
+            "rows": rows,
+            "has_more": has_more,
+            "next_token": next_token,
+            "total_rows_estimate": total_estimate,
+        }
@@ -0,0 +1,255 @@
+"""
+Workload Log für ausgeführtes SQL
+
+Aggregiert jedes ausgeführte Statement pro Fingerprint (SQL mit Literalen durch
+``?`` ersetzt): Aufrufe, Laufzeit, Zeilen und die Plan-Form aus dem EXPLAIN des
+Guards. Persistiert in SQLite, damit der Index Advisor
+(``python -m query.index_advisor``) den Workload auch offline auswerten kann.
+
+``record`` läuft auch auf dem Event Loop (Streaming, Exporte) und fasst deshalb
+nur den Speicher an: die Änderungen pro Fingerprint sammeln sich in einem
+Puffer, ein Flush-Thread schreibt sie alle ``flush_interval`` Sekunden in einer
+Transaktion.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize literals away so ``amount < -100`` and ``amount < -50`` share a key"""
+    text = STRING_LITERAL.sub("?", sql)
+    text = NUMBER_LITERAL.sub("?", text)
+    text = IN_LIST.sub("(?)", text)
+    text = re.sub(r"\s+", " ", text).strip().rstrip(";").strip().casefold()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_shape(plan: Optional[Dict[str, Any]]) -> Optional[str]:
+    """'Limit > Sort > Seq Scan on transactions' from an EXPLAIN (FORMAT JSON) plan node"""
+    if not plan:
+        return None
+    parts = []
+
+    def walk(node):
+        label = node.get("Node Type", "?")
+        if node.get("Relation Name"):
+            label += f" on {node['Relation Name']}"
+        if node.get("Index Name"):
+            label += f" using {node['Index Name']}"
+        parts.append(label)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan)
+    return " > ".join(parts)
+
+
+class WorkloadLog:
+    """Per-fingerprint execution stats, in memory + optional SQLite file"""
+
+    def __init__(self, path: Optional[str] = None, max_statements: int = 5000, flush_interval: float = 1.0):
+        """
+        Args:
+            path: SQLite file (None = memory only)
+            max_statements: Distinct fingerprints kept in memory
+            flush_interval: Seconds between writes of the buffered records to SQLite
+        """
+        self.path = path
+        self.max_statements = max_statements
+        self.flush_interval = flush_interval
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}  # Fingerprint -> noch nicht geschriebenes Delta
+        self._lock = threading.Lock()     # Speicher und Puffer
+        self._db_lock = threading.Lock()  # SQLite
+        self._db: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._recorded = 0
+        self._flushes = 0
+
+    def open(self):
+        if not self.path:
+            return
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS statements (
+                fingerprint TEXT PRIMARY KEY,
+                sql TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                total_ms REAL NOT NULL,
+                max_ms REAL NOT NULL,
+                rows INTEGER NOT NULL,
+                plan_shape TEXT,
+                plan_cost REAL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="workload-flush", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+            self._flusher = None
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # Puffer bleibt bis zum nächsten Versuch erhalten
+
+    def flush(self):
+        """Blocking: write the buffered records to SQLite (one transaction)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    """
+                    INSERT INTO statements
+                        (fingerprint, sql, calls, total_ms, max_ms, rows, plan_shape, plan_cost, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (fingerprint) DO UPDATE SET
+                        sql = excluded.sql,
+                        calls = calls + excluded.calls,
+                        total_ms = total_ms + excluded.total_ms,
+                        max_ms = MAX(max_ms, excluded.max_ms),
+                        rows = rows + excluded.rows,
+                        plan_shape = COALESCE(excluded.plan_shape, plan_shape),
+                        plan_cost = COALESCE(excluded.plan_cost, plan_cost),
+                        last_seen = excluded.last_seen
+                    """,
+                    [
+                        (key, d["sql"], d["calls"], d["total_ms"], d["max_ms"], d["rows"],
+                         d["plan_shape"], d["plan_cost"], d["first_seen"], d["last_seen"])
+                        for key, d in pending.items()
+                    ],
+                )
+                self._db.commit()
+        except sqlite3.Error:
+            with self._lock:
+                # Zurück in den Puffer, neuere Records derselben Fingerprints zusammenführen
+                for key, d in pending.items():
+                    self._merge(self._pending, key, d)
+            raise
+        self._flushes += 1
+
+    @staticmethod
+    def _merge(target: Dict[str, Dict[str, Any]], key: str, delta: Dict[str, Any]):
+        entry = target.get(key)
+        if entry is None:
+            target[key] = dict(delta)
+            return
+        entry["calls"] += delta["calls"]
+        entry["total_ms"] += delta["total_ms"]
+        entry["max_ms"] = max(entry["max_ms"], delta["max_ms"])
+        entry["rows"] += delta["rows"]
+        entry["first_seen"] = min(entry["first_seen"], delta["first_seen"])
+        if delta["last_seen"] >= entry["last_seen"]:
+            entry["sql"] = delta["sql"]
+            entry["last_seen"] = delta["last_seen"]
+            entry["plan_shape"] = delta["plan_shape"] or entry["plan_shape"]
+            entry["plan_cost"] = delta["plan_cost"] if delta["plan_cost"] is not None else entry["plan_cost"]
+
+    def record(self, sql: str, elapsed_ms: float, rows: int, plan: Optional[Dict[str, Any]] = None):
+        """Add one execution (memory only - safe on the event loop and in pool worker threads)"""
+        key = fingerprint(sql)
+        now = time.time()
+        shape = plan_shape(plan)
+        cost = float(plan["Total Cost"]) if plan and "Total Cost" in plan else None
+        with self._lock:
+            self._recorded += 1
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._memory[key] = {
+                    "fingerprint": key, "sql": sql, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "rows": 0, "plan_shape": None, "plan_cost": None, "first_seen": now,
+                }
+            entry["sql"] = sql
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows"] += rows
+            entry["plan_shape"] = shape or entry["plan_shape"]
+            entry["plan_cost"] = cost if cost is not None else entry["plan_cost"]
+            entry["last_seen"] = now
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_statements:
+                self._memory.popitem(last=False)
+
+            if self._db is not None:
+                self._merge(self._pending, key, {
+                    "sql": sql, "calls": 1, "total_ms": elapsed_ms, "max_ms": elapsed_ms, "rows": rows,
+                    "plan_shape": shape, "plan_cost": cost, "first_seen": now, "last_seen": now,
+                })
+
+    def statements(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Blocking: statements by total time spent, heaviest first"""
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                cur = self._db.execute(
+                    """
+                    SELECT fingerprint, sql, calls, total_ms, max_ms, rows, plan_shape, plan_cost,
+                           first_seen, last_seen
+                    FROM statements ORDER BY total_ms DESC LIMIT ?
+                    """,
+                    (limit,),
+                )
+                columns = [d[0] for d in cur.description]
+                entries = [dict(zip(columns, row)) for row in cur.fetchall()]
+        else:
+            with self._lock:
+                entries = sorted(
+                    (dict(e) for e in self._memory.values()), key=lambda e: e["total_ms"], reverse=True
+                )[:limit]
+        for entry in entries:
+            entry["avg_ms"] = round(entry["total_ms"] / entry["calls"], 3) if entry["calls"] else 0.0
+        return entries
+
+    def purge(self) -> int:
+        with self._lock:
+            removed = len(self._memory)
+            self._memory.clear()
+            self._pending.clear()
+        if self._db is not None:
+            with self._db_lock:
+                cur = self._db.execute("DELETE FROM statements")
+                self._db.commit()
+            removed = max(removed, cur.rowcount)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "statements": len(self._memory),
+            "max_statements": self.max_statements,
+            "persistent": self._db is not None,
+            "recorded_total": self._recorded,
+            "pending_statements": len(self._pending),
+            "flushes_total": self._flushes,
+        }
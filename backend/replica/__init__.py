@@ -0,0 +1,3 @@
+"""
+Replica Package - spaltenorientierte Lese-Replik (DuckDB)
+"""
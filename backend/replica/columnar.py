@@ -0,0 +1,499 @@
+"""
+Spaltenorientierte Lese-Replik der Analyse-Tabellen (DuckDB)
+
+Eine lokale DuckDB-Datei hält eine Kopie von ``public.transactions`` und
+``public.budgets``. Sie überlebt Neustarts, danach wird nur noch das Delta
+nachgezogen.
+
+Sync: ``COPY (SELECT ...) TO STDOUT (FORMAT csv)`` aus Postgres in eine
+Temp-Datei, dann ``INSERT OR REPLACE ... FROM read_csv(...)`` in DuckDB.
+Tabellen mit den Change-Capture-Triggern aus database/replica.sql laden
+inkrementell: der Sync entnimmt die Schlüssel aus ``replica_changes`` (in
+Commit-Reihenfolge sichtbar, auch für lange Transaktionen), kopiert deren
+aktuelle Zeilen und löscht in DuckDB die, die es in Postgres nicht mehr gibt -
+Inserts, Updates und Deletes. Die Entnahme wird erst nach dem DuckDB-Commit
+committet; ein abgebrochener Sync wiederholt sie beim nächsten Mal. Tabellen
+ohne Trigger oder Primärschlüssel werden bei jedem Sync komplett ersetzt.
+
+Routing: Validiertes SQL, das nur replizierte Tabellen liest, wird mit sqlglot
+nach DuckDB übersetzt und dort ausgeführt, solange der letzte Sync nicht älter
+als ``max_staleness`` ist. Sonst, oder wenn DuckDB das Statement nicht
+ausführen kann, läuft es wie bisher auf Postgres.
+
+DuckDB ist optional (``pip install duckdb pytz``); ohne das Paket bleibt die
+Replik aus.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import sqlglot
+from sqlglot import exp
+from psycopg2 import sql as pgsql
+
+from observability.logger import get_logger
+from observability.metrics import maybe_stage
+from query.pagination import strip_statement
+
+try:
+    import duckdb
+except ImportError:  # optional
+    duckdb = None
+
+log = get_logger("replica")
+
+COLUMNS_SQL = """
+SELECT column_name::text, data_type::text, numeric_precision, numeric_scale
+FROM information_schema.columns
+WHERE table_schema = 'public' AND table_name = %s
+ORDER BY ordinal_position
+"""
+PRIMARY_KEY_SQL = """
+SELECT a.attname::text
+FROM pg_index i
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey::int2[])
+WHERE i.indrelid = to_regclass(%s) AND i.indisprimary
+ORDER BY array_position(i.indkey::int2[], a.attnum)
+"""
+# Alle drei Capture-Trigger (INSERT/UPDATE/DELETE) aus database/replica.sql vorhanden?
+CAPTURE_SQL = """
+SELECT to_regclass('public.replica_changes') IS NOT NULL AND (
+    SELECT count(*) = 3 FROM pg_trigger
+    WHERE tgrelid = to_regclass(%s) AND tgfoid = to_regproc('public.replica_capture')
+)
+"""
+# Parameter: Pfad, {Spalte: Typ}
+READ_CSV = (
+    "SELECT * FROM read_csv(?, header = true, columns = ?, "
+    "nullstr = '\\N', quote = '\"', escape = '\"', auto_detect = false)"
+)
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS replica_state (
+    name VARCHAR PRIMARY KEY,
+    watermark VARCHAR,        -- Postgres now() des letzten Syncs (Text, zurück als Parameter)
+    synced_until DOUBLE,      -- dasselbe als Epoch für die Freshness-Prüfung
+    signature VARCHAR         -- Spalten + Typen; ändert sich das Schema -> Rebuild
+)
+"""
+
+PG_TO_DUCKDB = {
+    "uuid": "UUID",
+    "text": "VARCHAR",
+    "character varying": "VARCHAR",
+    "character": "VARCHAR",
+    "date": "DATE",
+    "timestamp with time zone": "TIMESTAMPTZ",
+    "timestamp without time zone": "TIMESTAMP",
+    "time without time zone": "TIME",
+    "interval": "INTERVAL",
+    "smallint": "SMALLINT",
+    "integer": "INTEGER",
+    "bigint": "BIGINT",
+    "real": "REAL",
+    "double precision": "DOUBLE",
+    "boolean": "BOOLEAN",
+}
+
+
+class ReplicaTimeout(Exception):
+    """Raised when a replica query exceeds the statement timeout"""
+
+
+def duckdb_type(data_type: str, precision: Optional[int], scale: Optional[int]) -> str:
+    """Postgres information_schema type -> DuckDB column type (unknown types as VARCHAR)"""
+    if data_type == "numeric":
+        # DuckDB-DECIMAL geht bis 38 Stellen, unbeschränktes NUMERIC -> DOUBLE
+        return f"DECIMAL({precision},{scale or 0})" if precision and precision <= 38 else "DOUBLE"
+    return PG_TO_DUCKDB.get(data_type, "VARCHAR")
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ColumnarReplica:
+    """Local DuckDB copy of the analytics tables, synced from Postgres and used for reads"""
+
+    def __init__(
+        self,
+        pool,
+        path: Optional[str] = "replica.duckdb",
+        tables: Sequence[str] = ("transactions", "budgets"),
+        max_staleness: float = 300.0,
+        threads: int = 4,
+        statement_timeout_ms: int = 15000,
+    ):
+        """
+        Args:
+            pool: DatabasePool (source of the sync)
+            path: DuckDB file (None = in-memory, full copy after every restart)
+            tables: Tables in ``public`` to replicate
+            max_staleness: Route to the replica only if its last sync is at most this old
+            threads: Worker threads for replica queries
+            statement_timeout_ms: Interrupt replica queries after this long (0 = never)
+        """
+        self.pool = pool
+        self.path = path
+        self.tables = [t.strip() for t in tables if t.strip()]
+        self.max_staleness = max_staleness
+        self.threads = max(1, threads)
+        self.statement_timeout_ms = statement_timeout_ms
+        self.available = False
+
+        self._db = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sync_lock = threading.Lock()
+        self._replicated: Dict[str, float] = {}  # table -> synced_until
+        self._translated: Dict[str, Optional[str]] = {}
+
+        # Stats
+        self._syncs = 0
+        self._sync_failures = 0
+        self._last_sync_ms: Optional[float] = None
+        self._last_sync_rows: Optional[Dict[str, int]] = None
+        self._routed = 0
+        self._stale = 0
+        self._ineligible = 0
+        self._fallbacks = 0
+        self._last_fallback: Optional[str] = None
+
+    async def open(self):
+        """Open (or create) the DuckDB file; routing starts once every table is synced"""
+        if duckdb is None:
+            log.info("duckdb is not installed - columnar replica disabled")
+            return
+        try:
+            self._db = duckdb.connect(self.path or ":memory:")
+            self._db.execute(STATE_DDL)
+            for name, synced_until in self._db.execute(
+                "SELECT name, synced_until FROM replica_state"
+            ).fetchall():
+                if name in self.tables:
+                    self._replicated[name] = synced_until
+        except duckdb.Error as e:
+            log.warning(f"Columnar replica unavailable: {e}")
+            self._db = None
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="replica")
+        self.available = True
+        log.info(
+            f"Columnar replica at {self.path or ':memory:'} "
+            f"({len(self._replicated)}/{len(self.tables)} tables from a previous run)"
+        )
+
+    async def close(self):
+        self.available = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def run(self, fn, *args) -> Any:
+        """Run a blocking callable on the replica's worker threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # --- Sync ---------------------------------------------------------------
+
+    def sync(self, conn, full: bool = False) -> Dict[str, Any]:
+        """
+        Blocking: apply the captured changes of every table (``full`` = rebuild all)
+
+        Returns:
+            Dict with rows copied per table and the new ``synced_until``
+        """
+        if self._db is None:
+            raise RuntimeError("Columnar replica is not open")
+        started = time.perf_counter()
+        copied: Dict[str, int] = {}
+        with self._sync_lock:
+            try:
+                with conn.cursor() as cur:
+                    # Nur für diese (lesende) Transaktion: eindeutige Text-Formate für den CSV-Export
+                    cur.execute("SET LOCAL TimeZone = 'UTC'")
+                    cur.execute("SET LOCAL DateStyle = 'ISO, YMD'")
+                    cur.execute("SELECT now()::text, extract(epoch FROM now())::float8")
+                    watermark, synced_until = cur.fetchone()
+                    for table in self.tables:
+                        copied[table] = self._sync_table(cur, table, watermark, synced_until, full)
+                conn.commit()  # erst jetzt sind die entnommenen Änderungen weg
+            except Exception:
+                conn.rollback()
+                self._sync_failures += 1
+                raise
+
+        self._syncs += 1
+        self._last_sync_rows = copied
+        self._last_sync_ms = round((time.perf_counter() - started) * 1000, 3)
+        return {"rows": copied, "synced_until": synced_until, "full": full}
+
+    async def sync_async(self, full: bool = False) -> Dict[str, Any]:
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self.sync, conn, full)
+
+    def _pg_schema(self, cur, table: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        cur.execute(COLUMNS_SQL, (table,))
+        columns = [(name, duckdb_type(dtype, precision, scale)) for name, dtype, precision, scale in cur.fetchall()]
+        if not columns:
+            raise RuntimeError(f"Table public.{table} not found")
+        cur.execute(PRIMARY_KEY_SQL, (f"public.{table}",))
+        return columns, [row[0] for row in cur.fetchall()]
+
+    def _sync_table(self, cur, table: str, watermark: str, synced_until: float, full: bool) -> int:
+        columns, key = self._pg_schema(cur, table)
+        names = [name for name, _ in columns]
+        signature = ", ".join(f"{_ident(name)} {dtype}" for name, dtype in columns)
+        if key:
+            signature += f", PRIMARY KEY ({', '.join(_ident(k) for k in key)})"
+        captured = False
+        if key:
+            cur.execute(CAPTURE_SQL, (f"public.{table}",))
+            captured = bool(cur.fetchone()[0])
+
+        state = self._db.execute(
+            "SELECT watermark, signature FROM replica_state WHERE name = ?", [table]
+        ).fetchone()
+        rebuild = full or state is None or state[1] != signature
+        incremental = captured and not rebuild
+
+        source = pgsql.Identifier("public", table)
+        select = pgsql.SQL("SELECT {} FROM {} t").format(
+            pgsql.SQL(", ").join(pgsql.Identifier("t", n) for n in names), source
+        )
+        gone = None
+        if captured:
+            # Entnehmen (DELETE ... RETURNING) statt lesen: was danach committet, bleibt für den nächsten Sync
+            taken = pgsql.SQL("DELETE FROM public.replica_changes WHERE table_name = {} RETURNING key").format(
+                pgsql.Literal(table)
+            )
+            if incremental:
+                key_list = pgsql.SQL(", ").join(pgsql.Identifier(k) for k in key)
+                cur.execute(pgsql.SQL(
+                    "CREATE TEMP TABLE replica_keys ON COMMIT DROP AS WITH taken AS ({}) "
+                    "SELECT DISTINCT {} FROM taken, jsonb_populate_record(NULL::{}, taken.key) AS k"
+                ).format(taken, pgsql.SQL(", ").join(pgsql.Identifier("k", k) for k in key), source))
+                # Aktuelle Version jeder geänderten Zeile; was fehlt, wurde gelöscht
+                select = pgsql.SQL("{} JOIN replica_keys USING ({})").format(select, key_list)
+                gone = pgsql.SQL("SELECT {} FROM replica_keys k WHERE NOT EXISTS (SELECT 1 FROM {} t WHERE {})").format(
+                    pgsql.SQL(", ").join(pgsql.Identifier("k", k) for k in key), source,
+                    pgsql.SQL(" AND ").join(
+                        pgsql.SQL("t.{0} = k.{0}").format(pgsql.Identifier(k)) for k in key
+                    ),
+                )
+            else:
+                cur.execute(taken)  # Vollkopie enthält alle erfassten Änderungen
+
+        files = []
+        db = self._db.cursor()
+        try:
+            path = self._export(cur, table, select)
+            files.append(path)
+            if gone is not None:
+                files.append(self._export(cur, table, gone))
+            db.execute("BEGIN TRANSACTION")
+            try:
+                if rebuild:
+                    # Neu anlegen statt DELETE + INSERT: DuckDB prüft Primärschlüssel pro Transaktion
+                    db.execute(f"DROP TABLE IF EXISTS {_ident(table)}")
+                    db.execute(f"CREATE TABLE {_ident(table)} ({signature})")
+                elif not incremental:
+                    db.execute(f"DELETE FROM {_ident(table)}")
+                if gone is not None:
+                    key_columns = {k: dict(columns)[k] for k in key}
+                    match = " AND ".join(f"{_ident(table)}.{_ident(k)} = g.{_ident(k)}" for k in key)
+                    db.execute(
+                        f"DELETE FROM {_ident(table)} USING ({READ_CSV}) AS g WHERE {match}",
+                        [files[1], key_columns],
+                    )
+                verb = "INSERT OR REPLACE INTO" if key else "INSERT INTO"
+                rows = db.execute(
+                    f"{verb} {_ident(table)} {READ_CSV}", [path, dict(columns)]
+                ).fetchone()[0]
+                db.execute(
+                    "INSERT OR REPLACE INTO replica_state VALUES (?, ?, ?, ?)",
+                    [table, watermark, synced_until, signature],
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        finally:
+            db.close()
+            for name in files:
+                os.unlink(name)
+        if incremental:
+            cur.execute("DROP TABLE replica_keys")
+
+        self._replicated[table] = synced_until
+        return int(rows)
+
+    @staticmethod
+    def _export(cur, table: str, select: pgsql.Composable) -> str:
+        """COPY ``select`` into a temp CSV file; returns its path"""
+        copy = pgsql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')").format(select)
+        fd, path = tempfile.mkstemp(prefix=f"replica_{table}_", suffix=".csv")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                cur.copy_expert(copy.as_string(cur), f)
+        except Exception:
+            os.unlink(path)
+            raise
+        return path
+
+    # --- Routing ------------------------------------------------------------
+
+    def staleness(self) -> Optional[float]:
+        """Seconds since the oldest table's last sync (None = not fully synced yet)"""
+        if not self.available or any(t not in self._replicated for t in self.tables):
+            return None
+        return max(0.0, time.time() - min(self._replicated[t] for t in self.tables))
+
+    def route(self, sql_query: str, state: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        DuckDB statement for a validated Postgres statement, or None (-> run on Postgres)
+
+        Keyset page tokens stay on Postgres; OFFSET tokens can continue on either side.
+        """
+        if not self.available:
+            return None
+        if state is not None and state.get("keys"):
+            self._ineligible += 1
+            return None
+        staleness = self.staleness()
+        if staleness is None or staleness > self.max_staleness:
+            self._stale += 1
+            return None
+        if sql_query not in self._translated:
+            if len(self._translated) >= 1024:
+                self._translated.clear()
+            self._translated[sql_query] = self._translate(sql_query)
+        translated = self._translated[sql_query]
+        if translated is None:
+            self._ineligible += 1
+        else:
+            self._routed += 1
+        return translated
+
+    def _translate(self, sql_query: str) -> Optional[str]:
+        """Postgres -> DuckDB SQL if it only reads replicated tables"""
+        try:
+            tree = sqlglot.parse_one(sql_query, read="postgres")
+        except sqlglot.errors.ParseError:
+            return None
+        ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        tables = list(tree.find_all(exp.Table))
+        if not tables:
+            return None
+        for table in tables:
+            name = table.name.lower()
+            if not table.db and name in ctes:
+                continue
+            if table.catalog or (table.db and table.db.lower() != "public") or name not in self.tables:
+                return None
+            # Die Replik legt alles im Default-Schema ab
+            table.set("db", None)
+        try:
+            return tree.sql(dialect="duckdb")
+        except sqlglot.errors.SqlglotError:
+            return None
+
+    def record_fallback(self, error: Exception):
+        """A routed statement failed on DuckDB and is retried on Postgres"""
+        self._fallbacks += 1
+        self._last_fallback = str(error).splitlines()[0] if str(error) else type(error).__name__
+        log.warning(f"Replica query failed, falling back to Postgres: {self._last_fallback}")
+
+    def fetch_page(
+        self,
+        duck_sql: str,
+        page_size: int,
+        offset: int = 0,
+        timer=None,
+        order_keys: Optional[Callable[[List[str]], Optional[List[Tuple[str, str]]]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Blocking: one OFFSET page from DuckDB (runs on a replica worker thread)
+
+        ``order_keys(columns)`` (e.g. ``Paginator.order_keys``) may return a total
+        ordering; pages are then sorted by it so OFFSET pages don't overlap on ties.
+
+        Returns:
+            Dict with ``rows`` (dicts), ``has_more`` and, on the first page, the exact
+            ``total_rows`` (a columnar count is cheap)
+
+        Raises:
+            ReplicaTimeout: if the statement exceeded ``statement_timeout_ms``
+        """
+        inner = strip_statement(duck_sql)
+        cur = self._db.cursor()
+        interrupted = threading.Event()
+
+        def interrupt():
+            interrupted.set()
+            cur.interrupt()
+
+        watchdog = None
+        if self.statement_timeout_ms:
+            watchdog = threading.Timer(self.statement_timeout_ms / 1000, interrupt)
+            watchdog.start()
+        try:
+            with maybe_stage(timer, "db_execute"):
+                order = ""
+                if order_keys is not None:
+                    cur.execute(f"SELECT * FROM ({inner}) AS q LIMIT 0")
+                    keys = order_keys([d[0] for d in cur.description])
+                    if keys:
+                        # NULL-Platzierung wie in Postgres (DESC -> NULLS FIRST)
+                        order = " ORDER BY " + ", ".join(
+                            f"q.{_ident(col)} {'DESC NULLS FIRST' if direction == 'desc' else 'ASC NULLS LAST'}"
+                            for col, direction in keys
+                        )
+                cur.execute(f"SELECT * FROM ({inner}) AS q{order} LIMIT {int(page_size) + 1} OFFSET {int(offset)}")
+            with maybe_stage(timer, "db_fetch"):
+                raw = cur.fetchall()
+            columns = [d[0] for d in cur.description]
+            has_more = len(raw) > page_size
+            total = None
+            if offset == 0:
+                total = len(raw) if not has_more else cur.execute(f"SELECT count(*) FROM ({inner}) AS q").fetchone()[0]
+        except duckdb.Error as e:
+            if interrupted.is_set():
+                raise ReplicaTimeout(f"replica statement exceeded {self.statement_timeout_ms}ms")
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            cur.close()
+
+        return {
+            "rows": [dict(zip(columns, row)) for row in raw[:page_size]],
+            "has_more": has_more,
+            "total_rows": total,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        staleness = self.staleness()
+        return {
+            "available": self.available,
+            "path": self.path,
+            "tables": self.tables,
+            "synced_tables": sorted(self._replicated),
+            "staleness_seconds": round(staleness, 3) if staleness is not None else None,
+            "max_staleness_seconds": self.max_staleness,
+            "fresh": staleness is not None and staleness <= self.max_staleness,
+            "syncs": self._syncs,
+            "sync_failures": self._sync_failures,
+            "last_sync_ms": self._last_sync_ms,
+            "last_sync_rows": self._last_sync_rows,
+            "routed": self._routed,
+            "skipped_stale": self._stale,
+            "skipped_ineligible": self._ineligible,
+            "fallbacks": self._fallbacks,
+            "last_fallback": self._last_fallback,
+        }
@@ -0,0 +1,3 @@
+"""
+Rollups Package - vorberechnete Aggregate und Query Routing
+"""
@@ -0,0 +1,164 @@
+"""
+Inkrementeller Refresh der Rollup-Tabellen
+
+Ein Statement-Trigger auf ``public.transactions`` schreibt jeden Insert vorab
+aggregiert nach ``public.rollup_pending`` (database/rollups.sql). Der Refresh
+löscht die sichtbaren Pending-Zeilen, aggregiert sie pro Tag/Kategorie/Vorzeichen
+und addiert sie per Upsert auf ``transactions_daily`` und ``transactions_monthly``
+- alles in einer Transaktion. Pending-Zeilen werden erst mit dem Commit ihres
+Inserts sichtbar, eine lange laufende Transaktion geht also nicht verloren (ein
+Watermark auf ``created_at`` hätte sie übersprungen), und keine Zeile wird
+doppelt gezählt.
+
+Updates/Deletes auf Rohzeilen erfasst nur ein Full-Refresh
+(``refresh(conn, full=True)``).
+"""
+import time
+from typing import Any, Dict, Optional
+
+import psycopg2
+
+from observability.logger import get_logger
+
+log = get_logger("rollups")
+
+STATE_NAME = "transactions"
+
+DELTA_SQL = """
+CREATE TEMP TABLE rollup_delta ON COMMIT DROP AS
+WITH consumed AS (DELETE FROM public.rollup_pending RETURNING *)
+SELECT day, category, sign, sum(total) AS total, sum(tx_count) AS tx_count,
+       min(min_amount) AS min_amount, max(max_amount) AS max_amount
+FROM consumed
+GROUP BY 1, 2, 3
+"""
+# Full-Refresh: alles aus der Rohtabelle; TRUNCATE auf rollup_pending wartet auf
+# laufende Inserts und sperrt neue bis zum Commit, die landen danach wieder in Pending
+FULL_DELTA_SQL = """
+CREATE TEMP TABLE rollup_delta ON COMMIT DROP AS
+SELECT date AS day, category, sign(amount)::smallint AS sign,
+       sum(amount) AS total, count(*) AS tx_count,
+       min(amount) AS min_amount, max(amount) AS max_amount
+FROM public.transactions
+GROUP BY 1, 2, 3
+"""
+UPSERT_DAILY_SQL = """
+INSERT INTO public.transactions_daily AS r
+SELECT day, category, sign, total, tx_count, min_amount, max_amount FROM rollup_delta
+ON CONFLICT (day, category, sign) DO UPDATE SET
+    total = r.total + EXCLUDED.total,
+    tx_count = r.tx_count + EXCLUDED.tx_count,
+    min_amount = LEAST(r.min_amount, EXCLUDED.min_amount),
+    max_amount = GREATEST(r.max_amount, EXCLUDED.max_amount)
+"""
+UPSERT_MONTHLY_SQL = """
+INSERT INTO public.transactions_monthly AS r
+SELECT date_trunc('month', day)::date, category, sign,
+       sum(total), sum(tx_count), min(min_amount), max(max_amount)
+FROM rollup_delta
+GROUP BY 1, 2, 3
+ON CONFLICT (month, category, sign) DO UPDATE SET
+    total = r.total + EXCLUDED.total,
+    tx_count = r.tx_count + EXCLUDED.tx_count,
+    min_amount = LEAST(r.min_amount, EXCLUDED.min_amount),
+    max_amount = GREATEST(r.max_amount, EXCLUDED.max_amount)
+"""
+
+
+class RollupManager:
+    """Keeps the rollup tables in sync with ``public.transactions``"""
+
+    def __init__(self, pool):
+        """
+        Args:
+            pool: DatabasePool
+        """
+        self.pool = pool
+        self.available = False
+
+        # Stats
+        self._refreshed_at: Optional[str] = None
+        self._refreshes = 0
+        self._rows_total = 0
+        self._failures = 0
+        self._last_ms: Optional[float] = None
+        self._last_rows: Optional[int] = None
+
+    async def open(self):
+        """Enable routing only if database/rollups.sql has been applied"""
+        try:
+            async with self.pool.connection() as conn:
+                self.available = await self.pool.run(self._check, conn)
+        except Exception as e:
+            log.warning(f"Rollups unavailable: {e}")
+            self.available = False
+        if not self.available:
+            log.info("Rollup tables not found - aggregates run on the raw table")
+
+    def _check(self, conn) -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT to_regclass('public.rollup_state') IS NOT NULL "
+                "AND to_regclass('public.rollup_pending') IS NOT NULL"
+            )
+            return bool(cur.fetchone()[0])
+
+    def refresh(self, conn, full: bool = False) -> Dict[str, Any]:
+        """
+        Blocking: roll up new rows (``full`` = truncate + rebuild from scratch)
+
+        Returns:
+            Dict with ``rows`` (raw rows added), ``groups`` (delta groups) and ``refreshed_at``
+        """
+        started = time.perf_counter()
+        try:
+            with conn.cursor() as cur:
+                # Serialisiert gleichzeitige Refreshes
+                cur.execute(
+                    "SELECT 1 FROM public.rollup_state WHERE name = %s FOR UPDATE",
+                    (STATE_NAME,),
+                )
+                if cur.fetchone() is None:
+                    raise RuntimeError("rollup_state is missing its 'transactions' row")
+                if full:
+                    cur.execute(
+                        "TRUNCATE public.transactions_daily, public.transactions_monthly, public.rollup_pending"
+                    )
+                cur.execute(FULL_DELTA_SQL if full else DELTA_SQL)
+                cur.execute("SELECT count(*), coalesce(sum(tx_count), 0) FROM rollup_delta")
+                groups, rows = cur.fetchone()
+                if groups:
+                    cur.execute(UPSERT_DAILY_SQL)
+                    cur.execute(UPSERT_MONTHLY_SQL)
+                cur.execute(
+                    "UPDATE public.rollup_state SET refreshed_at = now() WHERE name = %s RETURNING refreshed_at",
+                    (STATE_NAME,),
+                )
+                refreshed_at = cur.fetchone()[0]
+            conn.commit()
+        except (psycopg2.Error, RuntimeError):
+            conn.rollback()
+            self._failures += 1
+            raise
+
+        self._refreshes += 1
+        self._rows_total += int(rows)
+        self._last_rows = int(rows)
+        self._last_ms = round((time.perf_counter() - started) * 1000, 3)
+        self._refreshed_at = str(refreshed_at)
+        return {"rows": int(rows), "groups": int(groups), "refreshed_at": self._refreshed_at, "full": full}
+
+    async def refresh_async(self, full: bool = False) -> Dict[str, Any]:
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self.refresh, conn, full)
+
+    def stats(self):
+        return {
+            "available": self.available,
+            "refreshed_at": self._refreshed_at,
+            "refreshes": self._refreshes,
+            "refresh_failures": self._failures,
+            "rows_rolled_up_total": self._rows_total,
+            "last_refresh_rows": self._last_rows,
+            "last_refresh_ms": self._last_ms,
+        }
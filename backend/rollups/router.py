@@ -0,0 +1,271 @@
+"""
+Query Routing auf Rollups
+
+Erkennt generierte Aggregate über ``public.transactions``, die sich aus den
+vorberechneten Tabellen beantworten lassen, und schreibt sie um:
+
+- erlaubte Spalten: ``category``, ``date``, ``amount``
+- ``amount`` nur in SUM/COUNT/AVG/MIN/MAX oder als Vorzeichen-Filter
+  (``amount < 0``, ``amount > 0`` ...) im WHERE
+- ``date`` beliebig -> ``transactions_daily``; nur Monats-/Jahres-Bucketing und
+  monatsgenaue Grenzen (``>= erster Tag``, ``< erster Tag``) -> ``transactions_monthly``
+
+Im ``exact`` Modus wird zusätzlich ``rollup_pending`` dazugenommen (Inserts,
+die der letzte Refresh noch nicht aufgerollt hat). Rollups und Pending liegen
+im selben Snapshot, das Ergebnis ist also identisch mit der Rohabfrage, solange
+nur eingefügt wird.
+"""
+import datetime
+from typing import Optional
+
+import sqlglot
+from sqlglot import exp
+
+ROLLUP_COLUMNS = {"category", "date", "amount"}
+# Spalten der Rollup-Quellen - ein Alias mit diesem Namen würde im GROUP BY umgedeutet
+SOURCE_COLUMNS = {"day", "month", "category", "sign", "total", "tx_count", "min_amount", "max_amount"}
+AGGREGATES = (exp.Sum, exp.Count, exp.Avg, exp.Min, exp.Max)
+COMPARISONS = (exp.LT, exp.LTE, exp.GT, exp.GTE, exp.EQ, exp.NEQ)
+MONTH_UNITS = {"MONTH", "QUARTER", "YEAR"}
+
+# Spaltenname, den Postgres einem Ausdruck ohne Alias gibt
+DEFAULT_NAMES = {
+    exp.Sum: "sum",
+    exp.Count: "count",
+    exp.Avg: "avg",
+    exp.Min: "min",
+    exp.Max: "max",
+    exp.TimestampTrunc: "date_trunc",
+    exp.DateTrunc: "date_trunc",
+    exp.Extract: "extract",
+    exp.TimeToStr: "to_char",
+    exp.Round: "round",
+    exp.Abs: "abs",
+    exp.Coalesce: "coalesce",
+}
+
+DAILY_SOURCE = """
+SELECT day, category, sign, total, tx_count, min_amount, max_amount
+FROM public.transactions_daily
+"""
+MONTHLY_SOURCE = """
+SELECT month, category, sign, total, tx_count, min_amount, max_amount
+FROM public.transactions_monthly
+"""
+# Zeilen, die der letzte Refresh noch nicht erfasst hat
+DAILY_DELTA = """
+SELECT day, category, sign, total, tx_count, min_amount, max_amount
+FROM public.rollup_pending
+"""
+MONTHLY_DELTA = """
+SELECT date_trunc('month', day)::date, category, sign, total, tx_count, min_amount, max_amount
+FROM public.rollup_pending
+"""
+
+
+def _is_zero(node: exp.Expression) -> bool:
+    return isinstance(node, exp.Literal) and not node.is_string and float(node.this) == 0
+
+
+def _date_literal(node: exp.Expression) -> Optional[datetime.date]:
+    if isinstance(node, exp.Cast):
+        node = node.this
+    if not (isinstance(node, exp.Literal) and node.is_string):
+        return None
+    try:
+        return datetime.date.fromisoformat(node.this)
+    except ValueError:
+        return None
+
+
+def _alias_refs(tree: exp.Select) -> set:
+    """ids of ORDER BY / GROUP BY columns that name an output alias, not an input column"""
+    aliases = {p.alias for p in tree.expressions if isinstance(p, exp.Alias)}
+    refs = set()
+    order, group = tree.args.get("order"), tree.args.get("group")
+    for column in tree.find_all(exp.Column):
+        if column.table or column.name not in aliases:
+            continue
+        if order is not None and isinstance(column.parent, exp.Ordered) and column.parent.parent is order:
+            refs.add(id(column))
+        elif group is not None and column.parent is group and column.name not in SOURCE_COLUMNS:
+            refs.add(id(column))
+    return refs
+
+
+def _default_name(node: exp.Expression) -> str:
+    if isinstance(node, exp.Cast):
+        return _default_name(node.this)
+    if isinstance(node, exp.Anonymous):
+        return node.name.lower()
+    return DEFAULT_NAMES.get(type(node), "?column?")
+
+
+class RollupRouter:
+    """Rewrites rollup-compatible aggregates to read from the rollup tables"""
+
+    def __init__(self, table: str = "transactions", exact: bool = True):
+        """
+        Args:
+            table: Raw table the rollups are built from
+            exact: Add the not-yet-rolled-up inserts from ``rollup_pending``
+        """
+        self.table = table
+        self.exact = exact
+
+        # Stats
+        self._routed_daily = 0
+        self._routed_monthly = 0
+        self._skipped = 0
+
+    def route(self, sql_query: str) -> Optional[str]:
+        """
+        Returns:
+            The rewritten statement, or None if it has to run on the raw table
+        """
+        try:
+            tree = sqlglot.parse_one(sql_query, read="postgres")
+        except sqlglot.errors.ParseError:
+            tree = None
+        granularity = self._granularity(tree) if tree is not None else None
+        if granularity is None:
+            self._skipped += 1
+            return None
+
+        self._rewrite(tree, granularity)
+        if granularity == "month":
+            self._routed_monthly += 1
+        else:
+            self._routed_daily += 1
+        return tree.sql(dialect="postgres")
+
+    def _granularity(self, tree: exp.Expression) -> Optional[str]:
+        """'month', 'day' or None (not routable)"""
+        if not isinstance(tree, exp.Select) or tree.args.get("with_") or tree.args.get("joins"):
+            return None
+        source = tree.args.get("from_")
+        if source is None or not isinstance(source.this, exp.Table):
+            return None
+        table = source.this
+        if table.name != self.table or table.db not in ("", "public"):
+            return None
+        if any(node is not tree for node in tree.find_all(exp.Select)):
+            return None  # Subqueries
+        if tree.find(exp.Window) or any(agg.find(exp.Distinct) for agg in tree.find_all(*AGGREGATES)):
+            return None
+        if not tree.args.get("group") and not any(tree.find_all(*AGGREGATES)):
+            return None  # Zeilenlisten brauchen die Rohdaten
+
+        qualifiers = {"", table.alias_or_name}
+        where = tree.args.get("where")
+        monthly = True
+
+        for star in tree.find_all(exp.Star):
+            if not isinstance(star.parent, exp.Count):
+                return None
+
+        alias_refs = _alias_refs(tree)
+        for column in tree.find_all(exp.Column):
+            if id(column) in alias_refs:
+                continue
+            if column.name not in ROLLUP_COLUMNS or column.table not in qualifiers:
+                return None
+            parent = column.parent
+
+            if column.name == "amount":
+                if isinstance(parent, AGGREGATES) and parent.this is column:
+                    continue
+                if (
+                    isinstance(parent, COMPARISONS)
+                    and parent.this is column
+                    and _is_zero(parent.expression)
+                    and where is not None
+                    and parent.find_ancestor(exp.Where) is where
+                    and parent.find_ancestor(*AGGREGATES) is None
+                ):
+                    continue
+                return None
+
+            if column.name == "date" and monthly:
+                monthly = self._month_compatible(column)
+
+        return "month" if monthly else "day"
+
+    @staticmethod
+    def _month_compatible(column: exp.Column) -> bool:
+        parent = column.parent
+        if isinstance(parent, (exp.TimestampTrunc, exp.DateTrunc)):
+            return parent.text("unit").upper() in MONTH_UNITS
+        if isinstance(parent, exp.Extract):
+            return parent.text("this").upper() in MONTH_UNITS
+        if isinstance(parent, (exp.GTE, exp.LT)) and parent.this is column:
+            bound = _date_literal(parent.expression)
+            return bound is not None and bound.day == 1
+        return False
+
+    def _rewrite(self, tree: exp.Select, granularity: str):
+        # Spaltennamen der Antwort wie bei der Rohabfrage
+        for projection in list(tree.expressions):
+            if isinstance(projection, exp.Alias):
+                continue
+            if isinstance(projection, exp.Column):
+                if projection.name != "date":
+                    continue
+                name = "date"
+            else:
+                name = _default_name(projection)
+            projection.replace(exp.alias_(projection.copy(), name, quoted=True))
+
+        alias_refs = _alias_refs(tree)
+
+        def transform(node):
+            if id(node) in alias_refs:
+                return node
+            if isinstance(node, exp.Count):
+                # SUM über keine Rollup-Zeile ist NULL, COUNT(*) über keine Rohzeile 0
+                return exp.cast(
+                    exp.Coalesce(this=exp.Sum(this=exp.column("tx_count")), expressions=[exp.Literal.number(0)]),
+                    "bigint",
+                )
+            if isinstance(node, exp.Avg):
+                return exp.Div(
+                    typed=True,
+                    this=exp.Sum(this=exp.column("total")),
+                    expression=exp.Nullif(
+                        this=exp.Sum(this=exp.column("tx_count")), expression=exp.Literal.number(0)
+                    ),
+                )
+            if (
+                isinstance(node, (exp.Sum, exp.Min, exp.Max))
+                and isinstance(node.this, exp.Column)
+                and node.this.name == "amount"
+            ):
+                target = {exp.Sum: "total", exp.Min: "min_amount", exp.Max: "max_amount"}[type(node)]
+                return node.__class__(this=exp.column(target, table=node.this.table or None))
+            if isinstance(node, exp.Column) and node.name == "amount":
+                return exp.column("sign", table=node.table or None)  # Vorzeichen-Filter
+            if isinstance(node, exp.Column) and node.name == "date":
+                return exp.column(granularity, table=node.table or None)
+            return node
+
+        tree.transform(transform, copy=False)
+
+        table = tree.args["from_"].this
+        alias = table.alias_or_name
+        if self.exact:
+            base, delta = (
+                (MONTHLY_SOURCE, MONTHLY_DELTA) if granularity == "month" else (DAILY_SOURCE, DAILY_DELTA)
+            )
+            source = sqlglot.parse_one(f"({base} UNION ALL {delta})", read="postgres")
+            table.replace(exp.Subquery(this=source.unnest(), alias=exp.TableAlias(this=exp.to_identifier(alias))))
+        else:
+            name = "transactions_monthly" if granularity == "month" else "transactions_daily"
+            table.replace(exp.to_table(f"public.{name}").as_(alias))
+
+    def stats(self):
+        return {
+            "exact": self.exact,
+            "routed_daily": self._routed_daily,
+            "routed_monthly": self._routed_monthly,
+            "skipped": self._skipped,
+        }
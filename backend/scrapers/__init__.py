@@ -0,0 +1,3 @@
+"""
+Scrapers Package - asynchrone Ingestion externer APIs nach Postgres
+"""
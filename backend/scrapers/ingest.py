@@ -0,0 +1,132 @@
+"""
+CLI der Ingestion-Pipeline
+
+    python -m scrapers.ingest                                  # alle Quellen -> DATABASE_URL
+    python -m scrapers.ingest --sources crypto --max-pages 4 --rate 0.5
+    python -m scrapers.ingest --stub --coins 50000 --fail-rate 0.05 --dry-run
+
+``--stub`` startet ``scrapers.stub_api`` in-process auf einem freien Port und
+leitet alle Quellen dorthin um. Ausgabe ist ein JSON-Report mit Zeilen,
+Records/s, Retries und Fehlern pro Quelle und Host.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+from scrapers.pipeline import Fetcher, IngestionPipeline, NullSink, PostgresSink
+from scrapers.sources import SOURCES
+
+
+def start_stub(args) -> tuple:
+    import uvicorn
+
+    from scrapers.stub_api import StubData, create_app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    data = StubData(args.coins, args.countries, args.latency_ms, args.fail_rate, args.throttle_rate)
+    server = uvicorn.Server(uvicorn.Config(create_app(data), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise SystemExit("API stub did not start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def run(args, root) -> dict:
+    from db.pool import DatabasePool
+
+    sources = [SOURCES[name](root=root, max_pages=args.max_pages, prefetch=args.prefetch) for name in args.sources]
+    fetcher = Fetcher(
+        rate_per_host=args.rate,
+        concurrency_per_host=args.concurrency,
+        retries=args.retries,
+        backoff=args.backoff,
+    )
+    pool = None
+    if args.dry_run:
+        sink = NullSink()
+    else:
+        pool = DatabasePool(args.dsn, min_size=1, max_size=args.writers)
+        await pool.open()
+        sink = PostgresSink(pool)
+
+    await fetcher.open()
+    try:
+        return await IngestionPipeline(
+            sources, sink, fetcher, batch_size=args.batch, writers=args.writers
+        ).run()
+    finally:
+        await fetcher.close()
+        if pool is not None:
+            await pool.close()
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Fetch external APIs concurrently and upsert into Postgres")
+    parser.add_argument("--sources", type=lambda v: v.split(","), default=list(SOURCES),
+                        help=f"Comma-separated, any of: {', '.join(SOURCES)}")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--dry-run", action="store_true", help="Fetch + transform only, write nothing")
+    parser.add_argument("--base-url", help="Send all sources to this root (scheme://host:port)")
+    parser.add_argument("--max-pages", type=int, help="Pages per paginated source")
+    parser.add_argument("--prefetch", type=int, default=4, help="Pages fetched ahead per paginated source")
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests/s per host (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight per host")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=0.5, help="First retry delay in seconds")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per upsert")
+    parser.add_argument("--writers", type=int, default=2, help="Concurrent upserts")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    stub = parser.add_argument_group("local stub")
+    stub.add_argument("--stub", action="store_true", help="Start scrapers.stub_api and ingest from it")
+    stub.add_argument("--coins", type=int, default=5000)
+    stub.add_argument("--countries", type=int, default=250)
+    stub.add_argument("--latency-ms", type=float, default=20.0)
+    stub.add_argument("--fail-rate", type=float, default=0.0)
+    stub.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.sources if name not in SOURCES]
+    if unknown:
+        parser.error(f"unknown sources: {', '.join(unknown)}")
+    if not args.dry_run and not args.dsn:
+        parser.error("pass --dsn (or DATABASE_URL) or --dry-run")
+
+    server = thread = None
+    root = args.base_url
+    if args.stub:
+        server, thread, root = start_stub(args)
+    try:
+        report = asyncio.run(run(args, root))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=5)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    errors = sum(len(s["errors"]) for s in report["sources"].values())
+    print(f"{report['rows']:,} rows in {report['seconds']}s ({report['records_per_sec']} records/s), "
+          f"{errors} errors", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+Asynchrone Ingestion-Pipeline für externe APIs
+
+Quellen (``Source``) liefern Seiten als async Iterator; mehrere Quellen laufen
+parallel, jede Seite geht durch die Transform-Schritte der Quelle und wird in
+Batches per Upsert (``INSERT ... ON CONFLICT DO UPDATE``) in Postgres
+geschrieben. Ein Fetcher pro Lauf teilt sich eine httpx-Verbindung und hält
+pro Host ein Rate-Limit (Token Bucket) und eine Obergrenze paralleler Requests
+ein; 429/5xx/Verbindungsfehler werden mit exponentiellem Backoff (plus Jitter,
+``Retry-After`` wird respektiert) wiederholt.
+
+Produzenten und Writer sind über eine begrenzte Queue entkoppelt: langsame
+Inserts bremsen das Fetchen, statt den Speicher zu füllen.
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence
+
+import httpx
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from observability.logger import get_logger
+
+log = get_logger("ingest")
+
+Step = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class IngestionError(Exception):
+    """Non-retryable fetch error or retries exhausted"""
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` requests/s with bursts up to ``burst``"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Fetcher:
+    """Shared HTTP client with per-host rate limits, concurrency caps and retries"""
+
+    def __init__(
+        self,
+        rate_per_host: float = 5.0,
+        burst: Optional[float] = None,
+        concurrency_per_host: int = 4,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 30.0,
+    ):
+        """
+        Args:
+            rate_per_host: Requests per second per host (0 = unlimited)
+            burst: Token bucket size (default: one second worth of requests)
+            concurrency_per_host: Requests in flight per host
+            retries: Retries after 429/5xx/transport errors
+            backoff: First retry delay in seconds, doubled per attempt (with jitter)
+            max_backoff: Upper bound of a single delay
+            timeout: Request timeout in seconds
+        """
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.concurrency_per_host = concurrency_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"requests": 0, "retries": 0, "failures": 0}
+        )
+
+    async def open(self):
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            headers={"User-Agent": "Data-Analytics-LLM/1.0"},
+            follow_redirects=True,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host(self, host: str):
+        if host not in self._limiters:
+            self._limiters[host] = RateLimiter(self.rate_per_host, self.burst)
+            self._slots[host] = asyncio.Semaphore(self.concurrency_per_host)
+        return self._limiters[host], self._slots[host]
+
+    def _delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass  # HTTP-Datum - dann normaler Backoff
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET ``url`` and decode JSON
+
+        Raises:
+            IngestionError: 4xx (except 429) or still failing after ``retries`` retries
+        """
+        if self._client is None:
+            await self.open()
+        host = httpx.URL(url).host
+        limiter, slots = self._host(host)
+        stats = self._stats[host]
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            await limiter.acquire()
+            async with slots:
+                stats["requests"] += 1
+                try:
+                    response = await self._client.get(url, params=params)
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        error = f"HTTP {response.status_code}"
+                        retry_after = response.headers.get("Retry-After")
+                    elif response.status_code >= 400:
+                        stats["failures"] += 1
+                        raise IngestionError(f"HTTP {response.status_code} from {response.url}")
+                    else:
+                        return response.json()
+
+            if attempt == self.retries:
+                stats["failures"] += 1
+                raise IngestionError(f"{url} failed after {attempt + 1} attempts: {error}")
+            stats["retries"] += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {host: dict(s) for host, s in self._stats.items()}
+
+
+class Source:
+    """
+    One external dataset -> one table
+
+    Subclasses set ``name``, ``table``, ``columns``, ``key``, ``ddl`` and the API location and implement
+    ``pages``; ``transform`` maps one raw record to a row (None = drop).
+    """
+
+    name = ""
+    table = ""
+    columns: Sequence[str] = ()
+    key: Sequence[str] = ("id",)
+    ddl = ""
+    default_root = ""
+    api_path = ""
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_pages: Optional[int] = None,
+        prefetch: int = 4,
+        steps: Sequence[Step] = (),
+    ):
+        """
+        Args:
+            root: Override scheme + host of the API (e.g. a local stub), ``api_path`` is appended
+            max_pages: Stop after this many pages (None = all)
+            prefetch: Pages of a paginated source fetched concurrently
+            steps: Extra transform steps applied after ``transform``
+        """
+        self.base_url = (root or self.default_root).rstrip("/") + self.api_path
+        self.max_pages = max_pages
+        self.prefetch = prefetch
+        self.steps: List[Step] = [self.transform, *steps]
+
+    def pages(self, fetcher: Fetcher) -> AsyncIterator[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def transform(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return record
+
+    def apply(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = []
+        for record in records:
+            for step in self.steps:
+                record = step(record)
+                if record is None:
+                    break
+            else:
+                rows.append(record)
+        return rows
+
+    async def numbered_pages(
+        self,
+        fetcher: Fetcher,
+        url: str,
+        params: Dict[str, Any],
+        per_page: int,
+        page_param: str = "page",
+        first: int = 1,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        ``?page=N`` pagination with ``prefetch`` pages fetched concurrently
+
+        Pages are yielded in order; a short or empty page ends the stream.
+        """
+        last = first + self.max_pages - 1 if self.max_pages else None
+        pending: Deque[asyncio.Task] = deque()
+        next_page = first
+
+        def schedule():
+            nonlocal next_page
+            if last is None or next_page <= last:
+                pending.append(asyncio.create_task(
+                    fetcher.get_json(url, {**params, page_param: next_page})
+                ))
+                next_page += 1
+
+        for _ in range(max(1, self.prefetch)):
+            schedule()
+        try:
+            while pending:
+                records = await pending.popleft()
+                if not records:
+                    return
+                yield records
+                if len(records) < per_page:
+                    return
+                schedule()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class PostgresSink:
+    """Idempotent batch upserts via ``execute_values`` on a DatabasePool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def prepare(self, sources: Sequence[Source]):
+        """Create the target tables if they don't exist"""
+        def create(conn):
+            with conn.cursor() as cur:
+                for source in sources:
+                    cur.execute(source.ddl)
+            conn.commit()
+
+        async with self.pool.connection() as conn:
+            await self.pool.run(create, conn)
+
+    @staticmethod
+    def upsert_sql(source: Source) -> sql.Composed:
+        updates = [c for c in source.columns if c not in source.key]
+        target = sql.SQL(", ").join(map(sql.Identifier, source.key))
+        if not updates:
+            action = sql.SQL("DO NOTHING")
+        else:
+            # Unveränderte Zeilen nicht neu schreiben (kein Dead Tuple, kein WAL)
+            action = sql.SQL("DO UPDATE SET ({cols}) = ROW({excluded}) WHERE ({current}) IS DISTINCT FROM ({excluded})").format(
+                cols=sql.SQL(", ").join(map(sql.Identifier, updates)),
+                excluded=sql.SQL(", ").join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(c)) for c in updates),
+                current=sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in updates),
+            )
+        return sql.SQL("INSERT INTO {table} AS t ({cols}) VALUES %s ON CONFLICT ({target}) {action}").format(
+            table=sql.Identifier("public", source.table),
+            cols=sql.SQL(", ").join(map(sql.Identifier, source.columns)),
+            target=target,
+            action=action,
+        )
+
+    def _write(self, conn, source: Source, rows: List[Dict[str, Any]]) -> int:
+        # ON CONFLICT darf dieselbe Zeile nicht zweimal pro Statement treffen -> letzte gewinnt
+        unique = {tuple(r.get(k) for k in source.key): r for r in rows}
+        values = [tuple(r.get(c) for c in source.columns) for r in unique.values()]
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, self.upsert_sql(source).as_string(cur), values, page_size=len(values))
+                written = cur.rowcount
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        return written
+
+    async def write(self, source: Source, rows: List[Dict[str, Any]]) -> int:
+        """Upsert ``rows``; returns the number of inserted or changed rows"""
+        async with self.pool.connection() as conn:
+            return await self.pool.run(self._write, conn, source, rows)
+
+
+class NullSink:
+    """Discards rows (``--dry-run``: measure fetching + transforms only)"""
+
+    async def prepare(self, sources: Sequence[Source]):
+        pass
+
+    async def write(self, source: Source, rows: List[Dict[str, Any]]) -> int:
+        return 0
+
+
+class IngestionPipeline:
+    """Runs all sources concurrently and streams their rows into the sink in batches"""
+
+    def __init__(
+        self,
+        sources: Sequence[Source],
+        sink,
+        fetcher: Fetcher,
+        batch_size: int = 1000,
+        writers: int = 2,
+        queue_size: int = 8,
+    ):
+        """
+        Args:
+            sources: Sources to ingest
+            sink: PostgresSink (or NullSink)
+            fetcher: Shared Fetcher (rate limits span all sources on the same host)
+            batch_size: Rows per upsert statement
+            writers: Concurrent upserts (pooled connections)
+            queue_size: Batches buffered between fetching and writing
+        """
+        self.sources = list(sources)
+        self.sink = sink
+        self.fetcher = fetcher
+        self.batch_size = max(1, batch_size)
+        self.writers = max(1, writers)
+        self.queue_size = queue_size
+        self.report: Dict[str, Dict[str, Any]] = {}
+
+    async def _produce(self, source: Source, queue: asyncio.Queue):
+        entry = self.report[source.name]
+        buffer: List[Dict[str, Any]] = []
+        try:
+            async for records in source.pages(self.fetcher):
+                entry["pages"] += 1
+                entry["fetched"] += len(records)
+                buffer.extend(source.apply(records))
+                while len(buffer) >= self.batch_size:
+                    await queue.put((source, buffer[: self.batch_size]))
+                    buffer = buffer[self.batch_size:]
+        except Exception as e:
+            entry["errors"].append(str(e))
+            log.warning(f"Source {source.name} failed: {e}")
+        if buffer:
+            await queue.put((source, buffer))
+        entry["fetch_seconds"] = round(time.perf_counter() - entry["_started"], 3)
+
+    async def _write(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            source, rows = item
+            entry = self.report[source.name]
+            try:
+                entry["written"] += await self.sink.write(source, rows)
+                entry["rows"] += len(rows)
+            except Exception as e:
+                entry["errors"].append(f"write: {e}")
+                log.warning(f"Writing {len(rows)} rows of {source.name} failed: {e}")
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Ingest everything once
+
+        Returns:
+            Per-source counts (pages, fetched, rows, written, errors) and records/s
+        """
+        started = time.perf_counter()
+        for source in self.sources:
+            self.report[source.name] = {
+                "table": source.table, "pages": 0, "fetched": 0, "rows": 0, "written": 0,
+                "errors": [], "_started": started,
+            }
+        await self.sink.prepare(self.sources)
+
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        writers = [asyncio.create_task(self._write(queue)) for _ in range(self.writers)]
+        try:
+            await asyncio.gather(*(self._produce(source, queue) for source in self.sources))
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+        finally:
+            for task in writers:
+                task.cancel()
+
+        seconds = time.perf_counter() - started
+        for entry in self.report.values():
+            entry.pop("_started")
+            entry["records_per_sec"] = round(entry["rows"] / seconds, 1) if seconds else None
+        rows = sum(e["rows"] for e in self.report.values())
+        return {
+            "seconds": round(seconds, 3),
+            "rows": rows,
+            "records_per_sec": round(rows / seconds, 1) if seconds else None,
+            "sources": self.report,
+            "hosts": self.fetcher.stats(),
+        }
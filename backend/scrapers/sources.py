@@ -0,0 +1,96 @@
+"""
+Quellen der Ingestion-Pipeline
+
+Portiert die beiden Beispiele aus ``_legacy/backend/scrapers/api_scraper.py``
+(CoinGecko, REST Countries) - jetzt vollständig paginiert statt nur der ersten
+Seite bzw. der ersten 50 Einträge, mit eigener Zieltabelle und Upsert-Key.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from scrapers.pipeline import Fetcher, Source
+
+
+class CryptoMarkets(Source):
+    """CoinGecko ``/coins/markets`` (EUR), latest snapshot per coin"""
+
+    name = "crypto"
+    table = "crypto_prices"
+    columns = ("id", "name", "symbol", "price_eur", "market_cap", "price_change_24h", "last_updated")
+    key = ("id",)
+    default_root = "https://api.coingecko.com"
+    api_path = "/api/v3"
+    ddl = """
+    CREATE TABLE IF NOT EXISTS public.crypto_prices (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        price_eur NUMERIC,
+        market_cap NUMERIC,
+        price_change_24h DOUBLE PRECISION,
+        last_updated TIMESTAMPTZ
+    )
+    """
+    per_page = 250  # Maximum der API
+
+    def pages(self, fetcher: Fetcher) -> AsyncIterator[List[Dict[str, Any]]]:
+        return self.numbered_pages(
+            fetcher,
+            f"{self.base_url}/coins/markets",
+            {"vs_currency": "eur", "order": "market_cap_desc", "per_page": self.per_page, "sparkline": "false"},
+            per_page=self.per_page,
+        )
+
+    def transform(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not record.get("id"):
+            return None
+        return {
+            "id": record["id"],
+            "name": record.get("name") or record["id"],
+            "symbol": (record.get("symbol") or "").upper(),
+            "price_eur": record.get("current_price"),
+            "market_cap": record.get("market_cap"),
+            "price_change_24h": record.get("price_change_percentage_24h"),
+            "last_updated": record.get("last_updated"),
+        }
+
+
+class Countries(Source):
+    """REST Countries ``/all`` - one response with every country"""
+
+    name = "countries"
+    table = "countries"
+    columns = ("code", "name", "capital", "population", "region", "area")
+    key = ("code",)
+    default_root = "https://restcountries.com"
+    api_path = "/v3.1"
+    ddl = """
+    CREATE TABLE IF NOT EXISTS public.countries (
+        code TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        capital TEXT,
+        population BIGINT,
+        region TEXT,
+        area DOUBLE PRECISION
+    )
+    """
+
+    async def pages(self, fetcher: Fetcher) -> AsyncIterator[List[Dict[str, Any]]]:
+        yield await fetcher.get_json(
+            f"{self.base_url}/all", {"fields": "cca3,name,capital,population,region,area"}
+        )
+
+    def transform(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not record.get("cca3"):
+            return None
+        capital = record.get("capital") or []
+        return {
+            "code": record["cca3"],
+            "name": (record.get("name") or {}).get("common", record["cca3"]),
+            "capital": capital[0] if capital else None,
+            "population": record.get("population"),
+            "region": record.get("region"),
+            "area": record.get("area"),
+        }
+
+
+SOURCES = {source.name: source for source in (CryptoMarkets, Countries)}
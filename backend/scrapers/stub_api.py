@@ -0,0 +1,102 @@
+"""
+Lokaler Stub für CoinGecko und REST Countries
+
+Liefert deterministische Fake-Daten in derselben Form wie die echten APIs,
+paginiert wie ``/coins/markets``, mit optionaler Latenz, zufälligen 503ern und
+429ern (mit ``Retry-After``) - so lassen sich Durchsatz, Rate-Limits und
+Retries der Pipeline ohne Netz testen.
+
+    python -m scrapers.stub_api --port 11600 --coins 20000 --fail-rate 0.05
+    python -m scrapers.ingest --base-url http://127.0.0.1:11600 --dry-run
+"""
+import argparse
+import asyncio
+import random
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+REGIONS = ("Africa", "Americas", "Asia", "Europe", "Oceania")
+
+
+class StubData:
+    """Synthetic datasets + failure injection"""
+
+    def __init__(self, coins: int = 5000, countries: int = 250, latency_ms: float = 20.0,
+                 fail_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 42):
+        self.coins = coins
+        self.countries = countries
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def coin(self, rank: int) -> dict:
+        price = round(50000 / rank, 6)
+        return {
+            "id": f"coin-{rank}",
+            "symbol": f"c{rank}",
+            "name": f"Coin {rank}",
+            "current_price": price,
+            "market_cap": round(price * 1_000_000 / rank, 2),
+            "market_cap_rank": rank,
+            "price_change_percentage_24h": round((rank * 7919 % 2000) / 100 - 10, 2),
+            "last_updated": "2024-01-01T00:00:00.000Z",
+        }
+
+    def country(self, i: int) -> dict:
+        code = "".join(chr(65 + (i // 26 ** k) % 26) for k in (2, 1, 0))
+        return {
+            "cca3": code,
+            "name": {"common": f"Country {code}", "official": f"Republic of {code}"},
+            "capital": [f"Capital {code}"] if i % 10 else [],
+            "population": (i * 104729) % 100_000_000,
+            "region": REGIONS[i % len(REGIONS)],
+            "area": float((i * 7907) % 1_000_000),
+        }
+
+    async def respond(self, body):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "0.1"})
+        if roll < self.throttle_rate + self.fail_rate:
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        return JSONResponse(body)
+
+
+def create_app(data: StubData) -> FastAPI:
+    app = FastAPI(title="Scraper API stub")
+
+    @app.get("/api/v3/coins/markets")
+    async def markets(page: int = Query(1, ge=1), per_page: int = Query(100, ge=1, le=250)):
+        first = (page - 1) * per_page + 1
+        last = min(data.coins, first + per_page - 1)
+        return await data.respond([data.coin(rank) for rank in range(first, last + 1)])
+
+    @app.get("/v3.1/all")
+    async def countries():
+        return await data.respond([data.country(i) for i in range(data.countries)])
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="CoinGecko / REST Countries stub with failure injection")
+    parser.add_argument("--port", type=int, default=11600)
+    parser.add_argument("--coins", type=int, default=5000)
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    args = parser.parse_args(argv)
+    data = StubData(args.coins, args.countries, args.latency_ms, args.fail_rate, args.throttle_rate)
+    uvicorn.run(create_app(data), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
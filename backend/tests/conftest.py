@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Module liegen direkt unter backend/ (wie beim Start von main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
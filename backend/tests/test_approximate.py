@@ -0,0 +1,94 @@
+import pytest
+import sqlglot
+
+from query.approximate import SampleApproximator
+
+
+@pytest.fixture
+def approximator():
+    return SampleApproximator(seed=7)
+
+
+def rewrite(approximator, sql_query, percent=1.5, rows=2000000):
+    analysis = approximator.analyze(sql_query)
+    assert analysis is not None
+    statement = approximator.rewrite(analysis, percent, rows)
+    sqlglot.parse_one(statement, read="postgres")  # muss gültiges SQL bleiben
+    return analysis, statement
+
+
+def test_count_star(approximator):
+    analysis, statement = rewrite(approximator, "SELECT COUNT(*) FROM transactions")
+    assert analysis.groups == []
+    assert analysis.margins == [("count_margin", "COUNT(*)")]
+    assert "FROM transactions TABLESAMPLE SYSTEM (1.5) REPEATABLE (7)" in statement
+    assert "true AS _keep" in statement
+    assert "blocks AS (SELECT _blk, count(*) AS _c0 FROM sample WHERE _keep GROUP BY 1)" in statement
+    assert 'CAST(ROUND(2000000 * (SUM(_c0) / (SELECT _n FROM clusters))) AS BIGINT) AS "count"' in statement
+    assert 'CASE WHEN COUNT(*) > 1 THEN 1.96 * 2000000 * ' in statement
+    assert statement.endswith('AS "count_margin" FROM blocks JOIN sizes USING (_blk)')
+
+
+def test_sum_and_avg_grouped_by_ordinal_with_where(approximator):
+    analysis, statement = rewrite(
+        approximator,
+        "SELECT category, SUM(amount) AS total, AVG(amount) FROM transactions "
+        "WHERE amount < 0 GROUP BY 1 ORDER BY total",
+    )
+    assert [g.sql() for g in analysis.groups] == ["category"]
+    assert analysis.margins == [("total_margin", "SUM(amount)"), ("avg_margin", "AVG(amount)")]
+    # WHERE wird in der Stichprobe ausgewertet, Gruppen/Argumente nur für passende Zeilen
+    assert "coalesce(amount < 0, false) AS _keep" in statement
+    assert "CASE WHEN amount < 0 THEN category END AS _g0" in statement
+    assert "CASE WHEN amount < 0 THEN amount END AS _a0" in statement
+    assert "FROM sample WHERE _keep GROUP BY 1, 2)" in statement
+
+    keys = list(analysis.aggregates)
+    k_sum, k_avg = keys.index("SUM(amount)"), keys.index("AVG(amount)")
+    assert f"ROUND(2000000 * (SUM(_s{k_sum}) / (SELECT _n FROM clusters)), 2) AS total" in statement
+    assert f'ROUND((SUM(_s{k_avg}) / NULLIF(SUM(_c{k_avg}), 0)), 2) AS "avg"' in statement
+    assert '_g0 AS "category"' in statement
+    assert statement.endswith("GROUP BY _g0 ORDER BY total")
+
+
+def test_group_by_alias_maps_to_projection(approximator):
+    analysis, statement = rewrite(
+        approximator,
+        "SELECT date_trunc('month', date) AS m, SUM(amount) FROM transactions GROUP BY m",
+    )
+    assert [g.sql(dialect="postgres") for g in analysis.groups] == ["DATE_TRUNC('MONTH', date)"]
+    assert "DATE_TRUNC('MONTH', date) AS _g0" in statement
+    assert "_g0 AS m" in statement
+    assert statement.endswith("GROUP BY _g0")
+
+
+def test_margin_keeps_name_through_round(approximator):
+    analysis, _ = rewrite(approximator, "SELECT ROUND(SUM(amount), 0) FROM transactions")
+    assert analysis.margins == [("round_margin", "SUM(amount)")]
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM transactions",
+    "SELECT category FROM transactions GROUP BY category",
+    "SELECT MIN(amount) FROM transactions",
+    "SELECT COUNT(DISTINCT category) FROM transactions",
+    "SELECT SUM(amount) FILTER (WHERE amount < 0) FROM transactions",
+    "SELECT category, SUM(amount) FROM transactions GROUP BY category HAVING SUM(amount) < 0",
+    "SELECT SUM(amount) / COUNT(*) FROM transactions",
+    "SELECT SUM(amount) FROM transactions t JOIN sales s ON s.sale_date = t.date",
+    "SELECT SUM(amount) FROM transactions WHERE category IN (SELECT category FROM transactions)",
+    "SELECT SUM(amount) FROM transactions TABLESAMPLE SYSTEM (1)",
+    "SELECT string_agg(category, ',') FROM transactions",
+    "SELECT category, SUM(amount) FROM transactions GROUP BY 3",
+    "SELECT SUM(total_amount) FROM sales",
+])
+def test_ineligible_statements(approximator, sql_query):
+    assert approximator.analyze(sql_query) is None
+
+
+def test_sample_percent(approximator):
+    assert approximator.sample_percent(500000, 10000) is None                  # unter min_rows: exakt
+    assert approximator.sample_percent(10000000, 20000) == 1.0                 # sample_rows / rows
+    assert approximator.sample_percent(2000000, 1000) == 5.0                   # MIN_CLUSTERS Blocknummern
+    assert approximator.sample_percent(2000000, 100) is None                   # über max_sample_percent
+    assert approximator.refinements(0.5) == [0.5, 5.0]
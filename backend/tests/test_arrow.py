@@ -0,0 +1,33 @@
+from collections import namedtuple
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from db.arrow import ArrowBatcher, NUMERIC_OID  # noqa: E402
+
+Column = namedtuple("Column", "name type_code precision scale")
+
+
+def test_unconstrained_numeric_keeps_every_digit():
+    # SUM/AVG ohne typmod: psycopg2 meldet 65535
+    batcher = ArrowBatcher([Column("total", NUMERIC_OID, 65535, 65535)])
+    first = batcher.batch([(Decimal("100"),), (Decimal("250"),)])
+    later = batcher.batch([(Decimal("12.34"),), (Decimal("0.99"),), (Decimal("NaN"),), (None,)])
+    assert first.schema.field("total").type == pa.string()
+    assert later.column(0).to_pylist() == ["12.34", "0.99", "NaN", None]
+
+
+def test_typed_numeric_is_decimal():
+    batcher = ArrowBatcher([Column("amount", NUMERIC_OID, 10, 2)])
+    batch = batcher.batch([(Decimal("-12.50"),), (None,)])
+    assert batch.schema.field("amount").type == pa.decimal128(10, 2)
+    assert batch.column(0).to_pylist() == [Decimal("-12.50"), None]
+
+
+def test_typed_numeric_nan_is_an_error():
+    batcher = ArrowBatcher([Column("amount", NUMERIC_OID, 10, 2)])
+    batcher.batch([(Decimal("1.00"),)])
+    with pytest.raises(ValueError):
+        batcher.batch([(Decimal("NaN"),)])
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from llm.backend_pool import OllamaPool  # noqa: E402
+
+URLS = ["http://a/api/generate", "http://b/api/generate"]
+
+
+def make_pool(answers, hedge_after_ms=0.0):
+    """answers: url -> (delay in s, response dict or exception)"""
+    pool = OllamaPool(URLS, "model", hedge_after_ms=hedge_after_ms, probe_interval=0,
+                      accept=lambda result: result.get("response") == "SELECT 1")
+
+    async def post_to(backend, prompt, model, options):
+        delay, answer = answers[backend.url]
+        await asyncio.sleep(delay)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    pool._post_to = post_to
+    return pool
+
+
+def run(pool):
+    return asyncio.run(pool._hedged("prompt", "model", {}))
+
+
+def test_hedge_win_is_counted():
+    pool = make_pool({URLS[0]: (0.5, {"response": "SELECT 1"}), URLS[1]: (0.0, {"response": "SELECT 1"})},
+                     hedge_after_ms=10)
+    assert run(pool) == {"response": "SELECT 1"}
+    stats = pool.stats()
+    assert stats["hedged_total"] == 1
+    assert stats["hedge_wins_total"] == 1
+
+
+def test_failover_win_is_not_a_hedge_win():
+    pool = make_pool({URLS[0]: (0.0, RuntimeError("down")), URLS[1]: (0.0, {"response": "SELECT 1"})})
+    assert run(pool) == {"response": "SELECT 1"}
+    stats = pool.stats()
+    assert stats["failovers_total"] == 1
+    assert stats["hedge_wins_total"] == 0
+    assert all(b["hedge_wins"] == 0 for b in stats["backends"])
+
+
+def test_unusable_answer_fails_over():
+    pool = make_pool({URLS[0]: (0.0, {"response": "no sql"}), URLS[1]: (0.0, {"response": "SELECT 1"})})
+    assert run(pool) == {"response": "SELECT 1"}
+    assert pool.stats()["failovers_total"] == 1
+
+
+def test_unusable_answer_wins_if_the_failover_fails():
+    pool = make_pool({URLS[0]: (0.0, {"response": "no sql"}), URLS[1]: (0.0, RuntimeError("down"))})
+    assert run(pool) == {"response": "no sql"}
@@ -0,0 +1,89 @@
+"""
+Braucht eine Postgres-Instanz: TEST_DATABASE_URL (Server, auf dem eine
+Wegwerf-Datenbank angelegt werden darf), sonst übersprungen.
+"""
+import datetime
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.extensions import make_dsn, parse_dsn  # noqa: E402
+
+from partitions.manager import PartitionManager  # noqa: E402
+from rollups.refresh import RollupManager  # noqa: E402
+
+DATABASE_DIR = Path(__file__).resolve().parents[2] / "database"
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+ROLLUP_TOTALS_SQL = """
+SELECT (SELECT coalesce(sum(total), 0) FROM public.transactions_monthly),
+       (SELECT coalesce(sum(tx_count), 0) FROM public.transactions_monthly),
+       (SELECT coalesce(sum(total), 0) FROM public.transactions_daily),
+       (SELECT coalesce(sum(tx_count), 0) FROM public.transactions_daily)
+"""
+RAW_TOTALS_SQL = "SELECT sum(amount), count(*), sum(amount), count(*) FROM public.transactions"
+
+
+@pytest.fixture
+def conn():
+    name = f"partitions_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name}")
+        cur.execute(
+            "DO $$ BEGIN IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') "
+            "THEN CREATE ROLE service_role; END IF; END $$"
+        )
+    conn = psycopg2.connect(make_dsn(TEST_DATABASE_URL, dbname=name))
+    try:
+        with conn.cursor() as cur:
+            cur.execute((DATABASE_DIR / "schema.sql").read_text())
+            cur.execute((DATABASE_DIR / "rollups.sql").read_text())
+        conn.commit()
+        yield conn
+    finally:
+        conn.close()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE {name} WITH (FORCE)")
+        admin.close()
+
+
+def insert(conn, rows):
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO public.transactions (amount, category, description, date) VALUES (%s, %s, 'Test', %s)",
+            rows,
+        )
+    conn.commit()
+
+
+def totals(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()
+
+
+def test_moving_default_rows_keeps_rollups(conn):
+    today = datetime.date(2024, 6, 15)
+    insert(conn, [(-12.5, "Lebensmittel", datetime.date(2024, 5, 3)), (3300, "Gehalt", datetime.date(2024, 5, 28))])
+    manager = PartitionManager(pool=None, premake=1)
+    manager.convert(conn, today=today)
+
+    # Nach dem letzten vorausgelegten Monat (Juli) -> DEFAULT-Partition
+    insert(conn, [(-40, "Restaurant", datetime.date(2024, 9, 6)), (-1100, "Miete", datetime.date(2024, 9, 1))])
+    rollups = RollupManager(pool=None)
+    rollups.refresh(conn)
+    before = totals(conn, ROLLUP_TOTALS_SQL)
+    assert before == totals(conn, RAW_TOTALS_SQL)
+
+    created = manager.ensure_partitions(conn, today=datetime.date(2024, 8, 20))
+    assert created == ["transactions_p2024_08", "transactions_p2024_09"]
+    assert manager.stats()["default_rows_moved_total"] == 2
+    rollups.refresh(conn)
+    assert totals(conn, ROLLUP_TOTALS_SQL) == before
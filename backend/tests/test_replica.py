@@ -0,0 +1,98 @@
+"""
+Braucht eine Postgres-Instanz: TEST_DATABASE_URL (Server, auf dem eine
+Wegwerf-Datenbank angelegt werden darf), sonst übersprungen.
+"""
+import asyncio
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("duckdb")
+from psycopg2.extensions import make_dsn  # noqa: E402
+
+from replica.columnar import ColumnarReplica  # noqa: E402
+
+DATABASE_DIR = Path(__file__).resolve().parents[2] / "database"
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def dsn():
+    name = f"replica_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name}")
+        cur.execute(
+            "DO $$ BEGIN IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') "
+            "THEN CREATE ROLE service_role; END IF; END $$"
+        )
+    dsn = make_dsn(TEST_DATABASE_URL, dbname=name)
+    try:
+        with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+            cur.execute((DATABASE_DIR / "schema.sql").read_text())
+            cur.execute((DATABASE_DIR / "replica.sql").read_text())
+        yield dsn
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE {name} WITH (FORCE)")
+        admin.close()
+
+
+@pytest.fixture
+def replica():
+    replica = ColumnarReplica(pool=None, path=None, tables=("transactions",))
+    asyncio.run(replica.open())
+    yield replica
+    asyncio.run(replica.close())
+
+
+def execute(conn, sql, params=None):
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+    conn.commit()
+
+
+def assert_in_sync(conn, replica):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id::text, amount, description FROM public.transactions ORDER BY id")
+        expected = cur.fetchall()
+    conn.rollback()
+    copied = replica._db.execute(
+        "SELECT id::varchar, amount, description FROM transactions ORDER BY id"
+    ).fetchall()
+    assert copied == expected
+
+
+def test_incremental_sync_follows_commit_order_updates_and_deletes(dsn, replica):
+    conn = psycopg2.connect(dsn)
+    late = psycopg2.connect(dsn)
+    try:
+        execute(conn, "INSERT INTO public.transactions (amount, category, description, date) "
+                      "VALUES (-10, 'Lebensmittel', 'a', '2024-05-01'), (-20, 'Transport', 'b', '2024-05-02')")
+        replica.sync(conn)
+        assert_in_sync(conn, replica)
+
+        # Lange Transaktion: created_at liegt vor dem nächsten Sync, Commit danach
+        with late.cursor() as cur:
+            cur.execute("INSERT INTO public.transactions (amount, category, description, date, created_at) "
+                        "VALUES (-30, 'Restaurant', 'late', '2024-05-03', now() - interval '1 hour')")
+        execute(conn, "UPDATE public.transactions SET description = 'changed' WHERE description = 'a'")
+        execute(conn, "DELETE FROM public.transactions WHERE description = 'b'")
+        result = replica.sync(conn)
+        assert result["rows"] == {"transactions": 1}
+        late.commit()
+
+        replica.sync(conn)
+        assert_in_sync(conn, replica)
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM public.replica_changes")
+            assert cur.fetchone()[0] == 0
+    finally:
+        late.close()
+        conn.close()
@@ -0,0 +1,35 @@
+import pytest
+
+from cache.result_cache import ResultCache
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(pool=None, tables=("transactions", "budgets"))
+
+
+@pytest.mark.parametrize("sql_query, tables", [
+    ("SELECT * FROM transactions", {"transactions"}),
+    ("SELECT * FROM transactions t, budgets b WHERE t.category = b.category", {"transactions", "budgets"}),
+    ("SELECT * FROM public.transactions t JOIN budgets b USING (category)", {"transactions", "budgets"}),
+    ("SELECT * FROM transactions WHERE category IN (SELECT category FROM budgets)", {"transactions", "budgets"}),
+    ("WITH x AS (SELECT * FROM budgets) SELECT * FROM x", {"budgets"}),
+    ("SELECT EXTRACT(YEAR FROM date), SUBSTRING(description FROM 1 FOR 3) FROM transactions", {"transactions"}),
+])
+def test_referenced_tables(cache, sql_query, tables):
+    assert cache.referenced_tables(sql_query) == frozenset(tables)
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM transactions, pg_stat_activity",
+    "SELECT * FROM transactions t, sales s",
+    "SELECT * FROM pg_catalog.pg_class",
+    'SELECT * FROM "Transactions"',
+    "SELECT * FROM generate_series(1, 3)",
+    "SELECT * FROM transactions WHERE date > now()",
+    "SELECT * FROM transactions; SELECT * FROM pg_class",
+    "SELECT 1",
+    "SELECT * FROM",
+])
+def test_uncacheable(cache, sql_query):
+    assert cache.referenced_tables(sql_query) is None
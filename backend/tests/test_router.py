@@ -0,0 +1,89 @@
+import pytest
+
+from rollups.router import RollupRouter
+
+
+@pytest.fixture
+def router():
+    return RollupRouter(exact=False)
+
+
+def test_count_becomes_coalesced_sum(router):
+    assert router.route("SELECT COUNT(*) FROM transactions") == (
+        'SELECT CAST(COALESCE(SUM(tx_count), 0) AS BIGINT) AS "count" '
+        "FROM public.transactions_monthly AS transactions"
+    )
+
+
+def test_sum_with_sign_filter_and_alias_order(router):
+    assert router.route(
+        "SELECT category, SUM(amount) AS total FROM transactions WHERE amount < 0 "
+        "GROUP BY category ORDER BY total"
+    ) == (
+        "SELECT category, SUM(total) AS total FROM public.transactions_monthly AS transactions "
+        "WHERE sign < 0 GROUP BY category ORDER BY total"
+    )
+
+
+def test_avg_over_month_bucket_with_group_ordinal(router):
+    assert router.route(
+        "SELECT date_trunc('month', date) AS m, AVG(amount) FROM transactions GROUP BY 1"
+    ) == (
+        "SELECT DATE_TRUNC('MONTH', month) AS m, SUM(total) / NULLIF(SUM(tx_count), 0) AS \"avg\" "
+        "FROM public.transactions_monthly AS transactions GROUP BY 1"
+    )
+
+
+def test_group_by_alias(router):
+    assert router.route(
+        "SELECT category AS c, COUNT(*) AS n FROM transactions GROUP BY c"
+    ) == (
+        "SELECT category AS c, CAST(COALESCE(SUM(tx_count), 0) AS BIGINT) AS n "
+        "FROM public.transactions_monthly AS transactions GROUP BY c"
+    )
+
+
+def test_month_bounds_stay_monthly(router):
+    assert router.route(
+        "SELECT SUM(amount) FROM transactions WHERE date >= '2024-01-01' AND date < '2024-04-01'"
+    ) == (
+        'SELECT SUM(total) AS "sum" FROM public.transactions_monthly AS transactions '
+        "WHERE month >= '2024-01-01' AND month < '2024-04-01'"
+    )
+
+
+def test_day_bounds_need_daily(router):
+    assert router.route(
+        "SELECT date, SUM(amount) FROM transactions WHERE date >= '2024-01-15' GROUP BY date"
+    ) == (
+        'SELECT day AS "date", SUM(total) AS "sum" FROM public.transactions_daily AS transactions '
+        "WHERE day >= '2024-01-15' GROUP BY date"
+    )
+
+
+def test_exact_mode_adds_pending_rows():
+    routed = RollupRouter(exact=True).route("SELECT category, MAX(amount) FROM transactions GROUP BY category")
+    assert routed == (
+        'SELECT category, MAX(max_amount) AS "max" FROM ('
+        "SELECT month, category, sign, total, tx_count, min_amount, max_amount FROM public.transactions_monthly "
+        "UNION ALL SELECT CAST(DATE_TRUNC('MONTH', day) AS DATE), category, sign, total, tx_count, "
+        "min_amount, max_amount FROM public.rollup_pending) AS transactions GROUP BY category"
+    )
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM transactions",
+    "SELECT date, amount FROM transactions ORDER BY date",
+    "SELECT description, SUM(amount) FROM transactions GROUP BY description",
+    "SELECT SUM(amount) FROM transactions WHERE amount < -100",
+    "SELECT COUNT(DISTINCT category) FROM transactions",
+    "SELECT category, SUM(amount) OVER () FROM transactions",
+    "SELECT SUM(amount) FROM transactions t JOIN sales s ON s.sale_date = t.date",
+    "SELECT SUM(amount) FROM transactions WHERE category IN (SELECT category FROM transactions)",
+    "WITH x AS (SELECT * FROM transactions) SELECT SUM(amount) FROM x",
+    "SELECT SUM(total_amount) FROM sales",
+    "SELECT SUM(amount) FROM transactions WHERE",
+])
+def test_ineligible_statements_are_not_routed(router, sql_query):
+    assert router.route(sql_query) is None
+    assert router.stats()["skipped"] == 1
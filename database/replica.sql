@@ -0,0 +1,63 @@
+-- Change Capture für die spaltenorientierte Replik (REPLICA_ENABLED)
+-- Nach schema.sql ausführen. Ohne diese Datei kopiert jeder Sync die Tabellen komplett
+-- (siehe backend/replica/columnar.py).
+
+-- Primärschlüssel geänderter Zeilen (Insert, Update, Delete), pro Statement aus den
+-- Transition Tables. Eine Zeile wird mit ihrer Transaktion sichtbar - auch wenn die
+-- lange läuft und created_at alt ist - und der Sync löscht genau die Zeilen, die er
+-- übernimmt. Es gibt deshalb nur einen Konsumenten: eine Replik pro Datenbank.
+CREATE TABLE IF NOT EXISTS public.replica_changes (
+    table_name TEXT NOT NULL,
+    key JSONB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replica_changes_table_idx ON public.replica_changes (table_name);
+
+-- Argumente: die Primärschlüssel-Spalten der Tabelle
+CREATE OR REPLACE FUNCTION public.replica_capture() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO public.replica_changes
+        SELECT TG_TABLE_NAME, (SELECT jsonb_object_agg(k, r.row -> k) FROM unnest(TG_ARGV) AS k)
+        FROM (SELECT to_jsonb(n) AS row FROM new_rows n) r;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO public.replica_changes
+        SELECT TG_TABLE_NAME, (SELECT jsonb_object_agg(k, r.row -> k) FROM unnest(TG_ARGV) AS k)
+        FROM (SELECT to_jsonb(o) AS row FROM old_rows o) r;
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- Transition Tables gehen nur mit einem Ereignis pro Trigger
+DROP TRIGGER IF EXISTS transactions_replica_insert ON public.transactions;
+CREATE TRIGGER transactions_replica_insert
+    AFTER INSERT ON public.transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
+DROP TRIGGER IF EXISTS transactions_replica_update ON public.transactions;
+CREATE TRIGGER transactions_replica_update
+    AFTER UPDATE ON public.transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
+DROP TRIGGER IF EXISTS transactions_replica_delete ON public.transactions;
+CREATE TRIGGER transactions_replica_delete
+    AFTER DELETE ON public.transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
+
+DROP TRIGGER IF EXISTS budgets_replica_insert ON public.budgets;
+CREATE TRIGGER budgets_replica_insert
+    AFTER INSERT ON public.budgets
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
+DROP TRIGGER IF EXISTS budgets_replica_update ON public.budgets;
+CREATE TRIGGER budgets_replica_update
+    AFTER UPDATE ON public.budgets
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
+DROP TRIGGER IF EXISTS budgets_replica_delete ON public.budgets;
+CREATE TRIGGER budgets_replica_delete
+    AFTER DELETE ON public.budgets
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.replica_capture('id');
@@ -0,0 +1,82 @@
+-- Rollups: vorberechnete Aggregate über public.transactions
+-- Nach schema.sql ausführen. Befüllt/aktualisiert werden die Tabellen vom Backend
+-- (inkrementell aus rollup_pending, siehe backend/rollups/refresh.py).
+-- Umstieg vom früheren created_at-Watermark: danach einmal
+-- POST /admin/rollups/refresh?full=true, sonst fehlen Zeilen seit dem letzten Refresh.
+
+-- sign = sign(amount): -1 Ausgaben, 1 Einnahmen, 0 neutral
+CREATE TABLE IF NOT EXISTS public.transactions_daily (
+    day DATE NOT NULL,
+    category TEXT NOT NULL,
+    sign SMALLINT NOT NULL,
+    total NUMERIC NOT NULL,
+    tx_count BIGINT NOT NULL,
+    min_amount NUMERIC NOT NULL,
+    max_amount NUMERIC NOT NULL,
+    PRIMARY KEY (day, category, sign)
+);
+
+CREATE TABLE IF NOT EXISTS public.transactions_monthly (
+    month DATE NOT NULL, -- erster Tag des Monats
+    category TEXT NOT NULL,
+    sign SMALLINT NOT NULL,
+    total NUMERIC NOT NULL,
+    tx_count BIGINT NOT NULL,
+    min_amount NUMERIC NOT NULL,
+    max_amount NUMERIC NOT NULL,
+    PRIMARY KEY (month, category, sign)
+);
+
+-- Noch nicht aufgerollte Inserts, pro Statement vorab aggregiert. Eine Zeile wird
+-- mit ihrer Transaktion sichtbar - auch wenn die lange läuft und created_at alt ist -
+-- und der Refresh löscht genau die Zeilen, die er aufrollt.
+CREATE TABLE IF NOT EXISTS public.rollup_pending (
+    day DATE NOT NULL,
+    category TEXT NOT NULL,
+    sign SMALLINT NOT NULL,
+    total NUMERIC NOT NULL,
+    tx_count BIGINT NOT NULL,
+    min_amount NUMERIC NOT NULL,
+    max_amount NUMERIC NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION public.transactions_rollup_pending() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO public.rollup_pending
+    SELECT date, category, sign(amount)::smallint, sum(amount), count(*), min(amount), max(amount)
+    FROM new_rows
+    GROUP BY 1, 2, 3;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS transactions_rollup_pending ON public.transactions;
+CREATE TRIGGER transactions_rollup_pending
+    AFTER INSERT ON public.transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.transactions_rollup_pending();
+
+-- Letzter Refresh
+CREATE TABLE IF NOT EXISTS public.rollup_state (
+    name TEXT PRIMARY KEY,
+    refreshed_at TIMESTAMP WITH TIME ZONE
+);
+ALTER TABLE public.rollup_state DROP COLUMN IF EXISTS watermark;
+INSERT INTO public.rollup_state (name)
+VALUES ('transactions')
+ON CONFLICT (name) DO NOTHING;
+
+-- Budget vs. tatsächliche Ausgaben pro Monat und Kategorie
+CREATE OR REPLACE VIEW public.budget_vs_actual AS
+SELECT
+    b.month,
+    b.category,
+    b.limit_amount,
+    COALESCE(-m.total, 0) AS spent,
+    b.limit_amount - COALESCE(-m.total, 0) AS remaining,
+    ROUND(100 * COALESCE(-m.total, 0) / NULLIF(b.limit_amount, 0), 1) AS used_percent
+FROM public.budgets b
+LEFT JOIN public.transactions_monthly m
+    ON m.month = date_trunc('month', b.month)::date
+   AND m.category = b.category
+   AND m.sign = -1;
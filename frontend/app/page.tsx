@@ -4,6 +4,19 @@ import { useState } from "react";
 import { Search, Send, Database, Terminal, Activity, AlertCircle, ArrowRight } from "lucide-react";
 import { motion, AnimatePresence } from "framer-motion";
 
+type StreamEvent = { event: string; lines: string[] };
+
+// Zerlegt einen SSE-Block ("event: x\ndata: ...\ndata: ...") in Event-Name + Datenzeilen
+function parseEvent(block: string): StreamEvent {
+  let event = "message";
+  const lines: string[] = [];
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) lines.push(line.slice(5).trimStart());
+  }
+  return { event, lines };
+}
+
 export default function Home() {
   const [query, setQuery] = useState("");
   const [results, setResults] = useState<any>(null);
@@ -20,20 +33,50 @@ export default function Home() {
 
     try {
       // WICHTIG: Port Wechsel auf 8080
-      const res = await fetch("http://127.0.0.1:8080/query", {
+      // Streaming: SQL-Tokens und Zeilen werden angezeigt, sobald sie ankommen
+      const res = await fetch("http://127.0.0.1:8080/query/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ natural_language_query: query }),
       });
 
-      const data = await res.json();
-
-      if (!res.ok) throw new Error(data.detail || "Verbindungsfehler");
-      if (data.error) throw new Error(data.error);
-
-      setResults(data);
+      if (!res.ok || !res.body) {
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.detail || "Verbindungsfehler");
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let sql = "";
+      let rows: any[] = [];
+      setResults({ sql_query: "", data: [] });
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep: number;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          const { event, lines } = parseEvent(buffer.slice(0, sep));
+          buffer = buffer.slice(sep + 2);
+
+          if (event === "token") {
+            sql += JSON.parse(lines[0]).token;
+          } else if (event === "sql") {
+            sql = JSON.parse(lines[0]).sql_query;
+          } else if (event === "rows") {
+            rows = rows.concat(lines.map((line) => JSON.parse(line)));
+          } else if (event === "error") {
+            throw new Error(JSON.parse(lines[0]).error);
+          }
+          setResults({ sql_query: sql, data: rows });
+        }
+      }
     } catch (err: any) {
       console.error(err);
+      setResults(null);
       setError("Verbindung zum Backend fehlgeschlagen. (Ist der Supabase Key in der .env gesetzt?)");
     } finally {
       setIsLoading(false);
@@ -157,7 +200,7 @@ export default function Home() {
                       </table>
                     ) : (
                       <div className="p-12 text-center text-[#9AA0A6]">
-                        Keine Daten gefunden für diese Anfrage.
+                        {isLoading ? "Lade Daten..." : "Keine Daten gefunden für diese Anfrage."}
                       </div>
                     )}
                   </div>